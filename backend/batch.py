@@ -0,0 +1,295 @@
+"""
+Analyze many CSV files at once.
+
+    python batch.py branches/                      # every CSV under a directory
+    python batch.py "nightly/*.csv" extra.csv --out results/ --workers 8
+    python batch.py data/ --format ndjson --gzip --time-budget 30
+
+Inputs may be files, glob patterns or directories (searched recursively
+for CSV_PATTERNS). Files run in a process pool, one file per worker at a
+time; workers import the pipeline once and are reused for every file
+they get. Each result is written to its own file under --out, at the
+input's path relative to the inputs' common folder.
+
+A file that fails (bad CSV, detector error, even a crashed worker) is
+reported as failed; the other files carry on. At the end a table of
+per-file rows, seconds and rows/sec is printed with the batch's
+aggregate throughput; the exit status is 1 if any file failed.
+"""
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+
+CSV_PATTERNS = ("*.csv", "*.csv.gz", "*.csv.zst")
+DEFAULT_OUT = os.path.join("outputs", "batch")
+EXTENSIONS = {"pretty": ".json", "compact": ".json", "ndjson": ".ndjson"}
+
+
+# ===============================
+# INPUTS
+# ===============================
+def is_csv(name):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in CSV_PATTERNS)
+
+
+def expand_inputs(args):
+    """
+    Files, globs and directories -> (CSV paths in argument order, without
+    repeats; arguments that matched nothing).
+    """
+    paths = []
+    unmatched = []
+
+    for arg in args:
+        if os.path.isdir(arg):
+            found = []
+            for folder, dirs, names in os.walk(arg):
+                dirs.sort()
+                found += [os.path.join(folder, n) for n in sorted(names) if is_csv(n)]
+        elif os.path.isfile(arg):
+            found = [arg]
+        else:
+            found = sorted(p for p in glob.glob(arg, recursive=True) if os.path.isfile(p))
+
+        if not found:
+            unmatched.append(arg)
+        paths += found
+
+    unique = {}
+    for path in paths:
+        unique.setdefault(os.path.realpath(path), path)
+    return list(unique.values()), unmatched
+
+
+def output_paths(paths, out_dir, fmt="pretty", compress=False):
+    """
+    {input: output path}: each input's path relative to the inputs'
+    common folder, under out_dir, so same-named files from different
+    folders don't overwrite each other.
+    """
+    if not paths:
+        return {}
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    extension = EXTENSIONS[fmt] + (".gz" if compress else "")
+
+    outputs = {}
+    for path in paths:
+        relative = os.path.relpath(os.path.abspath(path), root)
+        for suffix in (".gz", ".zst", ".csv"):
+            if relative.endswith(suffix):
+                relative = relative[:-len(suffix)]
+        outputs[path] = os.path.join(out_dir, relative + extension)
+    return outputs
+
+
+# ===============================
+# WORKER SIDE
+# ===============================
+def warm_up():
+    """Pool initializer: pay for the pandas / NumPy / pipeline imports once."""
+    import main
+
+
+def analyze_file(path, out_path, fmt, compress, options):
+    """One file, start to finish; never raises (errors become the result)."""
+    from main import run_pipeline
+    from final_json_builder import save_json
+
+    start = time.time()
+    try:
+        G, _, final_json = run_pipeline(path, start, workers=1, **options)
+        save_json(final_json, out_path, fmt=fmt, compress=compress)
+    except Exception as exc:
+        return failed(path, f"{type(exc).__name__}: {exc}", time.time() - start)
+
+    summary = final_json["summary"]
+    return {
+        "file": path,
+        "status": "ok",
+        "output": out_path,
+        "rows": G.n_rows,
+        "seconds": round(time.time() - start, 3),
+        "suspicious_accounts": summary["suspicious_accounts_flagged"],
+        "fraud_rings": summary["fraud_rings_detected"],
+        "truncated_detectors": summary.get("truncated_detectors", [])
+    }
+
+
+def failed(path, error, seconds=0.0):
+    return {
+        "file": path,
+        "status": "failed",
+        "error": error,
+        "rows": 0,
+        "seconds": round(seconds, 3)
+    }
+
+
+# ===============================
+# PARENT SIDE
+# ===============================
+def run_pool(pending, workers, arguments, on_result):
+    """
+    Run analyze_file(*arguments(path)) for paths taken from the pending
+    deque, keeping at most `workers` in flight. If a worker process dies the pool is
+    unusable; the paths that were in flight are returned (one of them
+    killed it) and the rest stay in pending.
+    """
+    in_flight = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_up) as pool:
+        while pending or in_flight:
+            while pending and len(in_flight) < workers:
+                path = pending.popleft()
+                in_flight[pool.submit(analyze_file, *arguments(path))] = path
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = in_flight.pop(future)
+                try:
+                    on_result(future.result())
+                except BrokenProcessPool:
+                    return [path] + list(in_flight.values())
+    return []
+
+
+def run_batch(paths, outputs, workers, fmt="pretty", compress=False,
+              options=None, on_result=None):
+    """
+    Analyze every path, writing results to outputs[path].
+
+    Files that were in flight when a worker died are re-run alone, each
+    in its own single-worker pool, so only the file that crashes its
+    worker is reported failed. Returns the per-file results in input
+    order.
+    """
+    options = options or {}
+    results = {}
+
+    def record(result):
+        results[result["file"]] = result
+        if on_result is not None:
+            on_result(result)
+
+    def arguments(path):
+        return path, outputs[path], fmt, compress, options
+
+    pending = deque(paths)
+    while pending:
+        suspects = run_pool(pending, workers, arguments, record)
+        for path in suspects:
+            if run_pool(deque([path]), 1, arguments, record):
+                record(failed(path, "worker process died"))
+
+    return [results[path] for path in paths]
+
+
+# ===============================
+# REPORT
+# ===============================
+def rate(rows, seconds):
+    return rows / seconds if seconds > 0 else 0.0
+
+
+def print_table(results, wall_seconds, out=sys.stdout):
+    width = max([len("file")] + [len(r["file"]) for r in results])
+    print(
+        f"{'file':<{width}} {'rows':>11} {'seconds':>9} {'rows/s':>11} "
+        f"{'flagged':>8} {'rings':>6}  status",
+        file=out
+    )
+    for r in results:
+        if r["status"] == "ok":
+            print(
+                f"{r['file']:<{width}} {r['rows']:>11,} {r['seconds']:>9.2f} "
+                f"{rate(r['rows'], r['seconds']):>11,.0f} "
+                f"{r['suspicious_accounts']:>8} {r['fraud_rings']:>6}  ok",
+                file=out
+            )
+        else:
+            print(
+                f"{r['file']:<{width}} {'':>11} {r['seconds']:>9.2f} {'':>11} "
+                f"{'':>8} {'':>6}  FAILED: {r['error']}",
+                file=out
+            )
+
+    ok = [r for r in results if r["status"] == "ok"]
+    rows = sum(r["rows"] for r in ok)
+    print(
+        f"\n{len(ok)}/{len(results)} files ok, {rows:,} rows in "
+        f"{wall_seconds:.2f}s wall: {rate(rows, wall_seconds):,.0f} rows/s "
+        f"(per-file sum {sum(r['seconds'] for r in results):.2f}s)",
+        file=out
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("inputs", nargs="+", help="CSV files, glob patterns or directories")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="folder for the per-file results")
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="files analyzed at once (default: one per CPU)"
+    )
+    parser.add_argument("--format", choices=sorted(EXTENSIONS), default="pretty")
+    parser.add_argument("--gzip", action="store_true", help="gzip each result file")
+    parser.add_argument("--summary", default=None, help="also write the table as JSON here")
+    parser.add_argument("--time-budget", type=float, default=None)
+    parser.add_argument("--max-results", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=None)
+    parser.add_argument("--cycle-window-hours", type=float, default=None)
+    parser.add_argument("--consolidate-rings", action="store_true")
+    args = parser.parse_args()
+
+    paths, unmatched = expand_inputs(args.inputs)
+    for arg in unmatched:
+        print(f"warning: {arg!r} matched no CSV files", file=sys.stderr)
+    if not paths:
+        sys.exit("no input files")
+
+    options = {
+        "time_budget": args.time_budget,
+        "max_results": args.max_results,
+        "chunksize": args.chunksize,
+        "cycle_window_hours": args.cycle_window_hours,
+        "consolidate_rings": args.consolidate_rings
+    }
+    outputs = output_paths(paths, args.out, args.format, args.gzip)
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(paths)))
+
+    finished = 0
+
+    def progress(result):
+        global finished
+        finished += 1
+        print(
+            f"[{finished}/{len(paths)}] {result['file']}: {result['status']} "
+            f"({result['seconds']:.2f}s)",
+            file=sys.stderr
+        )
+
+    start = time.time()
+    results = run_batch(
+        paths, outputs, workers, args.format, args.gzip, options, on_result=progress
+    )
+    wall_seconds = time.time() - start
+
+    print_table(results, wall_seconds)
+
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump({
+                "wall_seconds": round(wall_seconds, 3),
+                "workers": workers,
+                "options": options,
+                "files": results
+            }, f, indent=2)
+
+    sys.exit(1 if unmatched or any(r["status"] != "ok" for r in results) else 0)
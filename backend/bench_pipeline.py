@@ -0,0 +1,258 @@
+"""
+End-to-end scaling benchmark on generated data with planted patterns.
+
+    python bench_pipeline.py                          # 10k, 100k, 1M rows
+    python bench_pipeline.py 50000 500000 --workers 4
+    python bench_pipeline.py --out new.json --compare old.json
+
+For each size a seeded dataset is generated (generate_data.py) and
+run_pipeline runs on it in a fresh process, so peak RSS belongs to that
+size alone. Reported per size:
+- wall time total and per stage (with CPU time and item counts)
+- peak RSS of the run
+- per planted pattern type: recall, and the false positives among the
+  reported detections (those on background accounts only; planted
+  patterns use fresh accounts, so a detection is one or the other)
+
+The report is written as JSON (--out) with the git commit it ran on;
+--compare prints the time ratio against an earlier report and exits
+non-zero when any stage slowed down past --tolerance.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate_data import generate_transactions, write_dataset
+from metrics import StageRecorder, peak_rss_bytes
+
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+TOLERANCE = 1.25    # new / old time ratio above which a stage counts as slower
+MIN_SECONDS = 0.05  # stages faster than this are too noisy to compare
+
+
+# ===============================
+# RECALL / FALSE POSITIVES
+# ===============================
+def rotate_to_min(members):
+    """Cycles are reported starting at their smallest account id."""
+    i = members.index(min(members))
+    return tuple(members[i:] + members[:i])
+
+
+def detection_accounts(pattern, detection):
+    if pattern == "cycles":
+        return detection["members"]
+    if pattern == "shell_chains":
+        return detection["path"]
+    return [detection["aggregator" if pattern == "fan_in" else "distributor"]]
+
+
+def accuracy(detections, planted):
+    """
+    Per pattern type: how many planted instances were reported, and how
+    many reported detections touch no planted account.
+    """
+    found = {
+        "cycles": {rotate_to_min(c["members"]) for c in detections["cycles"]},
+        "fan_in": {d["aggregator"] for d in detections["fan_in"]},
+        "fan_out": {d["distributor"] for d in detections["fan_out"]},
+        "shell_chains": {tuple(c["path"]) for c in detections["shell_chains"]}
+    }
+    planted_keys = {
+        "cycles": [rotate_to_min(c) for c in planted["cycles"]],
+        "fan_in": planted["fan_in"],
+        "fan_out": planted["fan_out"],
+        "shell_chains": [tuple(c) for c in planted["shell_chains"]]
+    }
+
+    planted_accounts = set(planted["fan_in"]) | set(planted["fan_out"])
+    for pattern in ("cycles", "shell_chains"):
+        for members in planted[pattern]:
+            planted_accounts.update(members)
+
+    report = {}
+    for pattern, keys in planted_keys.items():
+        hits = sum(1 for key in keys if key in found[pattern])
+        reported = len(detections[pattern])
+        false_positives = sum(
+            1 for d in detections[pattern]
+            if planted_accounts.isdisjoint(detection_accounts(pattern, d))
+        )
+        report[pattern] = {
+            "planted": len(keys),
+            "found": hits,
+            "recall": round(hits / len(keys), 4) if keys else None,
+            "reported": reported,
+            "false_positives": false_positives,
+            "precision": (
+                round(1 - false_positives / reported, 4) if reported else None
+            )
+        }
+    return report
+
+
+# ===============================
+# ONE SIZE (in its own process)
+# ===============================
+def run_one(csv_path, planted, options):
+    from main import label_detections, run_pipeline
+
+    recorder = StageRecorder()
+    start = time.time()
+    G, detections, final_json = run_pipeline(
+        csv_path, start, timings=recorder, **options
+    )
+    seconds = time.time() - start
+    detections = label_detections(detections, G.accounts)
+
+    peak = peak_rss_bytes()
+    return {
+        "seconds": round(seconds, 3),
+        "peak_rss_mb": round(peak / 2**20, 1) if peak is not None else None,
+        "stages": recorder.report(),
+        "detections": {name: len(found) for name, found in detections.items()},
+        "budgets": final_json["summary"].get("detector_budgets"),
+        "accuracy": accuracy(detections, planted),
+        "flagged_accounts": len(final_json["suspicious_accounts"])
+    }
+
+
+def bench_size(n_rows, seed, options, folder):
+    start = time.perf_counter()
+    df, planted = generate_transactions(n_rows, seed)
+    csv_path = os.path.join(folder, f"bench_{n_rows}.csv")
+    write_dataset(df, planted, csv_path)
+    del df
+    generate_seconds = time.perf_counter() - start
+
+    # spawn, not fork: the child must not inherit this process's memory
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        result = pool.apply(run_one, (csv_path, planted, options))
+
+    os.remove(csv_path)
+    return dict(rows=n_rows, generate_seconds=round(generate_seconds, 3), **result)
+
+
+# ===============================
+# REPORT
+# ===============================
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import numpy
+    import pandas
+
+    return {
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "cpu_count": os.cpu_count(),
+        "platform": platform.platform()
+    }
+
+
+def print_run(run):
+    recall_text = "  ".join(
+        f"{name}={r['found']}/{r['planted']}" for name, r in run["accuracy"].items()
+    )
+    fp_text = "  ".join(
+        f"{name}={r['false_positives']}/{r['reported']}"
+        for name, r in run["accuracy"].items()
+    )
+    print(
+        f"{run['rows']:>10,} rows  {run['seconds']:>8.2f}s  "
+        f"peak {run['peak_rss_mb']} MB  {run['flagged_accounts']:,} accounts flagged"
+    )
+    print(f"{'':>12}recall {recall_text}")
+    print(f"{'':>12}false positives {fp_text}")
+    for name, stage in run["stages"].items():
+        print(
+            f"{'':>12}{name:<14}{stage['wall_seconds']:>9.3f}s wall"
+            f"{stage['cpu_seconds']:>9.3f}s cpu  +{stage['rss_growth_mb']} MB"
+        )
+
+
+def compare(report, baseline, tolerance):
+    """Print new/old time per stage; returns the (rows, stage) that slowed."""
+    old_runs = {run["rows"]: run for run in baseline["runs"]}
+    slower = []
+
+    print(f"\ncompared with {baseline.get('commit')} (ratio new / old)")
+    for run in report["runs"]:
+        old = old_runs.get(run["rows"])
+        if old is None:
+            continue
+        for name, stage in run["stages"].items():
+            if name not in old["stages"]:
+                continue
+            before = old["stages"][name]["wall_seconds"]
+            after = stage["wall_seconds"]
+            if max(before, after) < MIN_SECONDS:
+                continue
+            ratio = after / before if before else float("inf")
+            flag = "  SLOWER" if ratio > tolerance else ""
+            print(f"{run['rows']:>10,} {name:<14}{before:>9.3f}s -> {after:>9.3f}s  x{ratio:.2f}{flag}")
+            if flag:
+                slower.append((run["rows"], name))
+
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("sizes", type=int, nargs="*", default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--time-budget", type=float, default=None)
+    parser.add_argument("--max-results", type=int, default=None)
+    parser.add_argument("--out", default="bench_report.json")
+    parser.add_argument("--compare", default=None, help="earlier report to compare with")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    options = {
+        "workers": args.workers,
+        "time_budget": args.time_budget,
+        "max_results": args.max_results
+    }
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": args.seed,
+        "options": options,
+        "environment": environment(),
+        "runs": []
+    }
+
+    with tempfile.TemporaryDirectory() as folder:
+        for n_rows in args.sizes:
+            run = bench_size(n_rows, args.seed, options, folder)
+            report["runs"].append(run)
+            print_run(run)
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nreport -> {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
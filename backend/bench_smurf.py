@@ -0,0 +1,184 @@
+"""
+Benchmark: row-wise vs columnar detect_smurfing.
+
+    python bench_smurf.py                 # default sizes
+    python bench_smurf.py 10000 200000    # custom row counts
+
+Checks the two produce the same fan_in / fan_out output and prints timings.
+"""
+import sys
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from detectors.smurf import detect_smurfing, THRESHOLD, WINDOW_HOURS
+from graph_builder import intern_accounts
+
+
+# ===============================
+# OLD ROW-WISE IMPLEMENTATION
+# ===============================
+def detect_smurfing_rowwise(df):
+    """Naive reference: a fresh set over every window, windows merged by hand."""
+    fan_in_results = []
+    fan_out_results = []
+
+    incoming = defaultdict(list)
+    outgoing = defaultdict(list)
+
+    for _, row in df.iterrows():
+        sender = row["sender_id"]
+        receiver = row["receiver_id"]
+        timestamp = row["timestamp"]
+        amount = float(row["amount"])
+
+        incoming[receiver].append((sender, timestamp, amount))
+        outgoing[sender].append((receiver, timestamp, amount))
+
+    for source, results, pattern in (
+        (incoming, fan_in_results, "fan_in"),
+        (outgoing, fan_out_results, "fan_out")
+    ):
+        for account, transactions in source.items():
+            if len(transactions) < THRESHOLD:
+                continue
+
+            transactions.sort(key=lambda x: x[1])
+            left = 0
+            spans = []
+
+            for right in range(len(transactions)):
+                while (
+                    transactions[right][1] - transactions[left][1]
+                    > timedelta(hours=WINDOW_HOURS)
+                ):
+                    left += 1
+
+                window = transactions[left:right + 1]
+                if len(set(other for other, _, _ in window)) < THRESHOLD:
+                    continue
+
+                if spans and left <= spans[-1][1]:
+                    spans[-1][1] = right
+                else:
+                    spans.append([left, right])
+
+            if not spans:
+                continue
+
+            members = set()
+            bursts = []
+            for first, last in spans:
+                burst = transactions[first:last + 1]
+                parties = set(other for other, _, _ in burst)
+                members |= parties
+                bursts.append({
+                    "start": burst[0][1].isoformat(),
+                    "end": burst[-1][1].isoformat(),
+                    "transactions": len(burst),
+                    "distinct_count": len(parties),
+                    "total_amount": round(sum(a for _, _, a in burst), 2)
+                })
+
+            results.append({
+                "account": account,
+                "members": list(members),
+                "bursts": bursts,
+                "pattern": pattern
+            })
+
+    return {
+        "fan_in": fan_in_results,
+        "fan_out": fan_out_results
+    }
+
+
+def detect_smurfing_labelled(df):
+    """detect_smurfing with its interned ids turned back into account ids."""
+    labels, src, dst = intern_accounts(df)
+    results = detect_smurfing(df, ids=(src, dst))
+    return {
+        kind: [
+            dict(r, account=labels[r["account"]], members=labels[r["members"]].tolist())
+            for r in found
+        ]
+        for kind, found in results.items()
+    }
+
+
+def same_results(a, b):
+    """Member lists come from sets, so compare them sorted."""
+    def canonical(results):
+        return {
+            kind: [dict(r, members=sorted(r["members"])) for r in found]
+            for kind, found in results.items()
+        }
+    return canonical(a) == canonical(b)
+
+
+# ===============================
+# SYNTHETIC INPUT
+# ===============================
+def make_transactions(n_rows, seed=7):
+    rng = np.random.default_rng(seed)
+    n_accounts = max(n_rows // 4, 50)
+
+    senders = rng.integers(0, n_accounts, n_rows)
+    receivers = rng.integers(0, n_accounts, n_rows)
+
+    start = np.datetime64("2024-01-01T00:00:00")
+    minutes = rng.integers(0, 60 * 24 * 90, n_rows)
+
+    # bursty hub accounts so some 72h windows actually fill up
+    n_hubs = max(n_rows // 500, 2)
+    hubs = rng.integers(0, n_accounts, n_hubs)
+    hub_start = rng.integers(0, 60 * 24 * 85, n_hubs)
+    hub_rows = np.flatnonzero(rng.random(n_rows) < 0.05)
+    which = rng.integers(0, n_hubs, len(hub_rows))
+    burst = hub_start[which] + rng.integers(0, 60 * 24 * 4, len(hub_rows))
+    half = len(hub_rows) // 2
+    receivers[hub_rows[:half]] = hubs[which[:half]]
+    senders[hub_rows[half:]] = hubs[which[half:]]
+    minutes[hub_rows] = burst
+
+    return pd.DataFrame({
+        "transaction_id": [f"T{i:08d}" for i in range(n_rows)],
+        "sender_id": [f"ACC_{a}" for a in senders],
+        "receiver_id": [f"ACC_{a}" for a in receivers],
+        "amount": rng.uniform(10, 10_000, n_rows).round(2),
+        "timestamp": pd.to_datetime(start + minutes.astype("timedelta64[m]"))
+    })
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    result = fn(df)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [1_000, 10_000, 100_000]
+
+    print(
+        f"{'rows':>10} {'bursts':>7} {'row-wise s':>12} "
+        f"{'columnar s':>12} {'speedup':>8}  match"
+    )
+
+    for n_rows in sizes:
+        df = make_transactions(n_rows)
+
+        old, old_s = timed(detect_smurfing_rowwise, df)
+        new, new_s = timed(detect_smurfing_labelled, df)
+
+        match = same_results(old, new)
+        bursts = len(new["fan_in"]) + len(new["fan_out"])
+        print(
+            f"{n_rows:>10} {bursts:>7} {old_s:>12.3f} {new_s:>12.3f} "
+            f"{old_s / max(new_s, 1e-9):>7.1f}x  {match}"
+        )
+
+        if not match:
+            sys.exit(1)
@@ -0,0 +1,90 @@
+import time
+
+
+class Budget:
+    """
+    Wall-clock and result-count limit for one detector run.
+
+    A detector calls start(total_units) once, then check(done, n_results)
+    at safe points and stops as soon as it returns True. Whatever was
+    found up to that point is kept, and report() says how far it got.
+    None for either limit means unlimited.
+
+    cancel: optional threading.Event; once set, the next check() stops
+    the detector with reason "cancelled".
+    """
+
+    def __init__(self, seconds=None, max_results=None, cancel=None):
+        self.seconds = seconds
+        self.max_results = max_results
+        self.cancel = cancel
+        self.started = time.perf_counter()
+        self.ended = None
+        self.deadline = None
+        self.total = 0
+        self.done = 0
+        self.results = 0
+        self.truncated = None   # "deadline" | "max_results" | "cancelled"
+
+    def start(self, total_units):
+        self.started = time.perf_counter()
+        if self.seconds is not None:
+            self.deadline = self.started + self.seconds
+        self.total = total_units
+        self.done = 0
+
+    def add_units(self, n_units):
+        """Grow total_units, for work that is only sized once under way."""
+        self.total += n_units
+
+    def full(self, n_results):
+        return self.max_results is not None and n_results >= self.max_results
+
+    def check(self, done, n_results):
+        """Record progress; True once the budget is exhausted."""
+        self.done = done
+        self.results = n_results
+
+        if self.truncated is None:
+            if self.full(n_results):
+                self.truncated = "max_results"
+            elif (
+                self.deadline is not None
+                and time.perf_counter() >= self.deadline
+            ):
+                self.truncated = "deadline"
+            elif self.cancel_requested():
+                self.truncated = "cancelled"
+
+        return self.truncated is not None
+
+    def cancel_requested(self):
+        return self.cancel is not None and self.cancel.is_set()
+
+    def absorb(self, done, truncated, total=0):
+        """
+        Add progress made on part of the work in another process (total:
+        units that part added along the way, see add_units).
+        """
+        self.total += total
+        self.done += done
+        if self.truncated is None:
+            self.truncated = truncated
+
+    def finish(self, n_results):
+        if self.truncated is None:
+            self.done = self.total
+        self.results = n_results
+        self.ended = time.perf_counter()
+
+    def report(self):
+        ended = self.ended or time.perf_counter()
+        return {
+            "truncated": self.truncated is not None,
+            "reason": self.truncated,
+            "results": self.results,
+            "units_done": self.done,
+            "units_total": self.total,
+            "progress": round(self.done / self.total, 4) if self.total else 1.0,
+            "elapsed_seconds": round(ended - self.started, 3)
+        }
@@ -1,27 +1,408 @@
-import networkx as nx
+from bisect import bisect_right
 
-def normalize_cycle(cycle):
-    min_node = min(cycle)
-    min_index = cycle.index(min_node)
-    return cycle[min_index:] + cycle[:min_index]
+import numpy as np
 
-def detect_cycles(G):
-    unique_cycles = set()
+from budget import Budget
+
+
+MIN_LENGTH = 3
+MAX_LENGTH = 5
+CHECK_EVERY = 1024  # DFS steps between deadline checks
+
+
+def account_rank(labels):
+    """rank[id] = position of the account in sorted account-id order."""
+    rank = [0] * len(labels)
+    for r, u in enumerate(np.argsort(labels, kind="stable").tolist()):
+        rank[u] = r
+    return rank
+
+
+def cycle_components(G, rank, min_length=MIN_LENGTH):
+    """
+    SCCs big enough to hold a cycle, each as (nodes, start nodes in rank
+    order). Every start is an independent unit of search work.
+    """
+    return [
+        (scc, sorted(scc, key=rank.__getitem__))
+        for scc in G.strongly_connected_components()
+        if len(scc) >= min_length
+    ]
+
+
+def detect_cycles(G, min_length=MIN_LENGTH, max_length=MAX_LENGTH, budget=None,
+                  window_hours=None):
+    """
+    Detect simple cycles of min_length..max_length hops.
+
+    - works inside each SCC in place (no subgraph copy)
+    - a cycle is only grown from its smallest account, through larger
+      ones, so it is found exactly once and already in canonical rotation
+    - a backward BFS from the start gives every node's hop distance back
+      to it; a node is only pushed if the path can still close within
+      max_length, so no path longer than max_length is ever explored
+    - budget (optional Budget) is checked per start node and every
+      CHECK_EVERY DFS steps; cycles found before it runs out are kept
+
+    window_hours: temporal mode (see search_temporal_cycles); every hop
+    must follow the previous one and the loop must close within this
+    many hours of its first transfer
+
+    Members are graph node ids (G.accounts[u] is the account id).
+    """
+    if budget is None:
+        budget = Budget()
+
+    # canonical order = account id order (what min() on the ids gave)
+    rank = account_rank(G.accounts)
+    components = cycle_components(G, rank, min_length)
+
+    budget.start(sum(len(starts) for _, starts in components))
+    if window_hours is not None:
+        results = search_temporal_cycles(
+            components,
+            time_sorted_departures(G, components),
+            rank,
+            G.n_nodes,
+            min_length,
+            max_length,
+            window_ns(window_hours),
+            budget
+        )
+        results = canonical_cycles(results, rank)
+        budget.finish(len(results))
+        return results
+
+    results = search_cycles(
+        components,
+        G.successor_lists(),
+        G.predecessor_lists(),
+        rank,
+        G.n_nodes,
+        min_length,
+        max_length,
+        budget
+    )
+    budget.finish(len(results))
+    return results
+
+
+def search_cycles(components, successors, predecessors, rank, n_nodes,
+                  min_length, max_length, budget):
+    """
+    The search loop of detect_cycles over (scc nodes, start nodes) pairs.
+    The starts may be any slice of an SCC's rank-ordered starts, so a
+    process pool can split one big SCC across workers.
+    """
     results = []
 
-    # Step 1: Only check SCCs
-    for scc in nx.strongly_connected_components(G):
-        if len(scc) < 3:
-            continue
-        subgraph = G.subgraph(scc).copy()
-        # Step 2: Find simple cycles in SCC
-        for cycle in nx.simple_cycles(subgraph):
-            if 3 <= len(cycle) <= 5:
-                normalized = tuple(normalize_cycle(cycle))
-                if normalized not in unique_cycles:
-                    unique_cycles.add(normalized)
-                    results.append({
-                        "members": list(normalized),
-                        "pattern": f"cycle_length_{len(cycle)}"
-                    })
+    n = n_nodes
+    component_of = [-1] * n
+    for cid, (scc, _) in enumerate(components):
+        for u in scc:
+            component_of[u] = cid
+
+    on_path = [False] * n
+    done = 0
+    steps = 0
+    stopped = False
+
+    for cid, (scc, starts) in enumerate(components):
+        for start in starts:
+            if budget.check(done, len(results)):
+                stopped = True
+                break
+
+            floor = rank[start]
+
+            # Step 1: hop distance back to start, larger-ranked nodes only
+            dist = {start: 0}
+            frontier = [start]
+            for hops in range(1, max_length):
+                next_frontier = []
+                for v in frontier:
+                    for u in predecessors[v]:
+                        if (
+                            u not in dist
+                            and component_of[u] == cid
+                            and rank[u] > floor
+                        ):
+                            dist[u] = hops
+                            next_frontier.append(u)
+                frontier = next_frontier
+
+            # Step 2: depth-limited DFS that only extends closable paths
+            path = [start]
+            stack = [iter(successors[start])]
+
+            while stack:
+                steps += 1
+                if steps % CHECK_EVERY == 0 and budget.check(done, len(results)):
+                    stopped = True
+                    break
+
+                w = next(stack[-1], None)
+
+                if w is None:
+                    stack.pop()
+                    on_path[path.pop()] = False
+                    continue
+
+                depth = len(path)
+
+                if w == start:
+                    if depth >= min_length:
+                        results.append({
+                            "members": path[:],
+                            "pattern": f"cycle_length_{depth}"
+                        })
+                        if budget.full(len(results)):
+                            budget.check(done, len(results))
+                            stopped = True
+                            break
+                    continue
+
+                back = dist.get(w)
+                if back is None or on_path[w] or depth + back > max_length:
+                    continue
+
+                path.append(w)
+                on_path[w] = True
+                stack.append(iter(successors[w]))
+
+            if stopped:
+                break
+            done += 1
+
+        if stopped:
+            break
+
+    return results
+
+
+# =========================
+# TEMPORAL CYCLES
+# =========================
+def window_ns(hours):
+    return int(hours * 3600 * 1_000_000_000)
+
+
+def time_sorted_departures(G, components):
+    """
+    Every transfer between two members of the same component, grouped by
+    sender and sorted by time (ties in edge, then row order):
+    (ptr, times, targets) as plain lists, node u's departures being
+    times[ptr[u]:ptr[u + 1]] -> targets[...]. Built from the graph's
+    per-edge transaction table, so repeated transfers all count.
+    """
+    n = G.n_nodes
+    component_of = np.full(n, -1, dtype=np.int64)
+    for cid, (scc, _) in enumerate(components):
+        component_of[scc] = cid
+
+    tx_edge = np.repeat(np.arange(G.n_edges), G.tx_count)
+    tx_src = G.edge_sources()[tx_edge]
+    tx_dst = G.out_idx[tx_edge]
+    keep = (component_of[tx_src] >= 0) & (component_of[tx_src] == component_of[tx_dst])
+
+    tx_src = tx_src[keep]
+    times = np.asarray(G.tx_timestamp)[keep]
+    order = np.lexsort((times, tx_src))
+
+    ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tx_src, minlength=n), out=ptr[1:])
+    return ptr.tolist(), times[order].tolist(), tx_dst[keep][order].tolist()
+
+
+def search_temporal_cycles(components, departures, rank, n_nodes,
+                           min_length, max_length, window, budget):
+    """
+    Temporal counterpart of search_cycles: a cycle only counts if its
+    transfers happen in order around the loop, each strictly after the
+    previous one, all within `window` ns of the first.
+
+    A loop can start its clock at any member, so every SCC member is a
+    start (its transfers out are the first hop), the search may pass
+    through any member, and each cycle is kept once per search. Each
+    step binary-searches the sender's time-sorted departures for the
+    ones after the arrival time and before the deadline, keeping the
+    earliest per receiver (arriving earlier never closes fewer loops),
+    so out-of-order or stale paths are never extended. The window prunes
+    far harder than search_cycles' backward hop distances, which would
+    cost a BFS per start here, so paths are only cut at max_length.
+
+    Members are listed from the start, in time order; see
+    canonical_cycles.
+    """
+    ptr, times, targets = departures
+    results = []
+    seen = set()
+
+    on_path = [False] * n_nodes
+
+    def leaving(u, after, deadline):
+        hi = ptr[u + 1]
+        lo = bisect_right(times, after, ptr[u], hi)
+        hi = bisect_right(times, deadline, lo, hi)
+        reached = set()
+        for i in range(lo, hi):
+            w = targets[i]
+            if w not in reached:
+                reached.add(w)
+                yield w, times[i]
+
+    done = 0
+    steps = 0
+    stopped = False
+
+    for _, starts in components:
+        for start in starts:
+            if budget.check(done, len(results)):
+                stopped = True
+                break
+
+            on_path[start] = True
+
+            # one search per first transfer: it fixes the deadline
+            for first in range(ptr[start], ptr[start + 1]):
+                v = targets[first]
+                if v == start:
+                    continue
+
+                deadline = times[first] + window
+                path = [start, v]
+                on_path[v] = True
+                stack = [leaving(v, times[first], deadline)]
+
+                while stack:
+                    steps += 1
+                    if steps % CHECK_EVERY == 0 and budget.check(done, len(results)):
+                        stopped = True
+                        break
+
+                    hop = next(stack[-1], None)
+
+                    if hop is None:
+                        stack.pop()
+                        on_path[path.pop()] = False
+                        continue
+
+                    w, arrival = hop
+                    depth = len(path)
+
+                    if w == start:
+                        if depth >= min_length:
+                            low = min(range(depth), key=lambda i: rank[path[i]])
+                            key = tuple(path[low:] + path[:low])
+                            if key in seen:
+                                continue
+                            seen.add(key)
+                            results.append({
+                                "members": path[:],
+                                "pattern": f"cycle_length_{depth}"
+                            })
+                            if budget.full(len(results)):
+                                budget.check(done, len(results))
+                                stopped = True
+                                break
+                        continue
+
+                    if on_path[w] or depth == max_length:
+                        continue
+
+                    path.append(w)
+                    on_path[w] = True
+                    stack.append(leaving(w, arrival, deadline))
+
+                if stopped:
+                    for u in path:
+                        on_path[u] = False
+                    break
+
+            on_path[start] = False
+            if stopped:
+                break
+            done += 1
+
+        if stopped:
+            break
+
     return results
+
+
+def canonical_cycles(results, rank):
+    """
+    Rotate temporal cycles to start at their smallest account (like
+    detect_cycles' output) and drop repeats, keeping the first.
+    """
+    unique = []
+    seen = set()
+    for cycle in results:
+        members = cycle["members"]
+        low = min(range(len(members)), key=lambda i: rank[members[i]])
+        members = members[low:] + members[:low]
+        key = tuple(members)
+        if key not in seen:
+            seen.add(key)
+            unique.append(dict(cycle, members=members))
+    return unique
+
+
+def cycles_through_edge(G, u, v, min_length=MIN_LENGTH, max_length=MAX_LENGTH):
+    """
+    All simple cycles of min_length..max_length hops that use edge u -> v,
+    as node id lists rotated so the smallest account id comes first.
+
+    Same backward-distance pruning as detect_cycles, but rooted at one
+    edge and reading adjacency lazily, so the cost depends only on the
+    edge's neighbourhood. Used to update cycles after new edges arrive.
+    """
+    if u == v:
+        return []
+
+    # hop distance back to u, up to max_length - 1 hops
+    dist = {u: 0}
+    frontier = [u]
+    for hops in range(1, max_length):
+        next_frontier = []
+        for x in frontier:
+            for w in G.predecessors(x).tolist():
+                if w not in dist:
+                    dist[w] = hops
+                    next_frontier.append(w)
+        frontier = next_frontier
+
+    if v not in dist or 1 + dist[v] > max_length:
+        return []
+
+    labels = G.accounts
+    found = []
+    path = [u, v]
+    on_path = {u, v}
+    stack = [iter(G.successors(v).tolist())]
+
+    while stack:
+        w = next(stack[-1], None)
+
+        if w is None:
+            stack.pop()
+            on_path.discard(path.pop())
+            continue
+
+        depth = len(path)
+
+        if w == u:
+            if depth >= min_length:
+                i = min(range(depth), key=lambda k: labels[path[k]])
+                found.append(path[i:] + path[:i])
+            continue
+
+        back = dist.get(w)
+        if back is None or w in on_path or depth + back > max_length:
+            continue
+
+        path.append(w)
+        on_path.add(w)
+        stack.append(iter(G.successors(w).tolist()))
+
+    return found
@@ -1,35 +1,167 @@
-def detect_shell_chains(G, cycle_results, max_depth=5):
-    shell_results = []
-    visited_chains = set()
+from budget import Budget
+
+
+MAX_SHELL_DEGREE = 3
+# What MAX_SHELL_DEGREE counts: "counterparties" (distinct neighbours) or
+# "transfers" (every transaction, so repeated payments between the same
+# two accounts count each time)
+SHELL_DEGREE = "counterparties"
+MIN_CHAIN_NODES = 4
+MAX_DEPTH = 5  # DFS depth limit; chains have at most MAX_DEPTH + 1 nodes
+
+
+def maximal_chains(chains):
+    """
+    Drop every chain that is a contiguous piece of another chain.
+
+    All suffixes of all chains go into a prefix trie. A chain then sits
+    inside another one exactly when its trie node has children (it is a
+    proper prefix of some suffix) or it was also inserted as a suffix
+    starting past position 0. Order of the surviving chains is kept.
+    """
+    inner = -1  # trie key marking "reached as a later suffix"
+    root = {}
+
+    for chain in chains:
+        for offset in range(len(chain)):
+            node = root
+            for u in chain[offset:]:
+                node = node.setdefault(u, {})
+            if offset:
+                node[inner] = True
+
+    kept = []
+    for chain in chains:
+        node = root
+        for u in chain:
+            node = node[u]
+        if not node:
+            kept.append(chain)
+    return kept
 
-    # All cycle nodes to avoid
-    cycle_nodes = set(node for cycle in cycle_results for node in cycle["members"])
 
-    # Only consider nodes with degree <=3 as intermediates
-    candidate_nodes = [n for n in G.nodes if G.degree(n) <= 3 and n not in cycle_nodes]
+def chains_from(start, successors, allowed, on_path, path, max_depth=MAX_DEPTH):
+    """
+    Yield every shell chain (tuple of ids) that starts at start.
 
-    def dfs(current, path):
-        if len(path) > max_depth:
-            return
+    successors: id -> list of successor ids
+    allowed: id -> truthy if the node may sit on a chain
+    on_path / path: the caller's reusable bitmap and path stack; both are
+    left clean when the generator finishes or is closed early
+    """
+    path.append(start)
+    on_path[start] = 1
+    stack = [iter(successors(start))]
 
-        for neighbor in G.successors(current):
-            if neighbor in path:
+    try:
+        while stack:
+            w = next(stack[-1], None)
+
+            if w is None:
+                stack.pop()
+                on_path[path.pop()] = 0
                 continue
-            if neighbor in cycle_nodes or G.degree(neighbor) > 3:
+
+            if on_path[w] or not allowed[w]:
                 continue
 
-            new_path = path + [neighbor]
-            if len(new_path) >= 4:
-                chain_tuple = tuple(new_path)
-                if chain_tuple not in visited_chains:
-                    visited_chains.add(chain_tuple)
-                    shell_results.append({
-                        "members": new_path,
-                        "pattern": "shell_chain"
-                    })
-            dfs(neighbor, new_path)
+            path.append(w)
+
+            if len(path) >= MIN_CHAIN_NODES:
+                yield tuple(path)
+
+            if len(path) <= max_depth:
+                on_path[w] = 1
+                stack.append(iter(successors(w)))
+            else:
+                path.pop()
+    finally:
+        for u in path:
+            on_path[u] = 0
+        path.clear()
+
+
+def shell_degree(G):
+    """Per-account degree MAX_SHELL_DEGREE applies to (see SHELL_DEGREE)."""
+    return G.tx_degree if SHELL_DEGREE == "transfers" else G.degree
+
+
+def shell_allowed(G, cycle_nodes):
+    """Bool array: degree <= MAX_SHELL_DEGREE and not in any cycle."""
+    allowed = shell_degree(G) <= MAX_SHELL_DEGREE
+    allowed[list(cycle_nodes)] = False
+    return allowed
+
+
+def search_chains(starts, successors, allowed, n_nodes, max_depth, budget):
+    """
+    Every chain (tuple of ids) from each of starts, in start order.
+    Split out of detect_shell_chains so a process pool can run slices
+    of the start list.
+    """
+    chains = []
+    on_path = bytearray(n_nodes)
+    path = []
+
+    # Budget is checked between start nodes; one DFS is at most max_depth
+    # deep over degree <= 3 nodes, so it cannot run away on its own
+    for done, start in enumerate(starts):
+        if budget.check(done, len(chains)):
+            break
+
+        walker = chains_from(start, successors, allowed, on_path, path, max_depth)
+        for chain in walker:
+            chains.append(chain)
+            if budget.full(len(chains)):
+                break
+        walker.close()
+    else:
+        budget.check(len(starts), len(chains))
+
+    return chains
+
+
+def detect_shell_chains(G, cycle_results, max_depth=MAX_DEPTH, budget=None,
+                        maximal_only=False):
+    """
+    Detect shell chains:
+    - Path length >= 4 nodes (3+ hops)
+    - Every node must have total_degree <= 3
+    - No node may belong to a detected cycle
+
+    Members are graph node ids, like cycle_results' members.
+
+    Iterative DFS over a reused path stack with an on-path bitmap; degrees
+    are read from the graph's precomputed array. With maximal_only, only
+    chains not contained in a longer chain are returned.
+    """
+    shell_results = []
+    if budget is None:
+        budget = Budget()
+
+    successors = G.successor_lists().__getitem__
+
+    # Intermediates must be low-degree and not part of any cycle
+    allowed = shell_allowed(
+        G,
+        set(node for cycle in cycle_results for node in cycle["members"])
+    ).tolist()
+
+    candidate_nodes = [n for n in G.nodes if allowed[n]]
+
+    budget.start(len(candidate_nodes))
+    chains = search_chains(
+        candidate_nodes, successors, allowed, G.n_nodes, max_depth, budget
+    )
+
+    if maximal_only:
+        chains = maximal_chains(chains)
 
-    for node in candidate_nodes:
-        dfs(node, [node])
+    for chain in chains:
+        shell_results.append({
+            "members": list(chain),
+            "pattern": "shell_chain"
+        })
 
+    budget.finish(len(shell_results))
     return shell_results
@@ -1,89 +1,240 @@
-from collections import defaultdict
-from datetime import timedelta
+import numpy as np
+import pandas as pd
 
+from budget import Budget
+from graph_builder import intern_accounts, timestamps_to_ns
 
-THRESHOLD = 10  # requirement: 10+ accounts in 72h window
-WINDOW_HOURS = 72
-
-
-def detect_smurfing(df):
-    fan_in_results = []
-    fan_out_results = []
-
-    # Group incoming and outgoing transactions
-    incoming = defaultdict(list)
-    outgoing = defaultdict(list)
-
-    for _, row in df.iterrows():
-        sender = row["sender_id"]
-        receiver = row["receiver_id"]
-        timestamp = row["timestamp"]
-
-        incoming[receiver].append((sender, timestamp))
-        outgoing[sender].append((receiver, timestamp))
 
-    # --- FAN IN DETECTION ---
-    for account, transactions in incoming.items():
-        if len(transactions) < THRESHOLD:
+THRESHOLD = 10  # requirement: 10+ distinct accounts in 72h window
+WINDOW_HOURS = 72
+NS_PER_HOUR = 3_600_000_000_000
+
+
+class BurstScan:
+    """
+    Distinct-counterparty sliding window over every account at once.
+
+    accounts: int codes of the account the window is keyed on
+    counterparties: int codes of the other side of each transaction
+    ts: int64 nanosecond timestamps; amount: float amounts (same length)
+
+    A WINDOW_HOURS look-back window ending at a transaction qualifies
+    when it holds THRESHOLD+ distinct counterparties. Overlapping
+    qualifying windows are merged, so each account gets every maximal
+    burst, not just its first one.
+
+    - constructing it runs the columnar pass: one sort by (account,
+      time), then the windows holding THRESHOLD+ transactions (necessary
+      for THRESHOLD+ distinct counterparties) pick the candidate accounts
+    - walk() then goes through the candidates one at a time, with a
+      running counterparty -> count map updated as the window slides:
+      O(1) per transaction, linear in the account's transactions.
+      Callers can stop or report progress between candidates; len() is
+      the number of candidates
+    """
+
+    def __init__(self, accounts, counterparties, ts, amount):
+        self.counterparties = counterparties
+        self.amount = amount
+        self.spans = []  # [lo, hi) of each candidate in sorted order
+
+        n = len(accounts)
+        if n < THRESHOLD:
+            return
+
+        # one sort by (account, timestamp); lexsort is stable so equal
+        # timestamps keep file order
+        order = np.lexsort((ts, accounts))
+        acc = accounts[order].astype(np.int64)
+        t = ts[order]
+
+        # dense time rank lets (account, time) share one sortable int64 key
+        unique_t, t_rank = np.unique(t, return_inverse=True)
+        stride = len(unique_t) + 1
+        composite = acc * stride + t_rank
+
+        # left edge of the window ending at each transaction
+        lower = np.searchsorted(
+            unique_t, t - WINDOW_HOURS * NS_PER_HOUR, side="left"
+        )
+        left = np.searchsorted(composite, acc * stride + lower, side="left")
+
+        hits = np.flatnonzero(np.arange(n) - left + 1 >= THRESHOLD)
+        if len(hits) == 0:
+            return
+
+        group_starts = np.flatnonzero(np.r_[True, acc[1:] != acc[:-1]])
+        group_ends = np.r_[group_starts[1:], n]
+        candidates = np.unique(np.searchsorted(group_starts, hits, side="right") - 1)
+
+        # walk in order of first appearance, like the old dict iteration
+        first_row = np.minimum.reduceat(order, group_starts)[candidates]
+        candidates = candidates[np.argsort(first_row, kind="stable")]
+
+        self.order = order
+        self.acc = acc
+        self.t = t
+        self.left = left
+        self.spans = list(zip(
+            group_starts[candidates].tolist(), group_ends[candidates].tolist()
+        ))
+
+    def __len__(self):
+        return len(self.spans)
+
+    def walk(self):
+        """
+        Yields (account_code, counterparty codes, bursts) for every
+        candidate, in order of the account's first appearance in the
+        input; bursts is empty when no window held THRESHOLD+ distinct
+        counterparties. Counterparties are listed in order of their
+        first transfer, each burst is a dict with start / end (ns),
+        transactions, distinct_count and total_amount.
+        """
+        for lo, hi in self.spans:
+            rows = self.order[lo:hi]
+            bursts, members = walk_account(
+                self.counterparties[rows].tolist(),
+                self.t[lo:hi].tolist(),
+                self.amount[rows].tolist(),
+                (self.left[lo:hi] - lo).tolist()
+            )
+            yield int(self.acc[lo]), members, bursts
+
+
+def find_bursts(accounts, counterparties, ts, amount):
+    """Every account with a burst, as (account_code, counterparties, bursts) (see BurstScan)."""
+    for account, members, bursts in BurstScan(accounts, counterparties, ts, amount).walk():
+        if bursts:
+            yield account, members, bursts
+
+
+def walk_account(others, times, amounts, lefts):
+    """
+    Two-pointer pass over one account's transactions in time order
+    (lefts: window start of each one). Returns (bursts, counterparties
+    across them in order of their first transfer).
+    """
+    counts = {}
+    left = 0
+    spans = []  # [first, last] transaction of each burst
+
+    for right, other in enumerate(others):
+        counts[other] = counts.get(other, 0) + 1
+        while left < lefts[right]:
+            gone = others[left]
+            if counts[gone] == 1:
+                del counts[gone]
+            else:
+                counts[gone] -= 1
+            left += 1
+
+        if len(counts) < THRESHOLD:
             continue
 
-        # sort by timestamp
-        transactions.sort(key=lambda x: x[1])
-
-        left = 0
-
-        for right in range(len(transactions)):
-            while (
-                transactions[right][1] - transactions[left][1]
-                > timedelta(hours=WINDOW_HOURS)
-            ):
-                left += 1
-
-            window_size = right - left + 1
-
-            if window_size >= THRESHOLD:
-                members = list(
-                    set(sender for sender, _ in transactions[left:right+1])
-                )
-
-                fan_in_results.append({
-                    "account": account,
-                    "members": members,
-                    "pattern": "fan_in"
-                })
-                break
-
-    # --- FAN OUT DETECTION ---
-    for account, transactions in outgoing.items():
-        if len(transactions) < THRESHOLD:
+        if spans and left <= spans[-1][1]:
+            spans[-1][1] = right  # overlaps the open burst: extend it
+        else:
+            spans.append([left, right])
+
+    # spans are disjoint, so summing them up stays linear
+    bursts = []
+    members = {}
+    for first, last in spans:
+        parties = dict.fromkeys(others[first:last + 1])
+        members.update(parties)
+        bursts.append({
+            "start": times[first],
+            "end": times[last],
+            "transactions": last - first + 1,
+            "distinct_count": len(parties),
+            "total_amount": round(sum(amounts[first:last + 1]), 2)
+        })
+    return bursts, list(members)
+
+
+def burst_records(bursts):
+    """find_bursts output -> JSON-friendly records (ISO timestamps)."""
+    return [
+        dict(
+            burst,
+            start=pd.Timestamp(burst["start"]).isoformat(),
+            end=pd.Timestamp(burst["end"]).isoformat()
+        )
+        for burst in bursts
+    ]
+
+
+def detect_smurfing(df, budget=None, ids=None, patterns=("fan_in", "fan_out"),
+                    done_at=None):
+    """
+    Fan-in / fan-out: accounts receiving from / sending to THRESHOLD+
+    distinct counterparties within WINDOW_HOURS (see find_bursts). Each
+    result lists the counterparties of all the account's bursts and
+    the bursts themselves.
+
+    ids: (sender ids, receiver ids) per row, e.g. G.row_accounts();
+    interned here (the way build_graph does) if not given. Accounts
+    and members are reported as these ids.
+
+    budget (optional Budget) caps the combined fan_in + fan_out results
+    and the time spent. It is checked after each direction's columnar
+    pass and after every candidate account walked; units are candidate
+    accounts, counted once both passes have picked them.
+
+    patterns: the directions to run (the other one's list stays empty);
+    parallel.py runs each direction as its own task
+    done_at: optional list, gets the units done as each result is found
+    (for merging capped parallel runs, see parallel.collect)
+    """
+    results = {"fan_in": [], "fan_out": []}
+    if budget is None:
+        budget = Budget()
+
+    if ids is None:
+        _, sender_codes, receiver_codes = intern_accounts(df)
+    else:
+        sender_codes, receiver_codes = ids
+
+    ts = timestamps_to_ns(df["timestamp"].to_numpy())
+    amount = pd.to_numeric(df["amount"], errors="coerce").to_numpy(
+        dtype=np.float64
+    )
+
+    budget.start(0)
+    scans = []
+    for pattern, keys, others in (
+        ("fan_in", receiver_codes, sender_codes),
+        ("fan_out", sender_codes, receiver_codes)
+    ):
+        if pattern not in patterns:
             continue
-
-        transactions.sort(key=lambda x: x[1])
-
-        left = 0
-
-        for right in range(len(transactions)):
-            while (
-                transactions[right][1] - transactions[left][1]
-                > timedelta(hours=WINDOW_HOURS)
-            ):
-                left += 1
-
-            window_size = right - left + 1
-
-            if window_size >= THRESHOLD:
-                members = list(
-                    set(receiver for receiver, _ in transactions[left:right+1])
-                )
-
-                fan_out_results.append({
+        if budget.check(0, 0):
+            break
+        scan = BurstScan(keys, others, ts, amount)
+        budget.add_units(len(scan))
+        scans.append((pattern, scan))
+
+    walked = 0
+    n_results = 0
+    for pattern, scan in scans:
+        if budget.check(walked, n_results):
+            break
+        for account, members, bursts in scan.walk():
+            walked += 1
+            if bursts:
+                results[pattern].append({
                     "account": account,
                     "members": members,
-                    "pattern": "fan_out"
+                    "bursts": burst_records(bursts),
+                    "pattern": pattern
                 })
+                n_results += 1
+                if done_at is not None:
+                    done_at.append(walked)
+            if budget.check(walked, n_results):
                 break
 
-    return {
-        "fan_in": fan_in_results,
-        "fan_out": fan_out_results
-    }
\ No newline at end of file
+    budget.finish(n_results)
+
+    return results
@@ -1,12 +1,37 @@
 import json
 import time
 import os
+import zlib
 
 
-def build_final_json(suspicious_accounts, fraud_rings, total_accounts, start_time):
+def label_accounts(suspicious_accounts, fraud_rings, labels):
+    """
+    Interned ids -> account ids, in place: every account_id and ring
+    member_accounts list. labels: id -> account id array (G.accounts).
+    """
+    for acc in suspicious_accounts:
+        acc["account_id"] = labels[acc["account_id"]]
+    for ring in fraud_rings:
+        ring["member_accounts"] = labels[ring["member_accounts"]].tolist()
+
+
+def build_final_json(suspicious_accounts, fraud_rings, total_accounts, start_time,
+                     budget_report=None, parse_report=None, stage_timings=None,
+                     account_labels=None):
     """
     Builds final JSON exactly as hackathon requires
+
+    budget_report: optional {detector: Budget.report()}; when given the
+    summary also lists truncated detectors and how far each one got
+    parse_report: optional row counts from chunked parsing (read, kept,
+    dropped per reason), added to the summary as "ingestion"
+    stage_timings: optional StageRecorder.report(), added as is
+    account_labels: when accounts and rings carry interned ids (see
+    run_pipeline), the id -> account id array to translate them with;
+    this is the only place ids turn back into strings
     """
+    if account_labels is not None:
+        label_accounts(suspicious_accounts, fraud_rings, account_labels)
 
     # =========================
     # SORT suspicious_accounts DESC (IMPORTANT)
@@ -27,6 +52,19 @@ def build_final_json(suspicious_accounts, fraud_rings, total_accounts, start_tim
         "processing_time_seconds": round(time.time() - start_time, 2)
     }
 
+    if budget_report is not None:
+        summary["truncated_detectors"] = [
+            name for name, report in budget_report.items()
+            if report["truncated"]
+        ]
+        summary["detector_budgets"] = budget_report
+
+    if parse_report is not None:
+        summary["ingestion"] = parse_report
+
+    if stage_timings is not None:
+        summary["stage_timings"] = stage_timings
+
     # =========================
     # FINAL JSON
     # =========================
@@ -39,12 +77,100 @@ def build_final_json(suspicious_accounts, fraud_rings, total_accounts, start_tim
     return final_json
 
 
+# ===============================
+# STREAMING ENCODER
+# ===============================
+FORMATS = ("pretty", "compact", "ndjson")
+RECORD_SECTIONS = ("suspicious_accounts", "fraud_rings")
+BATCH_RECORDS = 1000  # records encoded per yielded piece
+BATCH_PIECES = 16384  # pretty-encoder fragments joined per yielded piece
+GZIP_LEVEL = 6
+
+# built once: json.dumps with non-default options makes a new encoder per call
+COMPACT = json.JSONEncoder(separators=(",", ":"))
+PRETTY = json.JSONEncoder(indent=2)
+MIMETYPES = {
+    "pretty": "application/json",
+    "compact": "application/json",
+    "ndjson": "application/x-ndjson"
+}
+
+
+def batched(records, size=BATCH_RECORDS):
+    for i in range(0, len(records), size):
+        yield records[i:i + size]
+
+
+def iter_json(final_json, fmt="pretty"):
+    """
+    Yield final_json as text in pieces, so the whole document never
+    exists as one string.
+
+    - pretty: same text as json.dump(final_json, indent=2)
+    - compact: no whitespace
+    - ndjson: one object per line, summary first; each line has a
+      "record" field (summary | suspicious_account | fraud_ring)
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+
+    if fmt == "ndjson":
+        yield COMPACT.encode({"record": "summary", **final_json["summary"]}) + "\n"
+        for section in RECORD_SECTIONS:
+            tag = {"record": section[:-1]}
+            for batch in batched(final_json[section]):
+                yield "".join(COMPACT.encode({**tag, **r}) + "\n" for r in batch)
+        return
+
+    if fmt == "compact":
+        yield "{"
+        for section in RECORD_SECTIONS:
+            yield f'"{section}":['
+            first = True
+            for batch in batched(final_json[section]):
+                # one C-encoder call per batch; drop the list brackets
+                yield ("" if first else ",") + COMPACT.encode(batch)[1:-1]
+                first = False
+            yield "],"
+        yield f'"summary":{COMPACT.encode(final_json["summary"])}}}'
+        return
+
+    # pretty: the stdlib's own incremental encoder, in batches of pieces
+    pieces = []
+    for piece in PRETTY.iterencode(final_json):
+        pieces.append(piece)
+        if len(pieces) >= BATCH_PIECES:
+            yield "".join(pieces)
+            pieces.clear()
+    yield "".join(pieces)
+
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    """Gzip a stream of text pieces, yielding compressed bytes."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 # ===============================
 # SAVE JSON (for download button)
 # ===============================
-def save_json(final_json, path="outputs/result.json"):
+def save_json(final_json, path="outputs/result.json", fmt="pretty",
+              compress=False):
+    """Stream final_json to path (see iter_json); compress: gzip it."""
     directory = os.path.dirname(path)
     if directory:
         os.makedirs(directory, exist_ok=True)
-    with open(path, "w") as f:
-        json.dump(final_json, f, indent=2)
+
+    chunks = iter_json(final_json, fmt)
+    if compress:
+        with open(path, "wb") as f:
+            for data in gzip_chunks(chunks):
+                f.write(data)
+    else:
+        with open(path, "w") as f:
+            for chunk in chunks:
+                f.write(chunk)
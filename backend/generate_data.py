@@ -0,0 +1,280 @@
+"""
+Seeded synthetic transactions with planted money-muling patterns.
+
+    python generate_data.py 100000 data.csv             # seed 0
+    python generate_data.py 1000000 data.csv --seed 3
+
+Writes the CSV (same columns as the sample files) and, next to it,
+<name>.planted.json listing every planted pattern, so detection recall
+can be measured (see bench_pipeline.py).
+
+Background traffic:
+- customers and a small set of merchants with skewed popularity
+- customer -> merchant payments, peer-to-peer transfers within small
+  circles of friends and merchant payouts to a few fixed staff accounts
+  (held elsewhere: they only receive), over BACKGROUND_DAYS with a
+  daily rhythm
+- money only moves customer -> friend further along -> merchant ->
+  staff, so background traffic has no cycles of detectable length
+- a merchant's payers change every PAYER_BLOCK_HOURS and only
+  PAYERS_PER_BLOCK pay in each block, so no WINDOW_HOURS window (at most
+  three blocks) holds THRESHOLD distinct payers: busy merchants are not
+  fan-in hubs
+- log-normal amounts
+
+Planted on fresh accounts (about FRAUD_SHARE of the rows, at least one
+of each):
+- cycles of 3-5 hops, a few hours per hop
+- fan-in / fan-out bursts of THRESHOLD+ counterparties inside 48h
+- shell chains of 4 to MAX_DEPTH + 1 accounts, each of degree <= 2
+"""
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from detectors.cycle import MIN_LENGTH, MAX_LENGTH
+from detectors.smurf import THRESHOLD, WINDOW_HOURS
+from detectors.shell import MIN_CHAIN_NODES, MAX_DEPTH
+
+
+BACKGROUND_DAYS = 90
+FRAUD_SHARE = 0.01
+MERCHANT_SHARE = 0.02
+ROWS_PER_ACCOUNT = 10
+STAFF_PER_MERCHANT = 5      # payouts go to a fixed few accounts per merchant
+FRIENDS_RANGE = 20          # peer transfers stay within nearby customer ids
+PAYER_BLOCK_HOURS = WINDOW_HOURS // 2
+PAYERS_PER_BLOCK = (THRESHOLD - 1) // 3
+START = np.datetime64("2024-01-01T00:00:00")
+
+# customer -> merchant, peer to peer, merchant -> staff
+FLOW_SHARES = [0.75, 0.2, 0.05]
+
+# relative activity per hour of day
+HOURLY = np.array([
+    1, 1, 1, 1, 1, 2, 4, 7, 9, 10, 10, 11,
+    12, 11, 10, 10, 10, 11, 12, 11, 9, 6, 3, 2
+], dtype=float)
+
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 24 * SECONDS_PER_HOUR
+
+
+# ===============================
+# BACKGROUND TRAFFIC
+# ===============================
+def background_traffic(rng, n_rows, n_accounts):
+    """(src, dst, seconds, amount) arrays of plain activity."""
+    n_merchants = max(int(n_accounts * MERCHANT_SHARE), 5)
+    n_staff = n_merchants * STAFF_PER_MERCHANT
+    n_customers = n_accounts - n_merchants - n_staff
+    first_customer = n_merchants + n_staff
+
+    # merchants are ids [0, n_merchants), then their staff, then
+    # customers; merchant popularity follows a power law
+    merchant_p = 1.0 / np.arange(1, n_merchants + 1) ** 0.9
+    merchant_p /= merchant_p.sum()
+
+    # a few customers are far more active than the rest
+    customer_p = rng.lognormal(0.0, 1.0, n_customers)
+    customer_p /= customer_p.sum()
+
+    def customers(size):
+        return first_customer + rng.choice(n_customers, size, p=customer_p)
+
+    def merchants(size):
+        return rng.choice(n_merchants, size, p=merchant_p)
+
+    day = rng.integers(0, BACKGROUND_DAYS, n_rows)
+    hour = rng.choice(24, n_rows, p=HOURLY / HOURLY.sum())
+    seconds = (
+        day * SECONDS_PER_DAY
+        + hour * SECONDS_PER_HOUR
+        + rng.integers(0, SECONDS_PER_HOUR, n_rows)
+    )
+
+    flow = rng.choice(3, n_rows, p=FLOW_SHARES)
+    src = np.empty(n_rows, dtype=np.int64)
+    dst = np.empty(n_rows, dtype=np.int64)
+
+    # each (merchant, block) has its own few payers
+    pay = flow == 0
+    n_pay = pay.sum()
+    n_blocks = -(-BACKGROUND_DAYS * 24 // PAYER_BLOCK_HOURS)
+    payers = customers((n_merchants, n_blocks, PAYERS_PER_BLOCK))
+    dst[pay] = merchants(n_pay)
+    block = seconds[pay] // (PAYER_BLOCK_HOURS * SECONDS_PER_HOUR)
+    src[pay] = payers[dst[pay], block, rng.integers(0, PAYERS_PER_BLOCK, n_pay)]
+
+    # friends: a few ids further along, never oneself; one direction
+    # only, so friends do not pass money round in background cycles
+    p2p = flow == 1
+    n_p2p = p2p.sum()
+    offset = rng.integers(1, FRIENDS_RANGE + 1, n_p2p)
+    src[p2p] = customers(n_p2p)
+    dst[p2p] = first_customer + (src[p2p] - first_customer + offset) % n_customers
+
+    # payroll: every merchant pays its own few staff accounts
+    payout = flow == 2
+    n_payout = payout.sum()
+    src[payout] = rng.integers(0, n_merchants, n_payout)
+    dst[payout] = n_merchants + src[payout] * STAFF_PER_MERCHANT + rng.integers(
+        0, STAFF_PER_MERCHANT, n_payout
+    )
+
+    amount = rng.lognormal(4.0, 1.1, n_rows)
+    amount[payout] *= 8
+
+    return src, dst, seconds, np.round(amount, 2)
+
+
+# ===============================
+# PLANTED PATTERNS
+# ===============================
+class Planter:
+    """Appends planted transactions on fresh accounts and records them."""
+
+    def __init__(self, rng, first_account):
+        self.rng = rng
+        self.next_account = first_account
+        self.src = []
+        self.dst = []
+        self.seconds = []
+        self.amount = []
+        self.planted = {"cycles": [], "fan_in": [], "fan_out": [], "shell_chains": []}
+
+    def accounts(self, n):
+        ids = list(range(self.next_account, self.next_account + n))
+        self.next_account += n
+        return ids
+
+    def start_time(self, span_hours):
+        latest = BACKGROUND_DAYS * SECONDS_PER_DAY - span_hours * SECONDS_PER_HOUR
+        return int(self.rng.integers(0, latest))
+
+    def add(self, src, dst, seconds, amount):
+        self.src.append(src)
+        self.dst.append(dst)
+        self.seconds.append(seconds)
+        self.amount.append(round(float(amount), 2))
+
+    def hops(self, path, amount):
+        """Money passed along path a few hours per hop, minus a small cut."""
+        t = self.start_time(len(path) * 12)
+        for u, v in zip(path, path[1:]):
+            t += int(self.rng.integers(1, 12)) * SECONDS_PER_HOUR
+            amount *= self.rng.uniform(0.9, 0.99)
+            self.add(u, v, t, amount)
+
+    def cycle(self):
+        members = self.accounts(int(self.rng.integers(MIN_LENGTH, MAX_LENGTH + 1)))
+        self.hops(members + members[:1], self.rng.uniform(5_000, 50_000))
+        self.planted["cycles"].append(members)
+
+    def burst(self, pattern):
+        hub, *others = self.accounts(1 + int(self.rng.integers(THRESHOLD, THRESHOLD + 6)))
+        t = self.start_time(48)
+        offsets = np.sort(self.rng.integers(0, 48 * SECONDS_PER_HOUR, len(others)))
+        for other, offset in zip(others, offsets.tolist()):
+            # structured just under a 10k reporting line
+            amount = self.rng.uniform(8_000, 9_900)
+            if pattern == "fan_in":
+                self.add(other, hub, t + offset, amount)
+            else:
+                self.add(hub, other, t + offset, amount)
+        self.planted[pattern].append(hub)
+
+    def shell_chain(self):
+        path = self.accounts(int(self.rng.integers(MIN_CHAIN_NODES, MAX_DEPTH + 2)))
+        self.hops(path, self.rng.uniform(10_000, 100_000))
+        self.planted["shell_chains"].append(path)
+
+    def plant(self, n_rows):
+        """Round-robin over the patterns until about n_rows rows are planted."""
+        makers = [
+            self.cycle,
+            lambda: self.burst("fan_in"),
+            lambda: self.burst("fan_out"),
+            self.shell_chain
+        ]
+        i = 0
+        while i < len(makers) or len(self.src) < n_rows:
+            makers[i % len(makers)]()
+            i += 1
+
+
+# ===============================
+# DATASET
+# ===============================
+def generate_transactions(n_rows, seed=0, fraud_share=FRAUD_SHARE):
+    """
+    returns (df, planted): df has the pipeline's CSV columns, rows in
+    time order; planted maps pattern -> account ids (lists for cycles
+    and shell chains, the hub for fan-in / fan-out)
+    """
+    rng = np.random.default_rng(seed)
+    n_accounts = max(n_rows // ROWS_PER_ACCOUNT, 100)
+
+    planter = Planter(rng, first_account=n_accounts)
+    planter.plant(int(n_rows * fraud_share))
+
+    n_background = max(n_rows - len(planter.src), 0)
+    src, dst, seconds, amount = background_traffic(rng, n_background, n_accounts)
+
+    src = np.concatenate([src, planter.src])
+    dst = np.concatenate([dst, planter.dst])
+    seconds = np.concatenate([seconds, planter.seconds])
+    amount = np.concatenate([amount, planter.amount])
+
+    order = np.argsort(seconds, kind="stable")
+    n = len(order)
+
+    def label(ids):
+        return "ACC_" + pd.Series(ids).astype(str)
+
+    df = pd.DataFrame({
+        "transaction_id": "TX_" + pd.Series(np.arange(n)).astype(str).str.zfill(9),
+        "sender_id": label(src[order]),
+        "receiver_id": label(dst[order]),
+        "amount": amount[order],
+        "timestamp": (START + seconds[order].astype("timedelta64[s]")).astype("datetime64[s]")
+    })
+
+    planted = {
+        "cycles": [[f"ACC_{a}" for a in c] for c in planter.planted["cycles"]],
+        "fan_in": [f"ACC_{a}" for a in planter.planted["fan_in"]],
+        "fan_out": [f"ACC_{a}" for a in planter.planted["fan_out"]],
+        "shell_chains": [[f"ACC_{a}" for a in c] for c in planter.planted["shell_chains"]]
+    }
+    return df, planted
+
+
+def write_dataset(df, planted, path):
+    """CSV at path, planted patterns at <path without .csv>.planted.json."""
+    df.to_csv(path, index=False, date_format="%Y-%m-%d %H:%M:%S")
+    planted_path = planted_path_for(path)
+    with open(planted_path, "w") as f:
+        json.dump(planted, f)
+    return planted_path
+
+
+def planted_path_for(path):
+    base = path[:-4] if path.endswith(".csv") else path
+    return f"{base}.planted.json"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("rows", type=int)
+    parser.add_argument("out")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fraud-share", type=float, default=FRAUD_SHARE)
+    args = parser.parse_args()
+
+    df, planted = generate_transactions(args.rows, args.seed, args.fraud_share)
+    planted_path = write_dataset(df, planted, args.out)
+
+    counts = {k: len(v) for k, v in planted.items()}
+    print(f"{len(df)} rows -> {args.out}; planted {counts} -> {planted_path}")
@@ -1,18 +1,679 @@
+import numpy as np
+import pandas as pd
 import networkx as nx
 
 
-def build_graph(df):
-    G = nx.DiGraph()
+def timestamps_to_ns(values):
+    """Datetime column/array -> int64 nanoseconds since epoch."""
+    return np.asarray(values, dtype="datetime64[ns]").view(np.int64)
+
+
+class TransactionGraph:
+    """
+    Compact directed transaction graph.
+
+    - accounts are factorized to int32 ids in order of first appearance
+      (same node order nx.DiGraph would give)
+    - out- and in-adjacency are CSR arrays (ptr / idx)
+    - edge attributes live in NumPy columns aligned with the out-CSR
+    - one edge per (sender, receiver) pair, last transaction wins,
+      exactly like repeated add_edge calls on a DiGraph
+    - every transfer is kept too: tx_ptr indexes each edge's slice of a
+      transaction table (tx_row / tx_amount / tx_timestamp, oldest first),
+      and per-edge aggregates (tx_count, total_amount, min_amount,
+      max_amount, first_timestamp, last_timestamp) come precomputed;
+      tx_degree counts transfers per account where degree counts
+      counterparties
+
+    All traversal methods work on integer ids; use `accounts[i]` and
+    `account_ids[label]` to translate.
+    """
+
+    def __init__(self, accounts, src, dst, amount, timestamp, first_row=None,
+                 transactions=None):
+        self.accounts = accounts
+        self.account_ids = {acc: i for i, acc in enumerate(accounts.tolist())}
+
+        n = len(accounts)
+        if first_row is None:
+            first_row = np.arange(len(src))
+        self.first_row = first_row
+        self.n_rows = len(src)
+
+        # out-CSR: edges arrive already sorted by (src, insertion order)
+        self.out_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=self.out_ptr[1:])
+        self.out_idx = dst
+        self.amount = amount
+        self.timestamp = timestamp
+
+        # in-CSR: sort by destination, then by the row that created the
+        # edge, so predecessors come back in insertion order too
+        self.in_edge = np.lexsort((first_row, dst))
+        self.in_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dst, minlength=n), out=self.in_ptr[1:])
+        self.in_idx = src[self.in_edge]
+
+        self.out_degree = np.diff(self.out_ptr).astype(np.int32)
+        self.in_degree = np.diff(self.in_ptr).astype(np.int32)
+        self.degree = self.out_degree + self.in_degree
+
+        # transaction table: (tx_ptr, tx_row, tx_amount, tx_timestamp),
+        # grouped by edge; default is one transaction per edge
+        if transactions is None:
+            transactions = (
+                np.arange(len(src) + 1, dtype=np.int64), first_row, amount, timestamp
+            )
+        self.tx_ptr, self.tx_row, self.tx_amount, self.tx_timestamp = transactions
+        self.aggregate_transactions(src, dst)
+
+    def aggregate_transactions(self, src, dst):
+        """Per-edge statistics and per-account transfer counts."""
+        starts = self.tx_ptr[:-1]
+        self.tx_count = np.diff(self.tx_ptr).astype(np.int32)
+        self.total_amount = np.add.reduceat(self.tx_amount, starts)
+        self.min_amount = np.minimum.reduceat(self.tx_amount, starts)
+        self.max_amount = np.maximum.reduceat(self.tx_amount, starts)
+        self.first_timestamp = self.tx_timestamp[starts]
+        self.last_timestamp = self.tx_timestamp[self.tx_ptr[1:] - 1]
+
+        n = self.n_nodes
+        self.tx_degree = (
+            np.bincount(src, weights=self.tx_count, minlength=n)
+            + np.bincount(dst, weights=self.tx_count, minlength=n)
+        ).astype(np.int64)
+
+    # =========================
+    # SIZE
+    # =========================
+    @property
+    def n_nodes(self):
+        return len(self.accounts)
+
+    @property
+    def n_edges(self):
+        return len(self.out_idx)
+
+    def number_of_nodes(self):
+        return self.n_nodes
+
+    def number_of_edges(self):
+        return self.n_edges
+
+    @property
+    def nodes(self):
+        return range(self.n_nodes)
+
+    # =========================
+    # ADJACENCY
+    # =========================
+    def successors(self, u):
+        return self.out_idx[self.out_ptr[u]:self.out_ptr[u + 1]]
+
+    def predecessors(self, u):
+        return self.in_idx[self.in_ptr[u]:self.in_ptr[u + 1]]
+
+    def out_edges(self, u):
+        """Edge positions (into amount / timestamp) leaving u."""
+        return range(self.out_ptr[u], self.out_ptr[u + 1])
+
+    def edge_transactions(self, e):
+        """Positions (into tx_row / tx_amount / tx_timestamp) of edge e's
+        transactions, oldest first."""
+        return range(self.tx_ptr[e], self.tx_ptr[e + 1])
+
+    def row_accounts(self):
+        """
+        (sender ids, receiver ids) of every input row, in row order:
+        the interned ids of the parsed DataFrame, read back from the
+        transaction table instead of hashing the id columns again.
+        """
+        edge_of_tx = np.repeat(np.arange(self.n_edges), self.tx_count)
+        src = np.empty(self.n_rows, dtype=np.int32)
+        dst = np.empty(self.n_rows, dtype=np.int32)
+        src[self.tx_row] = self.edge_sources()[edge_of_tx]
+        dst[self.tx_row] = self.out_idx[edge_of_tx]
+        return src, dst
+
+    def successor_lists(self):
+        """Out-adjacency as plain Python lists, for tight pure-Python loops."""
+        ptr = self.out_ptr.tolist()
+        idx = self.out_idx.tolist()
+        return [idx[ptr[u]:ptr[u + 1]] for u in range(self.n_nodes)]
+
+    def predecessor_lists(self):
+        ptr = self.in_ptr.tolist()
+        idx = self.in_idx.tolist()
+        return [idx[ptr[u]:ptr[u + 1]] for u in range(self.n_nodes)]
+
+    # =========================
+    # COMPONENTS
+    # =========================
+    def strongly_connected_components(self):
+        """
+        Iterative Tarjan over the out-CSR.
+        Yields each SCC as a list of node ids.
+        """
+        n = self.n_nodes
+        ptr = self.out_ptr.tolist()
+        idx = self.out_idx.tolist()
+
+        index = [-1] * n
+        low = [0] * n
+        on_stack = [False] * n
+        stack = []
+        counter = 0
+
+        for root in range(n):
+            if index[root] != -1:
+                continue
+
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            work = [[root, ptr[root]]]
+
+            while work:
+                frame = work[-1]
+                v, i = frame
+
+                if i < ptr[v + 1]:
+                    frame[1] = i + 1
+                    w = idx[i]
+
+                    if index[w] == -1:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = True
+                        work.append([w, ptr[w]])
+                    elif on_stack[w] and index[w] < low[v]:
+                        low[v] = index[w]
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if low[v] < low[parent]:
+                        low[parent] = low[v]
+
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        component.append(w)
+                        if w == v:
+                            break
+                    yield component
+
+    def subgraph(self, nodes):
+        return SubgraphView(self, nodes)
+
+    def edge_sources(self):
+        return np.repeat(
+            np.arange(self.n_nodes, dtype=np.int32), self.out_degree
+        )
+
+    # =========================
+    # DEBUG EXPORT
+    # =========================
+    def to_networkx(self, nodes=None):
+        """Export to nx.DiGraph (debugging only, not used by the pipeline)."""
+        G = nx.DiGraph()
+        if nodes is None:
+            nodes = range(self.n_nodes)
+        keep = np.zeros(self.n_nodes, dtype=bool)
+        keep[list(nodes)] = True
+
+        labels = self.accounts
+        times = pd.to_datetime(self.timestamp)
+
+        kept = np.flatnonzero(keep)
+        G.add_nodes_from(labels[kept])
+        for u in kept:
+            for e in self.out_edges(u):
+                v = self.out_idx[e]
+                if keep[v]:
+                    G.add_edge(
+                        labels[u],
+                        labels[v],
+                        amount=float(self.amount[e]),
+                        timestamp=times[e],
+                        count=int(self.tx_count[e]),
+                        total_amount=float(self.total_amount[e])
+                    )
+        return G
+
+
+class SubgraphView:
+    """Node-induced view of a TransactionGraph; nothing is copied."""
+
+    def __init__(self, graph, nodes):
+        self.graph = graph
+        self.node_ids = np.asarray(list(nodes), dtype=np.int32)
+        self.mask = np.zeros(graph.n_nodes, dtype=bool)
+        self.mask[self.node_ids] = True
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __contains__(self, u):
+        return bool(self.mask[u])
+
+    @property
+    def nodes(self):
+        return self.node_ids
+
+    def successors(self, u):
+        nbrs = self.graph.successors(u)
+        return nbrs[self.mask[nbrs]]
+
+    def predecessors(self, u):
+        nbrs = self.graph.predecessors(u)
+        return nbrs[self.mask[nbrs]]
+
+    def degree(self, u):
+        return len(self.successors(u)) + len(self.predecessors(u))
+
+    def to_networkx(self):
+        return self.graph.to_networkx(self.node_ids)
+
+
+def intern_accounts(df, known=None):
+    """
+    Sender / receiver columns -> int32 ids.
+
+    Sender and receiver are interleaved so new ids follow first
+    appearance per row. known: existing {label: id} map to extend; ids
+    already in it are kept and new accounts are numbered after them.
+
+    returns (labels of the new accounts, src ids, dst ids)
+    """
+    senders = df["sender_id"].to_numpy()
+    receivers = df["receiver_id"].to_numpy()
+
+    codes, uniques = pd.factorize(
+        np.column_stack([senders, receivers]).ravel()
+    )
+    uniques = np.asarray(uniques, dtype=object)
+
+    if known:
+        offset = len(known)
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        new = np.zeros(len(uniques), dtype=bool)
+        for i, acc in enumerate(uniques.tolist()):
+            code = known.get(acc)
+            if code is None:
+                new[i] = True
+            else:
+                mapping[i] = code
+        mapping[new] = np.arange(offset, offset + new.sum())
+        codes = mapping[codes]
+        uniques = uniques[new]
+
+    return (
+        uniques,
+        codes[0::2].astype(np.int32),
+        codes[1::2].astype(np.int32)
+    )
+
+
+def graph_from_rows(accounts, src, dst, amount, timestamp, rows):
+    """
+    Collapse transaction rows into one edge per (sender, receiver): the
+    edge's position follows its first row, attributes come from its last
+    row (DiGraph semantics). rows: row number of each transaction.
 
-    for _, row in df.iterrows():
-        sender = row["sender_id"]
-        receiver = row["receiver_id"]
+    Every row also lands in the edge's slice of the transaction table,
+    sorted by (timestamp, row).
+    """
+    n_rows = len(src)
 
-        G.add_edge(
-            sender,
-            receiver,
-            amount=row["amount"],
-            timestamp=row["timestamp"]
+    key = src.astype(np.int64) * max(len(accounts), 1) + dst
+    order = np.lexsort((rows, key))
+    sorted_key = key[order]
+    boundary = np.ones(n_rows, dtype=bool)
+    boundary[1:] = sorted_key[1:] != sorted_key[:-1]
+    starts = np.flatnonzero(boundary)
+    ends = np.empty_like(starts)
+    ends[:-1] = starts[1:] - 1
+    ends[-1:] = n_rows - 1
+    first = order[starts]
+    last = order[ends]
+
+    edge_order = np.lexsort((rows[first], src[first]))
+    first = first[edge_order]
+    last = last[edge_order]
+    n_edges = len(first)
+
+    # edge position of every row
+    edge_of_group = np.empty(n_edges, dtype=np.int64)
+    edge_of_group[edge_order] = np.arange(n_edges)
+    edge_of_row = np.empty(n_rows, dtype=np.int64)
+    edge_of_row[order] = edge_of_group[np.cumsum(boundary) - 1]
+
+    tx_order = np.lexsort((rows, timestamp, edge_of_row))
+    tx_ptr = np.zeros(n_edges + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_of_row, minlength=n_edges), out=tx_ptr[1:])
+
+    return TransactionGraph(
+        accounts,
+        src[first],
+        dst[first],
+        amount[last],
+        timestamp[last],
+        first_row=rows[first],
+        transactions=(
+            tx_ptr, rows[tx_order], amount[tx_order], timestamp[tx_order]
         )
+    )
+
+
+# arrays that fully describe a TransactionGraph besides its accounts
+CSR_ARRAYS = (
+    "out_ptr", "out_idx", "amount", "timestamp",
+    "first_row", "in_edge", "in_ptr", "in_idx",
+    "tx_ptr", "tx_row", "tx_amount", "tx_timestamp"
+)
+AGGREGATE_ARRAYS = (
+    "tx_count", "total_amount", "min_amount", "max_amount",
+    "first_timestamp", "last_timestamp", "tx_degree"
+)
+GRAPH_ARRAYS = CSR_ARRAYS + AGGREGATE_ARRAYS
+
+
+def restore_graph(accounts, arrays, n_rows, account_ids=None,
+                  cls=TransactionGraph):
+    """
+    Graph from previously built GRAPH_ARRAYS (e.g. memory-mapped from a
+    snapshot) without sorting anything again; only degrees are derived.
+    """
+    G = cls.__new__(cls)
+    G.accounts = accounts
+    if account_ids is None:
+        account_ids = {acc: i for i, acc in enumerate(accounts.tolist())}
+    G.account_ids = account_ids
+    for name in GRAPH_ARRAYS:
+        setattr(G, name, arrays[name])
+    G.n_rows = n_rows
+
+    G.out_degree = np.diff(G.out_ptr).astype(np.int32)
+    G.in_degree = np.diff(G.in_ptr).astype(np.int32)
+    G.degree = G.out_degree + G.in_degree
+    return G
+
+
+def transaction_columns(df):
+    amount = pd.to_numeric(df["amount"], errors="coerce").to_numpy(
+        dtype=np.float64
+    )
+    timestamp = timestamps_to_ns(df["timestamp"].to_numpy())
+    return amount, timestamp
+
+
+def build_graph(df):
+    accounts, src, dst = intern_accounts(df)
+    amount, timestamp = transaction_columns(df)
+
+    G = graph_from_rows(
+        accounts, src, dst, amount, timestamp, np.arange(len(src))
+    )
+    G.n_rows = len(src)
+    return G
+
+
+# ===============================
+# APPENDABLE GRAPH (incremental runs)
+# ===============================
+class GrowingArray:
+    """1-d array with amortized O(1) appends: capacity doubles when full."""
+
+    def __init__(self, values):
+        self.data = np.array(values)
+        self.size = len(self.data)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def values(self):
+        return self.data[:self.size]
+
+    def extend(self, values):
+        size = self.size + len(values)
+        if size > len(self.data):
+            data = np.empty(max(size, 2 * len(self.data)), dtype=self.data.dtype)
+            data[:self.size] = self.values
+            self.data = data
+        self.data[self.size:size] = values
+        self.size = size
+
+
+class GroupIndex:
+    """
+    Values grouped by an int key (rows by account, successors by node),
+    in insertion order.
+
+    A CSR sorted at the last compaction plus a dict of per-key lists of
+    what was added since. The owner compacts (passing every key and
+    value) once the lists hold more than the CSR, so appends stay
+    amortized O(1) and get() only reads one key's values.
+    """
+
+    def __init__(self, keys, values):
+        self.compact(keys, values)
+
+    def compact(self, keys, values):
+        n = int(keys.max()) + 1 if len(keys) else 0
+        self.ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=n), out=self.ptr[1:])
+        self.values = values[np.argsort(keys, kind="stable")]
+        self.recent = {}
+        self.n_recent = 0
+
+    def needs_compaction(self):
+        return self.n_recent > len(self.values)
+
+    def add(self, keys, values):
+        recent = self.recent
+        for key, value in zip(keys.tolist(), values.tolist()):
+            group = recent.get(key)
+            if group is None:
+                recent[key] = [value]
+            else:
+                group.append(value)
+        self.n_recent += len(keys)
+
+    def get(self, key):
+        if key + 1 < len(self.ptr):
+            base = self.values[self.ptr[key]:self.ptr[key + 1]]
+        else:
+            base = self.values[:0]
+        extra = self.recent.get(key)
+        if extra:
+            return np.concatenate([base, np.asarray(extra, dtype=base.dtype)])
+        return base
+
+    def get_many(self, keys):
+        groups = [self.get(key) for key in keys]
+        return np.concatenate(groups) if groups else self.values[:0]
+
+
+class AppendableGraph:
+    """
+    Transaction graph that grows in place, for incremental runs.
+
+    Built once from a TransactionGraph; add() then appends a batch at a
+    cost that depends on the batch, not on the history:
+    - per-row columns (src / dst / timestamp / amount) and per-account
+      counters (accounts, degree, tx_degree) are GrowingArrays
+    - rows_in / rows_out: GroupIndex of row numbers by receiver / sender,
+      so an account's transactions are read without scanning the rest
+    - successors / predecessors: GroupIndex over the edges (one per
+      (sender, receiver) pair, in creation order); edge keys are a
+      sorted array plus a set of recent ones
+    Every index is compacted when its recent part outgrows the sorted
+    one, O(n log n) every time the history doubles.
+
+    Same traversal interface as TransactionGraph for what incremental
+    detection uses (successors, predecessors, accounts, account_ids,
+    n_nodes, degree, tx_degree); edge attributes and the per-edge
+    transaction table are not kept.
+    """
+
+    def __init__(self, G):
+        self.labels = GrowingArray(G.accounts)
+        self.account_ids = G.account_ids
+        self.degree_column = GrowingArray(G.degree)
+        self.tx_degree_column = GrowingArray(G.tx_degree)
+
+        src, dst = G.row_accounts()
+        tx = np.asarray(G.tx_row)
+        amount = np.empty(G.n_rows, dtype=np.float64)
+        timestamp = np.empty(G.n_rows, dtype=np.int64)
+        amount[tx] = G.tx_amount
+        timestamp[tx] = G.tx_timestamp
+
+        self.src_column = GrowingArray(src)
+        self.dst_column = GrowingArray(dst)
+        self.amount_column = GrowingArray(amount)
+        self.timestamp_column = GrowingArray(timestamp)
+        rows = np.arange(G.n_rows)
+        self.rows_in = GroupIndex(dst, rows)
+        self.rows_out = GroupIndex(src, rows)
+
+        created = np.argsort(G.first_row, kind="stable")
+        edge_src = G.edge_sources()[created]
+        edge_dst = np.asarray(G.out_idx)[created]
+        self.edge_src = GrowingArray(edge_src)
+        self.edge_dst = GrowingArray(edge_dst)
+        self.succ = GroupIndex(edge_src, edge_dst)
+        self.pred = GroupIndex(edge_dst, edge_src)
+        self.edge_keys = np.sort(edge_key(edge_src, edge_dst))
+        self.recent_keys = set()
+
+    # =========================
+    # SIZE / COLUMNS
+    # =========================
+    @property
+    def n_nodes(self):
+        return len(self.labels)
+
+    @property
+    def n_rows(self):
+        return len(self.src_column)
+
+    @property
+    def accounts(self):
+        return self.labels.values
+
+    @property
+    def degree(self):
+        return self.degree_column.values
+
+    @property
+    def tx_degree(self):
+        return self.tx_degree_column.values
+
+    @property
+    def src(self):
+        return self.src_column.values
+
+    @property
+    def dst(self):
+        return self.dst_column.values
+
+    @property
+    def amount(self):
+        return self.amount_column.values
+
+    @property
+    def timestamp(self):
+        return self.timestamp_column.values
+
+    # =========================
+    # ADJACENCY
+    # =========================
+    def successors(self, u):
+        return self.succ.get(u)
+
+    def predecessors(self, u):
+        return self.pred.get(u)
+
+    def has_edges(self, keys):
+        """Bool mask: which edge keys (see edge_key) are in the graph."""
+        known = self.edge_keys
+        pos = np.minimum(np.searchsorted(known, keys), max(len(known) - 1, 0))
+        found = known[pos] == keys if len(known) else np.zeros(len(keys), dtype=bool)
+        recent = self.recent_keys
+        if recent:
+            found |= np.fromiter((k in recent for k in keys.tolist()), bool, len(keys))
+        return found
+
+    # =========================
+    # APPEND
+    # =========================
+    def add(self, df):
+        """
+        Append df's transactions (parsed like parse_csv output).
+
+        returns (src ids, dst ids of df's rows, new edges as (u, v) pairs
+        in order of their first row)
+        """
+        new_accounts, src, dst = intern_accounts(df, self.account_ids)
+        amount, timestamp = transaction_columns(df)
+
+        for i, acc in enumerate(new_accounts.tolist(), start=self.n_nodes):
+            self.account_ids[acc] = i
+        self.labels.extend(new_accounts)
+        self.degree_column.extend(np.zeros(len(new_accounts), dtype=np.int32))
+        self.tx_degree_column.extend(np.zeros(len(new_accounts), dtype=np.int64))
+
+        rows = np.arange(self.n_rows, self.n_rows + len(src))
+        self.src_column.extend(src)
+        self.dst_column.extend(dst)
+        self.amount_column.extend(amount)
+        self.timestamp_column.extend(timestamp)
+        self.rows_in.add(dst, rows)
+        self.rows_out.add(src, rows)
+        np.add.at(self.tx_degree, src, 1)
+        np.add.at(self.tx_degree, dst, 1)
+
+        # first row of each pair in the batch, in row order
+        keys = edge_key(src, dst)
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        first = first[~self.has_edges(keys[first])]
+        u, v = src[first], dst[first]
+
+        self.recent_keys.update(keys[first].tolist())
+        self.edge_src.extend(u)
+        self.edge_dst.extend(v)
+        self.succ.add(u, v)
+        self.pred.add(v, u)
+        np.add.at(self.degree, u, 1)
+        np.add.at(self.degree, v, 1)
+
+        self.compact()
+        return src, dst, list(zip(u.tolist(), v.tolist()))
+
+    def compact(self):
+        """Re-sort whichever index has outgrown its sorted part."""
+        if self.rows_in.needs_compaction():
+            self.rows_in.compact(self.dst, np.arange(self.n_rows))
+        if self.rows_out.needs_compaction():
+            self.rows_out.compact(self.src, np.arange(self.n_rows))
+        if self.succ.needs_compaction():
+            self.succ.compact(self.edge_src.values, self.edge_dst.values)
+        if self.pred.needs_compaction():
+            self.pred.compact(self.edge_dst.values, self.edge_src.values)
+        if len(self.recent_keys) > len(self.edge_keys):
+            self.edge_keys = np.sort(edge_key(self.edge_src.values, self.edge_dst.values))
+            self.recent_keys = set()
+
 
-    return G
\ No newline at end of file
+def edge_key(src, dst):
+    """(sender, receiver) id pairs -> one int64 each."""
+    return (src.astype(np.int64) << 32) | dst.astype(np.int64)
@@ -0,0 +1,509 @@
+import numpy as np
+
+from parser import parse_csv
+from graph_builder import AppendableGraph, build_graph
+from detectors.cycle import detect_cycles, cycles_through_edge
+from detectors.smurf import burst_records, find_bursts
+from detectors.shell import (
+    MAX_DEPTH,
+    MAX_SHELL_DEGREE,
+    chains_from,
+    detect_shell_chains,
+    shell_allowed,
+    shell_degree
+)
+from scoring_engine import calculate_suspicion_scores, score_account
+from ring_builder import RISK_SCORES, build_rings_and_assign_ids
+from final_json_builder import build_final_json, label_accounts
+
+
+class SccIndex:
+    """
+    Strongly connected components kept up to date as edges are added.
+
+    Holds the condensation (component-level in/out sets) plus a
+    topological order of the components. An added edge that already
+    follows the order changes nothing. Otherwise only the components
+    whose order lies between its endpoints are searched (Pearce-Kelly):
+    if the edge closes a loop those components are merged into one,
+    else just that slice of the order is rearranged.
+    """
+
+    def __init__(self, G):
+        self.component = [0] * G.n_nodes
+        self.members = {}
+        self.order = {}
+
+        sccs = list(G.strongly_connected_components())
+        # Tarjan emits sinks first: reversed emission = topological order
+        for cid, scc in enumerate(sccs):
+            self.members[cid] = scc
+            self.order[cid] = len(sccs) - 1 - cid
+            for u in scc:
+                self.component[u] = cid
+        self.next_id = len(sccs)
+        self.next_slot = len(sccs)  # order slots only ever get reused
+
+        self.comp_out = {cid: set() for cid in self.members}
+        self.comp_in = {cid: set() for cid in self.members}
+        component = self.component
+        for u, v in zip(G.edge_sources().tolist(), G.out_idx.tolist()):
+            cu, cv = component[u], component[v]
+            if cu != cv:
+                self.comp_out[cu].add(cv)
+                self.comp_in[cv].add(cu)
+
+    def add_nodes(self, count):
+        for _ in range(count):
+            cid = self.next_id
+            self.next_id += 1
+            self.component.append(cid)
+            self.members[cid] = [len(self.component) - 1]
+            self.order[cid] = self.next_slot
+            self.next_slot += 1
+            self.comp_out[cid] = set()
+            self.comp_in[cid] = set()
+
+    def search(self, start, forward, lo, hi):
+        step = self.comp_out if forward else self.comp_in
+        order = self.order
+        seen = {start}
+        frontier = [start]
+        while frontier:
+            next_frontier = []
+            for c in frontier:
+                for d in step[c]:
+                    if d not in seen and lo <= order[d] <= hi:
+                        seen.add(d)
+                        next_frontier.append(d)
+            frontier = next_frontier
+        return seen
+
+    def add_edge(self, u, v):
+        """Returns the surviving component id if the edge merged SCCs."""
+        cx, cy = self.component[u], self.component[v]
+        if cx == cy:
+            return None
+
+        self.comp_out[cx].add(cy)
+        self.comp_in[cy].add(cx)
+
+        lb, ub = self.order[cy], self.order[cx]
+        if ub < lb:
+            return None
+
+        order = self.order
+        forward = self.search(cy, True, lb, ub)
+        backward = self.search(cx, False, lb, ub)
+        merged = forward & backward if cx in forward else set()
+
+        # free the slice's order slots, then refill: components that reach
+        # the edge first, the merged one, then what the edge leads to
+        slots = sorted(order[c] for c in forward | backward)
+        before = sorted(backward - merged, key=order.__getitem__)
+        after = sorted(forward - merged, key=order.__getitem__)
+
+        keep = None
+        if merged:
+            keep = max(merged, key=lambda c: len(self.members[c]))
+            for c in merged - {keep}:
+                self.absorb(keep, c)
+
+        for c, slot in zip(before, slots):
+            order[c] = slot
+        if merged:
+            order[keep] = slots[len(before)]
+        for c, slot in zip(after, slots[len(slots) - len(after):]):
+            order[c] = slot
+
+        return keep
+
+    def absorb(self, keep, gone):
+        for u in self.members[gone]:
+            self.component[u] = keep
+        self.members[keep].extend(self.members.pop(gone))
+
+        for d in self.comp_out.pop(gone):
+            self.comp_in[d].discard(gone)
+            if d != keep:
+                self.comp_in[d].add(keep)
+                self.comp_out[keep].add(d)
+        for d in self.comp_in.pop(gone):
+            self.comp_out[d].discard(gone)
+            if d != keep:
+                self.comp_out[d].add(keep)
+                self.comp_in[keep].add(d)
+
+        self.comp_out[keep].discard(keep)
+        self.comp_in[keep].discard(keep)
+        del self.order[gone]
+
+
+# ring order within a run: build_rings_and_assign_ids' detection order
+RING_ORDER = {"cycle": 0, "fan_in": 1, "fan_out": 2, "shell_chain": 3}
+
+
+class PipelineState:
+    """
+    Persistent pipeline state for incremental runs.
+
+    The first append_transactions() call runs the normal pipeline; later
+    calls only touch the accounts the batch touches and what hangs off
+    them:
+    - graph: AppendableGraph, appended in place (ids are stable); each
+      account's rows and edges are indexed, so nothing scans the history
+    - SCCs: SccIndex, merged in place when a new edge closes a loop
+      (adding edges never splits an SCC)
+    - cycles: only searched through the batch's new edges whose two
+      ends share an SCC
+    - fan-in / fan-out: windows recomputed only for accounts that
+      received / sent in the batch, from their own rows
+    - shell chains: chains through an account whose degree or cycle
+      membership changed are dropped and re-enumerated from the
+      accounts up to max_depth hops upstream of it
+
+    Every detection is keyed by (pattern_type, member ids), which is
+    also its ring. Only accounts whose detections or transfer count
+    changed are rescored (score_account, the same rules as
+    calculate_suspicion_scores), and only added / removed detections
+    add / remove rings. Ring ids stay stable across batches; an account
+    in several rings points at the last one in ring order, as in a full
+    run.
+    """
+
+    def __init__(self, max_depth=MAX_DEPTH):
+        self.max_depth = max_depth
+        self.G = None
+        self.scc = None
+        self.allowed = bytearray()  # shell_allowed, kept per account
+        self.on_path = bytearray()  # chains_from's scratch bitmap
+
+        self.live = {}            # (pattern_type, member ids) -> sequence number
+        self.by_account = {}      # id -> {detection key: times listed in it}
+        self.counter = 0
+        self.cycle_nodes = set()
+        self.fan_in = {}          # aggregator id -> (sender ids, bursts)
+        self.fan_out = {}         # distributor id -> (receiver ids, bursts)
+        self.chains_by_node = {}  # id -> set of chain tuples
+
+        self.dirty = set()        # accounts to rescore
+        self.changed = {}         # detection keys added / removed since refresh
+
+        self.suspicious = {}      # account_id -> suspicious account
+        self.rings = {}           # ring_id -> fraud ring
+        self.ring_ids = {}        # detection key -> ring_id
+        self.ring_counter = 0
+
+    # =========================
+    # ENTRY POINT
+    # =========================
+    def append_transactions(self, batch):
+        """
+        batch: parsed DataFrame (parse_csv output) or a CSV path
+
+        returns the changes this batch caused:
+        {"suspicious_accounts": new or changed accounts,
+         "fraud_rings": new rings,
+         "removed_accounts": account ids no longer flagged,
+         "removed_rings": ring ids that no longer exist}
+        """
+        if isinstance(batch, str):
+            batch = parse_csv(batch)
+
+        if self.G is None:
+            self.load(batch)
+            return self.score_all()
+
+        self.update(batch)
+        return self.refresh()
+
+    def final_json(self, start_time):
+        return build_final_json(
+            list(self.suspicious.values()),
+            list(self.rings.values()),
+            total_accounts=self.G.n_nodes if self.G is not None else 0,
+            start_time=start_time
+        )
+
+    # =========================
+    # FULL LOAD
+    # =========================
+    def load(self, df):
+        G = build_graph(df)
+        self.scc = SccIndex(G)
+
+        raw_cycles = detect_cycles(G)
+        for cycle in raw_cycles:
+            self.add_cycle(tuple(cycle["members"]))
+
+        for chain in detect_shell_chains(G, raw_cycles, max_depth=self.max_depth):
+            self.add_chain(tuple(chain["members"]))
+
+        self.allowed = bytearray(shell_allowed(G, self.cycle_nodes).tobytes())
+        self.on_path = bytearray(G.n_nodes)
+        self.G = AppendableGraph(G)
+        self.refresh_smurfing(None, None)
+
+    def score_all(self):
+        """Score and build rings over every detection (the first batch)."""
+        detections = self.detections()
+
+        suspicious = calculate_suspicion_scores(detections, self.G.tx_degree)
+        suspicious, rings = build_rings_and_assign_ids(detections, suspicious)
+        for ring in rings:
+            key = (ring["pattern_type"], tuple(ring["member_accounts"]))
+            self.ring_ids[key] = ring["ring_id"]
+        self.ring_counter = len(rings)
+        label_accounts(suspicious, rings, self.G.accounts)
+
+        self.suspicious = {acc["account_id"]: acc for acc in suspicious}
+        self.rings = {ring["ring_id"]: ring for ring in rings}
+        self.dirty = set()
+        self.changed = {}
+        return {
+            "suspicious_accounts": suspicious,
+            "fraud_rings": rings,
+            "removed_accounts": [],
+            "removed_rings": []
+        }
+
+    def detections(self):
+        """Stored detections in detect_patterns' format and order."""
+        groups = {pattern: [] for pattern in RING_ORDER}
+        for pattern, members in self.live:
+            groups[pattern].append(members)
+
+        return {
+            "cycles": [
+                {"length": len(members), "members": list(members)}
+                for members in groups["cycle"]
+            ],
+            "fan_in": [
+                {"aggregator": members[0], "senders": list(members[1:]),
+                 "bursts": self.fan_in[members[0]][1]}
+                for members in groups["fan_in"]
+            ],
+            "fan_out": [
+                {"distributor": members[0], "receivers": list(members[1:]),
+                 "bursts": self.fan_out[members[0]][1]}
+                for members in groups["fan_out"]
+            ],
+            "shell_chains": [
+                {"path": list(members)}
+                for members in groups["shell_chain"]
+            ]
+        }
+
+    # =========================
+    # INCREMENTAL UPDATE
+    # =========================
+    def update(self, df):
+        G = self.G
+        n_old = G.n_nodes
+        src, dst, new_edges = G.add(df)
+
+        # --- SCCs: new accounts start alone, new edges may merge ---
+        added = G.n_nodes - n_old
+        self.scc.add_nodes(added)
+        self.allowed.extend(bytes(added))
+        self.on_path.extend(bytes(added))
+        for u, v in new_edges:
+            self.scc.add_edge(u, v)
+
+        # --- cycles through the new edges (only inside an SCC) ---
+        component = self.scc.component
+        new_cycle_nodes = set()
+        for u, v in new_edges:
+            if component[u] != component[v]:
+                continue
+            for cycle in cycles_through_edge(G, u, v):
+                key = tuple(cycle)
+                if ("cycle", key) not in self.live:
+                    self.add_cycle(key)
+                    new_cycle_nodes.update(key)
+
+        # transfer counts changed: rescore these even without new detections
+        touched = set(src.tolist()) | set(dst.tolist())
+        self.dirty |= touched
+
+        # --- shell chains around changed accounts ---
+        touched |= new_cycle_nodes
+        self.refresh_allowed(touched)
+        self.refresh_chains(touched)
+
+        # --- smurfing windows of accounts that sent / received ---
+        self.refresh_smurfing(np.unique(dst), np.unique(src))
+
+    def add_detection(self, key):
+        self.counter += 1
+        self.live[key] = self.counter
+        for u in key[1]:
+            listed = self.by_account.setdefault(u, {})
+            listed[key] = listed.get(key, 0) + 1
+        self.dirty.update(key[1])
+        self.changed[key] = None
+
+    def remove_detection(self, key):
+        del self.live[key]
+        for u in set(key[1]):
+            listed = self.by_account[u]
+            del listed[key]
+            if not listed:
+                del self.by_account[u]
+        self.dirty.update(key[1])
+        self.changed[key] = None
+
+    def add_cycle(self, members):
+        self.add_detection(("cycle", members))
+        self.cycle_nodes.update(members)
+
+    def add_chain(self, chain):
+        self.add_detection(("shell_chain", chain))
+        for u in chain:
+            self.chains_by_node.setdefault(u, set()).add(chain)
+
+    def refresh_allowed(self, nodes):
+        degree = shell_degree(self.G)
+        for u in nodes:
+            self.allowed[u] = bool(degree[u] <= MAX_SHELL_DEGREE) and u not in self.cycle_nodes
+
+    def refresh_chains(self, touched):
+        G = self.G
+        allowed = self.allowed
+
+        stale = set()
+        for u in touched:
+            stale |= self.chains_by_node.pop(u, set())
+        for chain in stale:
+            self.remove_detection(("shell_chain", chain))
+            for u in chain:
+                if u in self.chains_by_node:
+                    self.chains_by_node[u].discard(chain)
+
+        # every chain through a touched account starts at most
+        # max_depth allowed hops upstream of it
+        starts = set(u for u in touched if allowed[u])
+        frontier = list(starts)
+        for _ in range(self.max_depth):
+            next_frontier = []
+            for v in frontier:
+                for u in G.predecessors(v).tolist():
+                    if allowed[u] and u not in starts:
+                        starts.add(u)
+                        next_frontier.append(u)
+            frontier = next_frontier
+
+        successors = lambda u: G.successors(u).tolist()
+        path = []
+
+        for start in sorted(starts):
+            for chain in chains_from(start, successors, allowed, self.on_path,
+                                     path, self.max_depth):
+                if ("shell_chain", chain) not in self.live and not touched.isdisjoint(chain):
+                    self.add_chain(chain)
+
+    def refresh_smurfing(self, receivers, senders):
+        """Fan-in / fan-out of these accounts (None: every account)."""
+        G = self.G
+        for pattern, results, index, key, other, accounts in (
+            ("fan_in", self.fan_in, G.rows_in, G.dst, G.src, receivers),
+            ("fan_out", self.fan_out, G.rows_out, G.src, G.dst, senders)
+        ):
+            if accounts is None:
+                rows = np.arange(G.n_rows)
+                accounts = []
+            else:
+                accounts = accounts.tolist()
+                rows = index.get_many(accounts)
+
+            found = {}
+            for account, members, bursts in find_bursts(
+                key[rows], other[rows], G.timestamp[rows], G.amount[rows]
+            ):
+                found[account] = (members, burst_records(bursts))
+
+            for account in accounts:
+                if account not in found and account in results:
+                    members, _ = results.pop(account)
+                    self.remove_detection((pattern, (account,) + tuple(members)))
+
+            for account, (members, bursts) in found.items():
+                old = results.get(account)
+                if old is None or old[0] != members:
+                    if old is not None:
+                        self.remove_detection((pattern, (account,) + tuple(old[0])))
+                    self.add_detection((pattern, (account,) + tuple(members)))
+                results[account] = (members, bursts)
+
+    # =========================
+    # SCORING / RINGS / DIFF
+    # =========================
+    def refresh(self):
+        """Rescore dirty accounts and add / drop rings of changed detections."""
+        labels = self.G.accounts
+        changes = {
+            "suspicious_accounts": [],
+            "fraud_rings": [],
+            "removed_accounts": [],
+            "removed_rings": []
+        }
+
+        for key in self.changed:
+            ring_id = self.ring_ids.get(key)
+            if key in self.live:
+                if ring_id is None:
+                    self.ring_counter += 1
+                    ring_id = self.ring_ids[key] = f"RING_{self.ring_counter:03}"
+                if ring_id not in self.rings:
+                    pattern_type, members = key
+                    ring = {
+                        "ring_id": ring_id,
+                        "member_accounts": labels[list(members)].tolist(),
+                        "pattern_type": pattern_type,
+                        "risk_score": RISK_SCORES[pattern_type]
+                    }
+                    self.rings[ring_id] = ring
+                    changes["fraud_rings"].append(ring)
+            elif ring_id in self.rings:
+                del self.rings[ring_id]
+                changes["removed_rings"].append(ring_id)
+
+        tx_degree = self.G.tx_degree
+        for u in self.dirty:
+            acc_id = labels[u]
+            listed = self.by_account.get(u)
+            if not listed:
+                if self.suspicious.pop(acc_id, None) is not None:
+                    changes["removed_accounts"].append(acc_id)
+                continue
+
+            patterns = []
+            for (pattern_type, members), times in listed.items():
+                if pattern_type == "cycle":
+                    pattern_type = f"cycle_length_{len(members)}"
+                patterns += [pattern_type] * times
+            score, detected = score_account(patterns, int(tx_degree[u]))
+            last = max(listed, key=lambda key: (RING_ORDER[key[0]], self.live[key]))
+
+            acc = {
+                "account_id": acc_id,
+                "suspicion_score": float(score),
+                "detected_patterns": detected,
+                "ring_id": self.ring_ids[last]
+            }
+            old = self.suspicious.get(acc_id)
+            if old is None or not same_account(acc, old):
+                self.suspicious[acc_id] = acc
+                changes["suspicious_accounts"].append(acc)
+
+        self.dirty = set()
+        self.changed = {}
+        return changes
+
+
+def same_account(a, b):
+    return (
+        a["suspicion_score"] == b["suspicion_score"]
+        and a["ring_id"] == b["ring_id"]
+        and sorted(a["detected_patterns"]) == sorted(b["detected_patterns"])
+    )
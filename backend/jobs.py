@@ -0,0 +1,248 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from main import STAGES, run_pipeline
+from final_json_builder import save_json
+from snapshot import build_snapshot, is_snapshot
+from metrics import PIPELINE_METRICS, StageRecorder
+
+
+JOB_WORKERS = 2          # jobs running at once
+MAX_QUEUED_JOBS = 16     # jobs waiting for a worker before submit is refused
+MAX_FINISHED_JOBS = 100  # finished jobs kept (with their result file)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    One pipeline run and its progress.
+
+    status: queued -> running -> done | failed | cancelled
+    Every stage in STAGES goes pending -> running -> done and records how
+    long it took; the stage that was running when a job failed or was
+    cancelled is left as "failed" / "cancelled". On a result cache hit
+    every stage is marked "cached".
+    """
+
+    def __init__(self, job_id, file_path, options, cache_key=None):
+        self.id = job_id
+        self.file_path = file_path
+        self.options = options
+        self.cache_key = cache_key
+        self.status = "queued"
+        self.error = None
+        self.result_path = None
+        self.result_id = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel = threading.Event()
+        self.future = None
+
+        self.stage = None
+        self.stage_started = None
+        self.stages = {name: {"status": "pending", "seconds": None} for name in STAGES}
+
+    def on_stage(self, name):
+        """run_pipeline's on_stage hook: closes the previous stage."""
+        if self.cancel.is_set():
+            raise JobCancelled()
+        self.end_stage("done")
+        self.stage = name
+        self.stage_started = time.perf_counter()
+        self.stages[name]["status"] = "running"
+
+    def end_stage(self, status):
+        if self.stage is None:
+            return
+        self.stages[self.stage]["status"] = status
+        self.stages[self.stage]["seconds"] = round(
+            time.perf_counter() - self.stage_started, 3
+        )
+        self.stage = None
+
+    def to_dict(self):
+        finished = sum(
+            1 for s in self.stages.values() if s["status"] in ("done", "cached")
+        )
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(finished / len(self.stages), 4),
+            "stages": [dict(name=name, **state) for name, state in self.stages.items()],
+            "error": self.error,
+            "result_id": self.result_id,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobQueue:
+    """
+    Bounded local worker pool for pipeline jobs.
+
+    Jobs run on JOB_WORKERS threads (detection itself may still use a
+    process pool, see detect_patterns). At most MAX_QUEUED_JOBS may wait;
+    submit raises QueueFull beyond that. Results are written to
+    output_folder/<job_id>.json rather than kept in memory. With a
+    ResultCache, jobs whose cache_key is stored skip the pipeline; with a
+    ResultStore, results are also indexed there under result_id (the
+    cache key, or the job id without one) for paged queries; with a
+    RiskStore, they are recorded in the account history under that id.
+
+    Job state lives in this process: under gunicorn, serve the job
+    routes from a single worker process (use threads to scale).
+    """
+
+    def __init__(self, output_folder, workers=JOB_WORKERS,
+                 max_queued=MAX_QUEUED_JOBS, max_finished=MAX_FINISHED_JOBS,
+                 cache=None, store=None, risk_store=None):
+        self.output_folder = output_folder
+        self.cache = cache
+        self.store = store
+        self.risk_store = risk_store
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, file_path, cache_key=None, **options):
+        """options are passed to run_pipeline; returns the new Job."""
+        with self.lock:
+            queued = sum(1 for job in self.jobs.values() if job.status == "queued")
+            if queued >= self.max_queued:
+                raise QueueFull(f"Job queue is full ({queued} waiting)")
+
+            self.prune()
+            job = Job(uuid.uuid4().hex, file_path, options, cache_key)
+            self.jobs[job.id] = job
+
+        job.future = self.pool.submit(self.run, job)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Queued jobs never start; running ones stop at the next stage or
+        detector budget check. Returns the job (None if unknown).
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.status not in ("queued", "running"):
+            return job
+
+        job.cancel.set()
+        if job.future is not None and job.future.cancel():
+            self.finish(job, "cancelled")
+        return job
+
+    def run(self, job):
+        if job.cancel.is_set():
+            self.finish(job, "cancelled")
+            return
+
+        job.status = "running"
+        job.started_at = time.time()
+
+        try:
+            final_json = None
+            if self.cache is not None and job.cache_key is not None:
+                final_json = self.cache.get(job.cache_key)
+            hit = final_json is not None
+
+            if hit:
+                snapshot = job.options.get("snapshot")
+                if snapshot is not None and not is_snapshot(snapshot):
+                    build_snapshot(job.file_path, snapshot)
+                for state in job.stages.values():
+                    state["status"] = "cached"
+                final_json["summary"]["processing_time_seconds"] = round(
+                    time.time() - job.started_at, 2
+                )
+            else:
+                recorder = StageRecorder()
+                try:
+                    _, _, final_json = run_pipeline(
+                        job.file_path,
+                        job.started_at,
+                        on_stage=job.on_stage,
+                        cancel=job.cancel,
+                        timings=recorder,
+                        **job.options
+                    )
+                    # detectors may have been cut short by the cancel event
+                    if job.cancel.is_set():
+                        raise JobCancelled()
+                except JobCancelled:
+                    recorder.end()
+                    PIPELINE_METRICS.observe(recorder, "cancelled")
+                    raise
+                except Exception:
+                    recorder.end()
+                    PIPELINE_METRICS.observe(recorder, "failed")
+                    raise
+                PIPELINE_METRICS.observe(recorder, "ok")
+
+            if self.cache is not None and job.cache_key is not None:
+                if not hit:
+                    self.cache.put(job.cache_key, final_json)
+                self.cache.annotate(final_json, hit)
+
+            path = os.path.join(self.output_folder, f"{job.id}.json")
+            save_json(final_json, path)
+            job.result_path = path
+
+            if self.store is not None:
+                result_id = job.cache_key or job.id
+                if not (hit and self.store.has(result_id)):
+                    self.store.save(result_id, final_json)
+                job.result_id = result_id
+            if self.risk_store is not None:
+                self.risk_store.record(job.cache_key or job.id, final_json)
+            job.end_stage("done")
+            self.finish(job, "done")
+
+        except JobCancelled:
+            job.end_stage("cancelled")
+            self.finish(job, "cancelled")
+
+        except Exception as exc:
+            job.error = str(exc)
+            job.end_stage("failed")
+            self.finish(job, "failed")
+
+    def finish(self, job, status):
+        # prune() (under the lock) sorts finished jobs by finished_at,
+        # so it must be set before the status says finished
+        with self.lock:
+            job.finished_at = time.time()
+            job.status = status
+        if job.file_path is not None and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+
+    def prune(self):
+        """Forget the oldest finished jobs (and their results) past max_finished."""
+        finished = [
+            job for job in self.jobs.values()
+            if job.status in ("done", "failed", "cancelled")
+        ]
+        finished.sort(key=lambda job: job.finished_at)
+
+        for job in finished[:max(0, len(finished) - self.max_finished + 1)]:
+            if job.result_path and os.path.exists(job.result_path):
+                os.remove(job.result_path)
+            del self.jobs[job.id]
@@ -1,17 +1,67 @@
 from parser import parse_csv
+from budget import Budget
 from graph_builder import build_graph
-from detectors.cycle import detect_cycles
-from detectors.smurf import detect_smurfing
-from detectors.shell import detect_shell_chains
-from scoring_engine import calculate_suspicion_scores
-from ring_builder import build_rings_and_assign_ids
+from detectors.cycle import MIN_LENGTH, MAX_LENGTH, detect_cycles
+from detectors.smurf import THRESHOLD, WINDOW_HOURS, detect_smurfing
+from detectors.shell import (
+    MAX_SHELL_DEGREE,
+    SHELL_DEGREE,
+    MIN_CHAIN_NODES,
+    MAX_DEPTH,
+    detect_shell_chains
+)
+from scoring_engine import BASE_SCORES, calculate_suspicion_scores
+from ring_builder import RISK_SCORES, build_rings_and_assign_ids
 from final_json_builder import build_final_json
+from parallel import detect_parallel, pool_size
+from metrics import StageRecorder
+from snapshot import is_snapshot, load_snapshot, refresh_snapshot, save_snapshot
 
 
-def detect_patterns(df, G):
-    raw_cycles = detect_cycles(G)
-    smurf = detect_smurfing(df)
-    raw_shell = detect_shell_chains(G, raw_cycles)
+DETECTORS = ["cycles", "smurfing", "shell_chains"]
+STAGES = ["parse", "graph"] + DETECTORS + ["score", "rings", "summary"]
+
+
+def detect_patterns(df, G, budgets=None, maximal_chains=False, workers=None,
+                    on_stage=None, cycle_window_hours=None):
+    """
+    budgets: optional {detector name: Budget}; detectors without one run
+    unbounded. Each Budget is filled in with how far its detector got.
+    maximal_chains: only report shell chains not contained in a longer one
+    workers: process pool size (None = one per CPU, 1 = serial); small
+    graphs always run serially. Output is the same either way.
+    on_stage: optional callable, called with each detector name as it starts
+    cycle_window_hours: only report cycles whose transfers run in time
+    order within this many hours (None = timestamps are ignored)
+
+    Accounts are reported as G's int node ids throughout (see
+    label_detections); build_final_json turns them back into account ids.
+    """
+    budgets = budgets or {}
+    stage = on_stage or (lambda name: None)
+    n_workers = pool_size(G, workers)
+
+    if n_workers > 1:
+        raw_cycles, smurf, raw_shell = detect_parallel(
+            df, G, n_workers, budgets, maximal_only=maximal_chains,
+            on_stage=stage, cycle_window_hours=cycle_window_hours
+        )
+    else:
+        stage("cycles")
+        raw_cycles = detect_cycles(
+            G, budget=budgets.get("cycles"), window_hours=cycle_window_hours
+        )
+        stage("smurfing")
+        smurf = detect_smurfing(
+            df, budget=budgets.get("smurfing"), ids=G.row_accounts()
+        )
+        stage("shell_chains")
+        raw_shell = detect_shell_chains(
+            G,
+            raw_cycles,
+            budget=budgets.get("shell_chains"),
+            maximal_only=maximal_chains
+        )
 
     cycles = [
         {"length": len(cycle["members"]), "members": cycle["members"]}
@@ -19,12 +69,20 @@ def detect_patterns(df, G):
     ]
 
     fan_in = [
-        {"aggregator": cluster["account"], "senders": cluster["members"]}
+        {
+            "aggregator": cluster["account"],
+            "senders": cluster["members"],
+            "bursts": cluster["bursts"]
+        }
         for cluster in smurf["fan_in"]
     ]
 
     fan_out = [
-        {"distributor": cluster["account"], "receivers": cluster["members"]}
+        {
+            "distributor": cluster["account"],
+            "receivers": cluster["members"],
+            "bursts": cluster["bursts"]
+        }
         for cluster in smurf["fan_out"]
     ]
 
@@ -38,52 +96,200 @@ def detect_patterns(df, G):
     }
 
 
-def count_transactions(df):
-    counts = {}
+def pipeline_config(time_budget=None, max_results=None, maximal_chains=False,
+                    chunksize=None, workers=None, consolidate_rings=False,
+                    cycle_window_hours=None):
+    """
+    Everything that decides run_pipeline's output for a given file:
+    detector constants, scoring weights and the output-affecting
+    options. Used as part of the result cache key (workers is left out,
+    serial and parallel runs give the same output).
+    """
+    return {
+        "cycle_length": [MIN_LENGTH, MAX_LENGTH],
+        "cycle_window_hours": cycle_window_hours,
+        "smurf_threshold": THRESHOLD,
+        "smurf_window_hours": WINDOW_HOURS,
+        "shell_max_degree": MAX_SHELL_DEGREE,
+        "shell_degree": SHELL_DEGREE,
+        "shell_min_nodes": MIN_CHAIN_NODES,
+        "shell_max_depth": MAX_DEPTH,
+        "base_scores": BASE_SCORES,
+        "ring_risk_scores": RISK_SCORES,
+        "time_budget": time_budget,
+        "max_results": max_results,
+        "maximal_chains": maximal_chains,
+        "chunksize": chunksize,
+        "consolidate_rings": consolidate_rings
+    }
+
+
+def label_detections(detections, labels):
+    """detect_patterns output with node ids replaced by account ids
+    (labels: G.accounts), for printing and inspection."""
+    def names(ids):
+        return labels[ids].tolist()
+
+    return {
+        "cycles": [
+            dict(cycle, members=names(cycle["members"]))
+            for cycle in detections["cycles"]
+        ],
+        "fan_in": [
+            dict(d, aggregator=labels[d["aggregator"]], senders=names(d["senders"]))
+            for d in detections["fan_in"]
+        ],
+        "fan_out": [
+            dict(d, distributor=labels[d["distributor"]], receivers=names(d["receivers"]))
+            for d in detections["fan_out"]
+        ],
+        "shell_chains": [
+            dict(chain, path=names(chain["path"]))
+            for chain in detections["shell_chains"]
+        ]
+    }
+
+
+def run_pipeline(file_path, start_time, time_budget=None, max_results=None,
+                 maximal_chains=False, chunksize=None, workers=None,
+                 on_stage=None, cancel=None, timings=None,
+                 consolidate_rings=False, snapshot=None, cycle_window_hours=None):
+    """
+    file_path: CSV path, or a readable binary stream of it (e.g. an
+    upload.UploadReader, parsed as it arrives)
+    time_budget: wall-clock seconds each detector may spend
+    max_results: max detections each detector may return
+    maximal_chains: collapse shell chains contained in longer ones
+    chunksize: stream the CSV in chunks of this many rows (typed,
+    interned ids, dedup on transaction_id); summary gets the row counts
+    workers: detection process pool size (see detect_patterns)
+    on_stage: optional callable, called with each stage name (STAGES) as
+    it starts; it may raise to abort the run
+    cancel: optional threading.Event that stops running detectors early
+    timings: optional StageRecorder; when given it is filled in per stage
+    and the summary gets a "stage_timings" block
+    consolidate_rings: merge fraud rings that share accounts (see
+    build_rings_and_assign_ids)
+    snapshot: optional snapshot directory; if it exists, transactions and
+    graph are mapped from it and file_path is not read (may be None),
+    otherwise the CSV is parsed as usual and saved there
+    cycle_window_hours: temporal cycle mode (see detect_patterns)
+
+    When a budget is set, detectors stop early once it runs out and the
+    summary reports which ones were truncated.
 
-    for _, row in df.iterrows():
-        sender = row["sender_id"]
-        receiver = row["receiver_id"]
-        counts[sender] = counts.get(sender, 0) + 1
-        counts[receiver] = counts.get(receiver, 0) + 1
+    returns (G, detections as node ids, final_json)
+    """
+    recorder = timings if timings is not None else StageRecorder()
 
-    return counts
+    def stage(name):
+        recorder.start(name)
+        if on_stage is not None:
+            on_stage(name)
 
+    stage("parse")
+    parse_report = None
+    if snapshot is not None and is_snapshot(snapshot):
+        df, G = load_snapshot(snapshot)
+        recorder.count("parse", rows=len(df))
+        stage("graph")
+    else:
+        parse_report = {} if chunksize else None
+        df = parse_csv(file_path, chunksize=chunksize, report=parse_report)
+        recorder.count("parse", rows=len(df))
 
-def run_pipeline(file_path, start_time):
-    df = parse_csv(file_path)
-    G = build_graph(df)
-    detections = detect_patterns(df, G)
-    transaction_counts = count_transactions(df)
+        stage("graph")
+        G = build_graph(df)
+        if snapshot is not None:
+            save_snapshot(snapshot, df, G)
+    recorder.count("graph", nodes=G.n_nodes, edges=G.n_edges)
 
+    limited = time_budget is not None or max_results is not None
+    budgets = None
+    if limited or cancel is not None:
+        budgets = {
+            name: Budget(time_budget, max_results, cancel) for name in DETECTORS
+        }
+
+    detections = detect_patterns(
+        df, G, budgets, maximal_chains, workers, on_stage=stage,
+        cycle_window_hours=cycle_window_hours
+    )
+    recorder.count("cycles", cycles=len(detections["cycles"]))
+    recorder.count(
+        "smurfing",
+        fan_in=len(detections["fan_in"]),
+        fan_out=len(detections["fan_out"])
+    )
+    recorder.count("shell_chains", chains=len(detections["shell_chains"]))
+
+    # scoring and ring building stay on node ids: transfers per account
+    # are the graph's tx_degree
+    stage("score")
     suspicious_accounts = calculate_suspicion_scores(
         detections,
-        transaction_counts
+        G.tx_degree
     )
+    recorder.count("score", suspicious_accounts=len(suspicious_accounts))
+
+    stage("rings")
     suspicious_accounts, fraud_rings = build_rings_and_assign_ids(
         detections,
-        suspicious_accounts
+        suspicious_accounts,
+        consolidate=consolidate_rings
     )
+    recorder.count("rings", rings=len(fraud_rings))
 
+    stage("summary")
     final_json = build_final_json(
         suspicious_accounts,
         fraud_rings,
-        total_accounts=len(transaction_counts),
-        start_time=start_time
+        total_accounts=G.n_nodes,
+        start_time=start_time,
+        budget_report=(
+            {name: b.report() for name, b in budgets.items()}
+            if limited else None
+        ),
+        parse_report=parse_report,
+        stage_timings=recorder.report() if timings is not None else None,
+        account_labels=G.accounts
     )
+    recorder.end()
 
     return G, detections, final_json
 
 
 if __name__ == "__main__":
+    import argparse
     import json
+    import os
     import time
 
-    file_path = "transactions.csv"
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file_path", nargs="?", default="transactions.csv")
+    parser.add_argument(
+        "--snapshot", default=None,
+        help="snapshot directory: used instead of the CSV if it was built from the "
+             "same file, else (re)written"
+    )
+    parser.add_argument(
+        "--cycle-window-hours", type=float, default=None,
+        help="only report cycles whose transfers run in time order within this window"
+    )
+    args = parser.parse_args()
 
     try:
         start = time.time()
-        G, results, final_json = run_pipeline(file_path, start)
+        # the snapshot stands in for the CSV only while the file is
+        # unchanged; without the file an existing snapshot is used as is
+        if args.snapshot is not None and os.path.isfile(args.file_path):
+            if refresh_snapshot(args.file_path, args.snapshot) == "rebuilt":
+                print(f"{args.file_path} changed since {args.snapshot} was written; rebuilt it")
+        G, results, final_json = run_pipeline(
+            args.file_path, start, snapshot=args.snapshot,
+            cycle_window_hours=args.cycle_window_hours
+        )
+        results = label_detections(results, G.accounts)
         print("Number of nodes:", G.number_of_nodes())
         print("Number of edges:", G.number_of_edges())
 
@@ -1,11 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file
+import json
 import time
 import os
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 
 
-from main import run_pipeline
-from final_json_builder import save_json
+from main import pipeline_config, run_pipeline
+from jobs import JobQueue, QueueFull
+from result_cache import ResultCache
+from result_store import ResultStore, page_bounds
+from risk_store import RiskStore
+from snapshot import build_snapshot, is_snapshot, prune_snapshots
+from metrics import PIPELINE_METRICS, StageRecorder
+from final_json_builder import FORMATS, MIMETYPES, gzip_chunks, iter_json
+from upload import UnsupportedUpload, UploadReader, UploadTooLarge, spool
 
 app = Flask(__name__)
 CORS(app)
@@ -13,9 +22,205 @@ CORS(app)
 
 UPLOAD_FOLDER = "uploads"
 OUTPUT_FOLDER = "outputs"
+SNAPSHOT_FOLDER = os.path.join(OUTPUT_FOLDER, "snapshots")
+
+# Per-detector limits so one bad upload can't pin a worker
+DETECTOR_TIME_BUDGET = 10       # seconds
+DETECTOR_MAX_RESULTS = 50_000
+# Detection process pool size per request (None = one per CPU). Every
+# request and job would start its own pool of that many processes, so
+# the server runs detection serially; raise it only with CPUs to spare
+# for JOB_WORKERS jobs plus concurrent /analyze requests at once
+DETECTOR_WORKERS = 1
+
+# Merge fraud rings that share accounts into one ring each
+CONSOLIDATE_RINGS = False
+
+# Only count cycles whose transfers run in time order within this many
+# hours (e.g. 72); None ignores timestamps
+CYCLE_WINDOW_HOURS = None
+
+# Bigger uploads must go through the job API instead of /analyze.
+# Limits apply to the bytes received and, for gzip / zstd uploads, to
+# the CSV they decompress to; both are checked while streaming
+SYNC_MAX_BYTES = 20 * 1024 * 1024
+SYNC_MAX_CSV_BYTES = 200 * 1024 * 1024
+JOB_MAX_BYTES = 2 * 1024 * 1024 * 1024
+JOB_MAX_CSV_BYTES = 8 * 1024 * 1024 * 1024
+
+# Request bodies taken as the CSV itself (instead of a multipart "file")
+RAW_UPLOAD_TYPES = (
+    "text/csv", "application/gzip", "application/zstd", "application/octet-stream"
+)
+# Room for multipart boundaries, part headers and small form fields on
+# top of a route's byte limit (see receive_input)
+MULTIPART_OVERHEAD = 64 * 1024
+
+# No request may be bigger than the largest upload a route accepts
+app.config["MAX_CONTENT_LENGTH"] = JOB_MAX_BYTES + MULTIPART_OVERHEAD
+
+PIPELINE_OPTIONS = {
+    "time_budget": DETECTOR_TIME_BUDGET,
+    "max_results": DETECTOR_MAX_RESULTS,
+    "workers": DETECTOR_WORKERS,
+    "consolidate_rings": CONSOLIDATE_RINGS,
+    "cycle_window_hours": CYCLE_WINDOW_HOURS
+}
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+os.makedirs(SNAPSHOT_FOLDER, exist_ok=True)
+
+# Results are stored per (upload content, config) hash and reused
+result_cache = ResultCache(os.path.join(OUTPUT_FOLDER, "cache"))
+CACHE_CONFIG = pipeline_config(**PIPELINE_OPTIONS)
+
+# ...and indexed for paged queries under that same key (the result_id)
+result_store = ResultStore(os.path.join(OUTPUT_FOLDER, "results.db"))
+
+# Every run's flagged accounts and rings also go into a history kept
+# across uploads, with a per-account score decaying over this half-life
+RISK_HALF_LIFE_DAYS = 30
+risk_store = RiskStore(
+    os.path.join(OUTPUT_FOLDER, "risk.db"), half_life_days=RISK_HALF_LIFE_DAYS
+)
+
+job_queue = JobQueue(
+    os.path.join(OUTPUT_FOLDER, "jobs"),
+    cache=result_cache, store=result_store, risk_store=risk_store
+)
+
+# ======================================================
+# INPUT: CSV UPLOAD OR SNAPSHOT
+# ======================================================
+class BadInput(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def upload_error(exc):
+    """UploadReader errors -> BadInput with the matching status."""
+    if isinstance(exc, UploadTooLarge):
+        return BadInput(str(exc), 413)
+    return BadInput(str(exc), 415)
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(exc):
+    # raised by Werkzeug past request.max_content_length
+    return jsonify({
+        "error": f"Request is larger than {request.max_content_length} bytes"
+    }), 413
+
+
+def receive_input(max_bytes, max_csv_bytes, spool_upload=False):
+    """
+    What the pipeline should read:
+    - an uploaded CSV, as a multipart "file" field or as the request body
+      itself (Content-Type in RAW_UPLOAD_TYPES); gzip / zstd uploads are
+      decompressed on the fly (see upload.UploadReader)
+    - no upload but snapshot_id=<content hash>: that stored snapshot
+
+    Uploads are parsed straight from the stream, so the content hash is
+    only known once they have been read (reader.hexdigest()). They are
+    spooled to a uniquely named file under UPLOAD_FOLDER first only when
+    the hash or the bytes are needed before that: spool_upload (the job
+    API parses after the request) or snapshot=1 (an existing snapshot
+    replaces parsing); the caller removes that file.
+
+    Only the raw-body path is truly streamed. Werkzeug parses a multipart
+    body into a temporary file (in memory up to 500kB, then on disk)
+    before UploadReader sees it, so for those max_bytes is enforced on
+    the request as it arrives instead: request.max_content_length is set
+    to max_bytes plus MULTIPART_OVERHEAD before the form is read, and
+    anything bigger fails with 413 without being written in full.
+
+    returns (spooled path, UploadReader or None, content hash or None,
+    snapshot dir or None)
+    """
+    request.max_content_length = max_bytes + MULTIPART_OVERHEAD
+    values = request.values
+    if "file" in request.files:
+        file = request.files["file"]
+        if file.filename == "":
+            raise BadInput("Empty filename")
+        stream = file.stream
+    elif request.mimetype in RAW_UPLOAD_TYPES:
+        stream = request.stream
+    elif values.get("snapshot_id"):
+        snapshot_id = values["snapshot_id"]
+        if len(snapshot_id) != 64 or not all(c in "0123456789abcdef" for c in snapshot_id):
+            raise BadInput("Invalid snapshot_id")
+        path = os.path.join(SNAPSHOT_FOLDER, snapshot_id)
+        if not is_snapshot(path):
+            raise BadInput("Unknown snapshot", 404)
+        return None, None, snapshot_id, path
+    else:
+        raise BadInput("No CSV uploaded")
+
+    try:
+        reader = UploadReader(stream, max_bytes, max_csv_bytes)
+        keep_snapshot = values.get("snapshot") in ("1", "true")
+        if not (spool_upload or keep_snapshot):
+            return None, reader, None, None
+
+        filepath = spool(reader, UPLOAD_FOLDER)
+    except (UploadTooLarge, UnsupportedUpload) as exc:
+        raise upload_error(exc)
+
+    content_hash = reader.hexdigest()
+    snapshot = None
+    if keep_snapshot:
+        snapshot = os.path.join(SNAPSHOT_FOLDER, content_hash)
+        prune_snapshots(SNAPSHOT_FOLDER)
+
+    return filepath, None, content_hash, snapshot
+
+
+class CachedResult(Exception):
+    """
+    Raised from run_pipeline's on_stage hook when a streamed upload,
+    hashed once parsed, turns out to have a cached result.
+    """
+
+    def __init__(self, final_json):
+        super().__init__("cached")
+        self.final_json = final_json
+
+
+# ======================================================
+# RESULT RESPONSES
+# ======================================================
+def requested_format(default="compact"):
+    """?format=pretty|compact|ndjson (None if unknown)."""
+    fmt = request.args.get("format", default)
+    return fmt if fmt in FORMATS else None
+
+
+def result_response(final_json, fmt):
+    """
+    Stream final_json from iter_json instead of building the whole
+    body; gzipped when the client accepts it.
+    """
+    chunks = iter_json(final_json, fmt)
+    headers = {"Vary": "Accept-Encoding"}
+    if "gzip" in request.accept_encodings:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return Response(chunks, mimetype=MIMETYPES[fmt], headers=headers)
+
+
+def tag_result(final_json, result_id, snapshot):
+    """Ids a client can come back with: paged results, snapshot input."""
+    final_json["summary"]["result_id"] = result_id
+    if snapshot is not None and is_snapshot(snapshot):
+        final_json["summary"]["snapshot_id"] = os.path.basename(snapshot)
+
+
+def bad_format():
+    return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+
 
 # ======================================================
 # MAIN API
@@ -25,35 +230,314 @@ def analyze():
 
     start_time = time.time()
 
-    # check file
-    if "file" not in request.files:
-        return jsonify({"error": "No CSV uploaded"}), 400
+    if request.content_length and request.content_length > SYNC_MAX_BYTES:
+        return jsonify({
+            "error": "File too large for /analyze, submit it to POST /jobs"
+        }), 413
+
+    fmt = requested_format()
+    if fmt is None:
+        return bad_format()
 
-    file = request.files["file"]
+    try:
+        filepath, reader, content_hash, snapshot = receive_input(
+            SYNC_MAX_BYTES, SYNC_MAX_CSV_BYTES
+        )
+    except BadInput as exc:
+        return jsonify({"error": str(exc)}), exc.status
+
+    try:
+        return analyze_input(
+            filepath, reader, content_hash, snapshot, fmt, start_time
+        )
+    finally:
+        if filepath is not None:
+            os.remove(filepath)
+
+
+def analyze_input(filepath, reader, content_hash, snapshot, fmt, start_time):
+
+    if reader is not None:
+        print("CSV received: streamed,", reader.compression or "uncompressed")
+    else:
+        print("CSV received:", filepath or snapshot)
+
+    cache_key = None
 
-    if file.filename == "":
-        return jsonify({"error": "Empty filename"}), 400
+    def cached_response(final_json):
+        # the pipeline is what writes snapshots, and a hit skips it
+        if snapshot is not None and not is_snapshot(snapshot):
+            build_snapshot(filepath, snapshot, content_hash)
+        final_json["summary"]["processing_time_seconds"] = round(
+            time.time() - start_time, 2
+        )
+        if not result_store.has(cache_key):
+            result_store.save(cache_key, final_json)
+        risk_store.record(cache_key, final_json)
+        tag_result(final_json, cache_key, snapshot)
+        return result_response(result_cache.annotate(final_json, hit=True), fmt)
 
-    # save uploaded file
-    filepath = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(filepath)
+    if content_hash is not None:
+        cache_key = result_cache.key(content_hash, CACHE_CONFIG)
+        final_json = result_cache.get(cache_key)
+        if final_json is not None:
+            return cached_response(final_json)
 
-    print("CSV received:", filepath)
+    def check_cache(name):
+        # a streamed upload is fully read (and hashed) once parsed
+        nonlocal cache_key
+        if name == "graph" and cache_key is None:
+            cache_key = result_cache.key(reader.hexdigest(), CACHE_CONFIG)
+            final_json = result_cache.get(cache_key)
+            if final_json is not None:
+                raise CachedResult(final_json)
 
+    recorder = StageRecorder()
     try:
-        _, _, final_json = run_pipeline(filepath, start_time)
+        _, _, final_json = run_pipeline(
+            filepath or reader, start_time, timings=recorder, snapshot=snapshot,
+            on_stage=check_cache, **PIPELINE_OPTIONS
+        )
+    except CachedResult as hit:
+        return cached_response(hit.final_json)
+    except (UploadTooLarge, UnsupportedUpload) as exc:
+        recorder.end()
+        PIPELINE_METRICS.observe(recorder, "failed")
+        error = upload_error(exc)
+        return jsonify({"error": str(error)}), error.status
     except Exception as exc:
+        recorder.end()
+        PIPELINE_METRICS.observe(recorder, "failed")
         return jsonify({"error": str(exc)}), 400
 
+    PIPELINE_METRICS.observe(recorder, "ok")
+
     # ======================================================
-    # STEP 7: SAVE JSON
+    # STEP 7: STORE RESULT (one file per cache key)
     # ======================================================
-    save_json(final_json)
+    result_cache.put(cache_key, final_json)
+    result_store.save(cache_key, final_json)
+    risk_store.record(cache_key, final_json)
+    tag_result(final_json, cache_key, snapshot)
 
     # ======================================================
     # STEP 8: RETURN RESPONSE
     # ======================================================
-    return jsonify(final_json)
+    return result_response(result_cache.annotate(final_json, hit=False), fmt)
+
+
+# ======================================================
+# JOB API
+# ======================================================
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+
+    # spooled: the job parses it after this request, then deletes it
+    try:
+        filepath, _, content_hash, snapshot = receive_input(
+            JOB_MAX_BYTES, JOB_MAX_CSV_BYTES, spool_upload=True
+        )
+    except BadInput as exc:
+        return jsonify({"error": str(exc)}), exc.status
+
+    try:
+        job = job_queue.submit(
+            filepath,
+            cache_key=result_cache.key(content_hash, CACHE_CONFIG),
+            snapshot=snapshot,
+            **PIPELINE_OPTIONS
+        )
+    except QueueFull as exc:
+        if filepath is not None:
+            os.remove(filepath)
+        return jsonify({"error": str(exc)}), 503
+
+    response = job.to_dict()
+    if snapshot is not None:
+        response["snapshot_id"] = content_hash
+    return jsonify(response), 202
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    return jsonify(job.to_dict())
+
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    if job.status != "done":
+        return jsonify({
+            "error": f"Job is {job.status}",
+            "status": job.status
+        }), 409
+
+    # stored as pretty JSON; other formats are re-encoded from it
+    fmt = requested_format(default="pretty")
+    if fmt is None:
+        return bad_format()
+    if fmt == "pretty":
+        return send_file(os.path.abspath(job.result_path), mimetype="application/json")
+
+    with open(job.result_path) as f:
+        final_json = json.load(f)
+    return result_response(final_json, fmt)
+
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    return jsonify(job.to_dict())
+
+
+# ======================================================
+# PAGED RESULTS (by the summary's result_id)
+# ======================================================
+def page_args():
+    return page_bounds(
+        request.args.get("offset", type=int),
+        request.args.get("limit", type=int)
+    )
+
+
+def unknown_result():
+    return jsonify({"error": "Unknown result"}), 404
+
+
+@app.route("/results/<result_id>", methods=["GET"])
+def result_summary(result_id):
+
+    summary = result_store.summary(result_id)
+    if summary is None:
+        return unknown_result()
+
+    return jsonify(summary)
+
+
+@app.route("/results/<result_id>/suspicious_accounts", methods=["GET"])
+def result_accounts(result_id):
+
+    if not result_store.has(result_id):
+        return unknown_result()
+
+    offset, limit = page_args()
+    total, accounts = result_store.accounts(
+        result_id,
+        min_score=request.args.get("min_score", type=float),
+        pattern=request.args.get("pattern"),
+        ring_id=request.args.get("ring_id"),
+        offset=offset,
+        limit=limit
+    )
+    return jsonify({
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "suspicious_accounts": accounts
+    })
+
+
+@app.route("/results/<result_id>/fraud_rings", methods=["GET"])
+def result_rings(result_id):
+
+    if not result_store.has(result_id):
+        return unknown_result()
+
+    offset, limit = page_args()
+    total, rings = result_store.rings(
+        result_id,
+        pattern_type=request.args.get("pattern_type"),
+        account_id=request.args.get("account_id"),
+        offset=offset,
+        limit=limit
+    )
+    return jsonify({
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "fraud_rings": rings
+    })
+
+
+@app.route("/results/<result_id>/fraud_rings/<ring_id>", methods=["GET"])
+def result_ring(result_id, ring_id):
+
+    offset, limit = page_args()
+    ring = result_store.ring(result_id, ring_id, offset, limit)
+    if ring is None:
+        return jsonify({"error": "Unknown ring"}), 404
+
+    return jsonify(dict(ring, offset=offset, limit=limit))
+
+
+# ======================================================
+# ACCOUNT RISK HISTORY (across every recorded run)
+# ======================================================
+@app.route("/risk/accounts", methods=["GET"])
+def risk_accounts():
+
+    offset, limit = page_args()
+    total, accounts = risk_store.accounts(
+        min_score=request.args.get("min_score", type=float),
+        max_score=request.args.get("max_score", type=float),
+        run_id=request.args.get("run_id"),
+        offset=offset,
+        limit=limit
+    )
+    return jsonify({
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "accounts": accounts
+    })
+
+
+@app.route("/risk/accounts/<account_id>", methods=["GET"])
+def risk_account(account_id):
+
+    offset, limit = page_args()
+    account = risk_store.account(account_id, offset, limit)
+    if account is None:
+        return jsonify({"error": "Unknown account"}), 404
+
+    return jsonify(dict(account, offset=offset, limit=limit))
+
+
+@app.route("/risk/runs/<run_id>/rings/<ring_id>", methods=["GET"])
+def risk_ring(run_id, ring_id):
+
+    offset, limit = page_args()
+    ring = risk_store.ring(run_id, ring_id, offset, limit)
+    if ring is None:
+        return jsonify({"error": "Unknown ring"}), 404
+
+    return jsonify(dict(ring, offset=offset, limit=limit))
+
+
+# ======================================================
+# METRICS (Prometheus text format, per server process)
+# ======================================================
+@app.route("/metrics", methods=["GET"])
+def metrics():
+
+    body = PIPELINE_METRICS.render(extra_counters=[
+        ("result_cache_hits_total", "Result cache hits.", result_cache.hits),
+        ("result_cache_misses_total", "Result cache misses.", result_cache.misses)
+    ])
+    return Response(body, mimetype="text/plain; version=0.0.4")
 
 
 # ======================================================
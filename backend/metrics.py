@@ -0,0 +1,205 @@
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def peak_rss_bytes():
+    """Process peak resident set size so far (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# =========================
+# PER-RUN STAGE RECORDING
+# =========================
+class StageRecorder:
+    """
+    Wall time, CPU time, memory and item counts for each pipeline stage.
+
+    start(name) closes the running stage and opens the next one. CPU
+    time is this thread's (time.thread_time), so concurrent jobs don't
+    bleed into each other; work done in detection pool processes is not
+    included. Memory is the process peak RSS: its high-water mark at the
+    end of the stage and how much the stage raised it.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.current = None
+
+    def start(self, name):
+        self.end()
+        self.current = name
+        self.stages[name] = {
+            "wall": time.perf_counter(),
+            "cpu": time.thread_time(),
+            "rss": peak_rss_bytes(),
+            "items": {}
+        }
+
+    def end(self):
+        if self.current is None:
+            return
+        state = self.stages[self.current]
+        peak = peak_rss_bytes()
+        state["wall"] = time.perf_counter() - state["wall"]
+        state["cpu"] = time.thread_time() - state["cpu"]
+        state["growth"] = peak - state["rss"] if peak is not None else None
+        state["rss"] = peak
+        state["done"] = True
+        self.current = None
+
+    def count(self, stage, **items):
+        self.stages[stage]["items"].update(items)
+
+    def report(self):
+        """Finished stages, JSON-ready (sizes in MB)."""
+        def mb(value):
+            return round(value / 2**20, 1) if value is not None else None
+
+        return {
+            name: {
+                "wall_seconds": round(state["wall"], 4),
+                "cpu_seconds": round(state["cpu"], 4),
+                "peak_rss_mb": mb(state["rss"]),
+                "rss_growth_mb": mb(state["growth"]),
+                "items": state["items"]
+            }
+            for name, state in self.stages.items()
+            if state.get("done")
+        }
+
+
+# =========================
+# PROMETHEUS AGGREGATES
+# =========================
+SECONDS_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(2**20 * mb for mb in (1, 4, 16, 64, 256, 1024, 4096))
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, label_values=(), amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}  # label values -> [bucket counts, sum, count]
+
+    def observe(self, label_values, value):
+        counts, total, n = self.series.get(
+            label_values, ([0] * len(self.buckets), 0.0, 0)
+        )
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        self.series[label_values] = (counts, total + value, n + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for key, (counts, total, n) in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, counts):
+                lines.append(
+                    f"{self.name}_bucket{format_labels(names, key + (bound,))} {count}"
+                )
+            lines.append(f"{self.name}_bucket{format_labels(names, key + ('+Inf',))} {n}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, key)} {n}")
+        return lines
+
+
+class PipelineMetrics:
+    """
+    Aggregates StageRecorder runs into Prometheus text-format series.
+    Per process, like the job registry.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.runs = Counter(
+            "pipeline_runs_total", "Pipeline runs by outcome.", ("outcome",)
+        )
+        self.wall = Histogram(
+            "pipeline_stage_wall_seconds", "Wall time per pipeline stage.",
+            SECONDS_BUCKETS, ("stage",)
+        )
+        self.cpu = Histogram(
+            "pipeline_stage_cpu_seconds", "CPU time per pipeline stage (calling thread).",
+            SECONDS_BUCKETS, ("stage",)
+        )
+        self.growth = Histogram(
+            "pipeline_stage_rss_growth_bytes", "Peak RSS increase per pipeline stage.",
+            BYTES_BUCKETS, ("stage",)
+        )
+        self.items = Counter(
+            "pipeline_stage_items_total", "Items produced per pipeline stage.",
+            ("stage", "item")
+        )
+
+    def observe(self, recorder, outcome="ok"):
+        with self.lock:
+            self.runs.inc((outcome,))
+            for stage, state in recorder.stages.items():
+                if not state.get("done"):
+                    continue
+                self.wall.observe((stage,), state["wall"])
+                self.cpu.observe((stage,), state["cpu"])
+                if state["growth"] is not None:
+                    self.growth.observe((stage,), state["growth"])
+                for item, value in state["items"].items():
+                    self.items.inc((stage, item), value)
+
+    def render(self, extra_counters=()):
+        """extra_counters: (name, help, value) triples owned elsewhere."""
+        with self.lock:
+            lines = []
+            for metric in (self.runs, self.wall, self.cpu, self.growth, self.items):
+                lines.extend(metric.render())
+
+        peak = peak_rss_bytes()
+        if peak is not None:
+            lines += [
+                "# HELP process_peak_rss_bytes Peak resident set size of this process.",
+                "# TYPE process_peak_rss_bytes gauge",
+                f"process_peak_rss_bytes {peak}"
+            ]
+
+        for name, help_text, value in extra_counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value}"]
+
+        return "\n".join(lines) + "\n"
+
+
+PIPELINE_METRICS = PipelineMetrics()
@@ -0,0 +1,382 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import RawArray
+
+import numpy as np
+
+from budget import Budget
+from detectors.cycle import (
+    MIN_LENGTH,
+    MAX_LENGTH,
+    account_rank,
+    canonical_cycles,
+    cycle_components,
+    search_cycles,
+    search_temporal_cycles,
+    time_sorted_departures,
+    window_ns
+)
+from detectors.shell import (
+    MAX_DEPTH,
+    maximal_chains,
+    search_chains,
+    shell_allowed
+)
+from detectors.smurf import detect_smurfing
+
+
+MIN_PARALLEL_EDGES = 50_000  # below this, pool start-up costs more than it saves
+UNITS_PER_WORKER = 8         # several small units per worker even out the load
+SMURF_PATTERNS = ("fan_in", "fan_out")  # in serial result order
+
+
+def pool_size(G, workers=None):
+    """
+    Number of processes to run detection with; 1 means serial.
+    workers=None picks one per CPU, but tiny graphs always run serially.
+    """
+    if G.n_edges < MIN_PARALLEL_EDGES:
+        return 1
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(1, workers)
+
+
+# =========================
+# WORK UNITS
+# =========================
+def pack_cycle_units(components, n_units):
+    """
+    Cut the rank-ordered start nodes of all SCCs into about n_units
+    contiguous units of similar estimated cost.
+
+    A start only searches SCC members ranked above it, so the k-th start
+    of an SCC of size s is weighted s - k. Units are lists of
+    (component index, first start, end start) slices; running them in
+    order gives the serial start order back.
+    """
+    total = sum(len(starts) * (len(starts) + 1) // 2 for _, starts in components)
+    target = max(1, total // max(1, n_units))
+
+    units = []
+    current = []
+    load = 0
+
+    for cid, (_, starts) in enumerate(components):
+        size = len(starts)
+        lo = 0
+        for k in range(size):
+            load += size - k
+            if load >= target:
+                current.append((cid, lo, k + 1))
+                units.append(current)
+                current = []
+                lo = k + 1
+                load = 0
+        if lo < size:
+            current.append((cid, lo, size))
+
+    if current:
+        units.append(current)
+    return units
+
+
+def split_evenly(items, n_units):
+    step = max(1, -(-len(items) // max(1, n_units)))
+    return [items[i:i + step] for i in range(0, len(items), step)]
+
+
+# =========================
+# WORKER SIDE
+# =========================
+WORKER = {}
+
+
+def init_worker(G, components, allowed_flags):
+    """
+    Runs once per process: adjacency lists are built once, not per unit.
+    allowed_flags is shared memory the parent fills in (shell_allowed)
+    before submitting any chain unit.
+    """
+    WORKER["G"] = G
+    WORKER["allowed_flags"] = allowed_flags
+    WORKER["components"] = components
+    WORKER["successors"] = G.successor_lists()
+    WORKER["predecessors"] = G.predecessor_lists()
+    WORKER["rank"] = account_rank(G.accounts)
+
+
+def unit_budget(deadline, max_results, n_units):
+    """deadline is wall-clock (time.time()), so it means the same in every process."""
+    seconds = None if deadline is None else max(0.0, deadline - time.time())
+    budget = Budget(seconds, max_results)
+    budget.start(n_units)
+    return budget
+
+
+def run_cycle_unit(unit, min_length, max_length, deadline, max_results,
+                   window_hours=None):
+    components = WORKER["components"]
+    work = [
+        (components[cid][0], components[cid][1][lo:hi])
+        for cid, lo, hi in unit
+    ]
+    budget = unit_budget(
+        deadline, max_results, sum(len(starts) for _, starts in work)
+    )
+
+    if window_hours is None:
+        found = search_cycles(
+            work,
+            WORKER["successors"],
+            WORKER["predecessors"],
+            WORKER["rank"],
+            WORKER["G"].n_nodes,
+            min_length,
+            max_length,
+            budget
+        )
+    else:
+        if "departures" not in WORKER:
+            WORKER["departures"] = time_sorted_departures(WORKER["G"], components)
+        found = search_temporal_cycles(
+            work,
+            WORKER["departures"],
+            WORKER["rank"],
+            WORKER["G"].n_nodes,
+            min_length,
+            max_length,
+            window_ns(window_hours),
+            budget
+        )
+    budget.finish(len(found))
+
+    # a cycle starts at its start node; serial stops without counting
+    # the start that filled max_results as done
+    position = {}
+    for _, starts in work:
+        for start in starts:
+            position[start] = len(position)
+    done_at = [position[cycle["members"][0]] for cycle in found]
+    if window_hours is not None:
+        found = canonical_cycles(found, WORKER["rank"])
+
+    return found, done_at, budget.done, budget.truncated
+
+
+def run_smurf_unit(pattern, columns, deadline, max_results):
+    """
+    One direction: its columnar pass and candidate walk. Also returns
+    how many candidates the pass picked (the unit sizes itself).
+    """
+    budget = unit_budget(deadline, max_results, 0)
+    done_at = []
+    smurf = detect_smurfing(
+        columns, budget=budget, ids=WORKER["G"].row_accounts(),
+        patterns=(pattern,), done_at=done_at
+    )
+    return smurf[pattern], done_at, budget.done, budget.truncated, budget.total
+
+
+def allowed_nodes():
+    """The shared shell_allowed flags as a list (read once per process)."""
+    if "allowed" not in WORKER:
+        flags = np.frombuffer(WORKER["allowed_flags"], dtype=np.int8)
+        WORKER["allowed"] = flags.astype(bool).tolist()
+    return WORKER["allowed"]
+
+
+def run_chain_unit(starts, max_depth, deadline, max_results):
+    G = WORKER["G"]
+    allowed = allowed_nodes()
+    budget = unit_budget(deadline, max_results, len(starts))
+
+    chains = search_chains(
+        starts,
+        WORKER["successors"].__getitem__,
+        allowed,
+        G.n_nodes,
+        max_depth,
+        budget
+    )
+    budget.finish(len(chains))
+
+    # serial counts the start that filled max_results as done here
+    position = {start: i for i, start in enumerate(starts)}
+    done_at = [position[chain[0]] + 1 for chain in chains]
+
+    return chains, done_at, budget.done, budget.truncated
+
+
+# =========================
+# PARENT SIDE
+# =========================
+def collect(futures, budget, key=None):
+    """
+    Concatenate unit results in submission order, so the output is the
+    serial output. After a truncated unit the rest are dropped, keeping
+    the result an in-order prefix like a serial run that stopped there.
+    Units return done_at (progress at each result) so a max_results cut
+    reports the same progress as the serial run.
+
+    key: optional callable; results whose key an earlier unit already
+    returned are dropped before counting towards max_results
+
+    Units return (found, done_at, done, truncated); anything after that
+    is the caller's.
+    """
+    merged = []
+    seen = set()
+    for future in futures:
+        if budget.truncated is None and budget.cancel_requested():
+            budget.truncated = "cancelled"
+        if budget.truncated is not None:
+            future.cancel()
+            continue
+
+        found, done_at, done, truncated = future.result()[:4]
+
+        if key is not None:
+            fresh = [i for i, item in enumerate(found) if key(item) not in seen]
+            found = [found[i] for i in fresh]
+            done_at = [done_at[i] for i in fresh]
+            seen.update(key(item) for item in found)
+
+        if found and budget.full(len(merged) + len(found)):
+            keep = budget.max_results - len(merged)
+            merged.extend(found[:keep])
+            budget.absorb(done_at[keep - 1], "max_results")
+        else:
+            merged.extend(found)
+            budget.absorb(done, truncated)
+
+    return merged
+
+
+def cycle_key(cycle):
+    return tuple(cycle["members"])
+
+
+def deadline_of(budget):
+    if budget.seconds is None:
+        return None
+    return time.time() + budget.seconds
+
+
+def detect_parallel(df, G, workers, budgets=None, maximal_only=False,
+                    min_length=MIN_LENGTH, max_length=MAX_LENGTH, max_depth=MAX_DEPTH,
+                    on_stage=None, cycle_window_hours=None):
+    """
+    Runs the three detectors with a pool of `workers` processes and
+    returns (raw_cycles, smurf, raw_shell), identical to the serial
+    detect_cycles / detect_smurfing / detect_shell_chains output.
+
+    - cycles: SCCs are found once here, then their start nodes are cut
+      into balanced units (one huge SCC is split too, which is where
+      nearly all the time goes on real data); temporal cycles found
+      by more than one unit are kept from the first
+    - smurfing: one task per direction (fan-in, fan-out), each running
+      its own columnar pass and candidate walk, submitted ahead of the
+      cycle units; the columnar pass is most of the work, so the walk
+      is not split further
+    - shell chains: candidate start nodes are split evenly once the
+      cycle members they must avoid are known
+
+    on_stage gets "cycles", "smurfing", "shell_chains" as each one's
+    results are awaited; the smurfing tasks run before the cycle units,
+    so its stage only shows the wait left after the cycles are in.
+    """
+    budgets = budgets or {}
+    stage = on_stage or (lambda name: None)
+    cycle_budget = budgets.get("cycles") or Budget()
+    smurf_budget = budgets.get("smurfing") or Budget()
+    shell_budget = budgets.get("shell_chains") or Budget()
+
+    stage("cycles")
+
+    rank = account_rank(G.accounts)
+    components = cycle_components(G, rank, min_length)
+    n_units = workers * UNITS_PER_WORKER
+
+    # filled in once cycles are known; every worker maps the same memory
+    allowed_flags = RawArray("b", G.n_nodes)
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(G, components, allowed_flags)
+    ) as pool:
+
+        # --- smurfing first (a task per direction), then every cycle unit ---
+        # sized by the workers as they go (see detect_smurfing); only
+        # these tasks get the columns they read
+        smurf_budget.start(0)
+        columns = df[["amount", "timestamp"]]
+        deadline = deadline_of(smurf_budget)
+        smurf_futures = [
+            pool.submit(
+                run_smurf_unit, pattern, columns,
+                deadline, smurf_budget.max_results
+            )
+            for pattern in SMURF_PATTERNS
+        ]
+
+        cycle_budget.start(sum(len(starts) for _, starts in components))
+        deadline = deadline_of(cycle_budget)
+        futures = [
+            pool.submit(
+                run_cycle_unit, unit, min_length, max_length,
+                deadline, cycle_budget.max_results, cycle_window_hours
+            )
+            for unit in pack_cycle_units(components, n_units)
+        ]
+
+        raw_cycles = collect(
+            futures, cycle_budget,
+            key=None if cycle_window_hours is None else cycle_key
+        )
+        cycle_budget.finish(len(raw_cycles))
+
+        stage("smurfing")
+        # serial sizes both directions before walking either, so every
+        # unit's candidates count even when the first one fills the cap
+        for future in smurf_futures:
+            smurf_budget.add_units(future.result()[4])
+        found = collect(smurf_futures, smurf_budget)
+        smurf = {
+            pattern: [result for result in found if result["pattern"] == pattern]
+            for pattern in SMURF_PATTERNS
+        }
+        smurf_budget.finish(len(found))
+
+        # --- shell chains ---
+        stage("shell_chains")
+        allowed = shell_allowed(
+            G,
+            set(node for cycle in raw_cycles for node in cycle["members"])
+        )
+        np.frombuffer(allowed_flags, dtype=np.int8)[:] = allowed
+        candidate_nodes = [n for n in G.nodes if allowed[n]]
+
+        shell_budget.start(len(candidate_nodes))
+        deadline = deadline_of(shell_budget)
+        futures = [
+            pool.submit(
+                run_chain_unit, starts, max_depth,
+                deadline, shell_budget.max_results
+            )
+            for starts in split_evenly(candidate_nodes, n_units)
+        ]
+        chains = collect(futures, shell_budget)
+
+    if maximal_only:
+        chains = maximal_chains(chains)
+
+    raw_shell = [
+        {"members": list(chain), "pattern": "shell_chain"}
+        for chain in chains
+    ]
+    shell_budget.finish(len(raw_shell))
+
+    return raw_cycles, smurf, raw_shell
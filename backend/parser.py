@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 
@@ -9,8 +10,27 @@ REQUIRED_COLUMNS = [
     "timestamp"
 ]
 
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+CHUNK_ROWS = 100_000
+
+ID_DTYPES = {
+    "transaction_id": object,
+    "sender_id": object,
+    "receiver_id": object,
+    "timestamp": object
+}
+
+
+def parse_csv(file_path, chunksize=None, report=None):
+    """
+    chunksize: when set, stream the file in chunks of this many rows
+    (see parse_csv_chunked); otherwise load it in one go.
+    report: optional dict, filled with row counts (read / kept / dropped
+    per reason) in chunked mode
+    """
+    if chunksize:
+        return parse_csv_chunked(file_path, chunksize, report)
 
-def parse_csv(file_path):
     df = pd.read_csv(file_path)
 
     for col in REQUIRED_COLUMNS:
@@ -32,4 +52,221 @@ def parse_csv(file_path):
 
     df = df.drop_duplicates()
 
-    return df
\ No newline at end of file
+    return df
+
+
+def parse_timestamps(values):
+    """
+    Fixed-format fast path; only values that don't match TIMESTAMP_FORMAT
+    go through (slow) per-value format inference.
+    """
+    ts = pd.to_datetime(values, format=TIMESTAMP_FORMAT, errors="coerce")
+    missed = ts.isna() & values.notna()
+    if missed.any():
+        ts[missed] = pd.to_datetime(values[missed], format="mixed", errors="coerce")
+    return ts
+
+
+class SeenIds:
+    """
+    Transaction ids kept so far, for duplicate checks across chunks.
+
+    Ids are indexed by 64-bit hash in sorted runs, each at least twice
+    the size of the next newer one: adding a chunk only merges runs of
+    comparable size (O(n log n) over the file, instead of re-sorting
+    everything per chunk) and a lookup is a binary search in each of the
+    O(log n) runs. Runs keep the ids next to their hashes, so a hash
+    match is confirmed against the id itself and a collision never
+    drops a distinct transaction.
+    """
+
+    def __init__(self):
+        self.runs = []  # (sorted hashes, ids in the same order), oldest first
+
+    def contains(self, ids, hashes):
+        """Bool mask: which of ids were added before."""
+        seen = np.zeros(len(ids), dtype=bool)
+        # sorted needles keep the binary searches cache-friendly
+        order = np.argsort(hashes)
+        sorted_hashes = hashes[order]
+        first = np.empty(len(ids), dtype=np.intp)
+
+        for run_hashes, run_ids in self.runs:
+            first[order] = np.searchsorted(run_hashes, sorted_hashes)
+            inside = np.minimum(first, len(run_hashes) - 1)
+            candidates = np.flatnonzero((run_hashes[inside] == hashes) & ~seen)
+            if len(candidates) == 0:
+                continue
+
+            match = same_ids(run_ids[first[candidates]], ids[candidates])
+            seen[candidates[match]] = True
+
+            # hash collisions: other ids under the same hash
+            for i in candidates[~match].tolist():
+                j = first[i] + 1
+                while j < len(run_hashes) and run_hashes[j] == hashes[i]:
+                    if same_ids(run_ids[j], ids[i]):
+                        seen[i] = True
+                        break
+                    j += 1
+        return seen
+
+    def add(self, ids, hashes):
+        if len(ids) == 0:
+            return
+        order = np.argsort(hashes, kind="stable")
+        runs = self.runs
+        runs.append((hashes[order], ids[order]))
+        while len(runs) > 1 and len(runs[-2][0]) <= 2 * len(runs[-1][0]):
+            runs[-2:] = [merge_runs(*runs[-2:])]
+
+
+def merge_runs(old, new):
+    """Merge two sorted (hashes, ids) runs in linear time (old first on ties)."""
+    (old_hashes, old_ids), (new_hashes, new_ids) = old, new
+    at = np.searchsorted(old_hashes, new_hashes, side="right")
+    at += np.arange(len(new_hashes))
+    from_old = np.ones(len(old_hashes) + len(new_hashes), dtype=bool)
+    from_old[at] = False
+
+    hashes = np.empty(len(from_old), dtype=old_hashes.dtype)
+    ids = np.empty(len(from_old), dtype=object)
+    hashes[at] = new_hashes
+    hashes[from_old] = old_hashes
+    ids[at] = new_ids
+    ids[from_old] = old_ids
+    return hashes, ids
+
+
+def same_ids(a, b):
+    """Elementwise id equality, treating missing ids as equal (like duplicated())."""
+    return (a == b) | (pd.isna(a) & pd.isna(b))
+
+
+def parse_csv_chunked(file_path, chunksize=CHUNK_ROWS, report=None):
+    """
+    Streaming ingestion with bounded working memory.
+
+    - only REQUIRED_COLUMNS are read, ids and timestamps as plain strings
+    - account ids are interned into one shared category table, so each
+      row keeps two int32 codes instead of two strings
+    - timestamps use the fixed TIMESTAMP_FORMAT fast path
+    - duplicates are keyed on transaction_id only (first one wins),
+      tracked across chunks by SeenIds
+    - per-chunk temporaries are freed before the next chunk is read, so
+      beyond the compact output columns, memory scales with chunksize
+    """
+    counts = {
+        "rows_read": 0,
+        "missing_account": 0,
+        "bad_amount": 0,
+        "bad_timestamp": 0,
+        "duplicate_transaction_id": 0,
+        "rows_kept": 0
+    }
+
+    accounts = pd.Index([], dtype=object)
+    seen_ids = SeenIds()
+
+    tx_parts = []
+    sender_parts = []
+    receiver_parts = []
+    amount_parts = []
+    ts_parts = []
+
+    def intern(values):
+        # factorize the chunk, then map only its distinct ids to global codes
+        nonlocal accounts
+        local_codes, uniques = pd.factorize(values)
+        mapping = accounts.get_indexer(uniques)
+        new = mapping == -1
+        mapping[new] = np.arange(len(accounts), len(accounts) + new.sum())
+        accounts = accounts.append(pd.Index(uniques[new], dtype=object))
+        return mapping.astype(np.int32)[local_codes]
+
+    reader = pd.read_csv(
+        file_path,
+        usecols=lambda col: col in REQUIRED_COLUMNS,
+        dtype=ID_DTYPES,
+        chunksize=chunksize
+    )
+
+    def check_columns(columns):
+        for col in REQUIRED_COLUMNS:
+            if col not in columns:
+                raise ValueError(f"Missing required column: {col}")
+
+    first = True
+    for chunk in reader:
+        if first:
+            check_columns(chunk.columns)
+            first = False
+
+        counts["rows_read"] += len(chunk)
+
+        keep = chunk["sender_id"].notna() & chunk["receiver_id"].notna()
+        counts["missing_account"] += int((~keep).sum())
+        chunk = chunk[keep]
+
+        amount = pd.to_numeric(chunk["amount"], errors="coerce")
+        keep = amount.notna()
+        counts["bad_amount"] += int((~keep).sum())
+        chunk = chunk[keep]
+        amount = amount[keep]
+
+        ts = parse_timestamps(chunk["timestamp"])
+        keep = ts.notna()
+        counts["bad_timestamp"] += int((~keep).sum())
+        chunk = chunk[keep]
+        amount = amount[keep]
+        ts = ts[keep]
+
+        tx_ids = chunk["transaction_id"].to_numpy(dtype=object)
+        hashes = pd.util.hash_array(tx_ids)
+        keep = ~chunk["transaction_id"].duplicated().to_numpy()
+        keep &= ~seen_ids.contains(tx_ids, hashes)
+        counts["duplicate_transaction_id"] += int((~keep).sum())
+        seen_ids.add(tx_ids[keep], hashes[keep])
+
+        tx_parts.append(tx_ids[keep])
+        sender_parts.append(intern(chunk["sender_id"].to_numpy()[keep]))
+        receiver_parts.append(intern(chunk["receiver_id"].to_numpy()[keep]))
+        amount_parts.append(amount.to_numpy(dtype=np.float64)[keep])
+        ts_parts.append(ts.to_numpy(dtype="datetime64[ns]")[keep])
+
+    if first:
+        # header-only file: no chunk was produced
+        check_columns(pd.read_csv(file_path, nrows=0).columns)
+
+    def column(parts, dtype):
+        return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+    account_dtype = pd.CategoricalDtype(accounts)
+
+    df = pd.DataFrame({
+        "transaction_id": column(tx_parts, object),
+        "sender_id": pd.Categorical.from_codes(
+            column(sender_parts, np.int32), dtype=account_dtype, validate=False
+        ),
+        "receiver_id": pd.Categorical.from_codes(
+            column(receiver_parts, np.int32), dtype=account_dtype, validate=False
+        ),
+        "amount": column(amount_parts, np.float64),
+        "timestamp": column(ts_parts, "datetime64[ns]")
+    })
+
+    counts["rows_kept"] = len(df)
+    dropped = counts["rows_read"] - counts["rows_kept"]
+    if dropped > 0:
+        reasons = ", ".join(
+            f"{counts[k]} {k}"
+            for k in ("missing_account", "bad_amount", "bad_timestamp",
+                      "duplicate_transaction_id")
+            if counts[k]
+        )
+        print(f"Warning: {dropped} rows were dropped ({reasons}).")
+
+    if report is not None:
+        report.update(counts)
+
+    return df
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from final_json_builder import save_json
+
+
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_VERSION = 2  # bump when a code change alters results for the same config
+
+
+def is_cacheable(final_json):
+    """
+    Results cut short by a deadline or a cancel depend on timing, so they
+    are not stored. max_results truncation is deterministic and is fine.
+    """
+    budgets = final_json["summary"].get("detector_budgets", {})
+    return all(
+        report["reason"] in (None, "max_results") for report in budgets.values()
+    )
+
+
+class ResultCache:
+    """
+    Content-addressed store of final JSON results.
+
+    - key = SHA-256 of (upload content hash, pipeline config)
+    - one file per key: folder/<key>.json
+    - a hit touches the file's mtime; when the folder grows past
+      max_bytes, least recently used files are removed first
+    - hits / misses are counted per process and reported in the summary
+    - a hit's summary drops the stored run's stage_timings (they describe
+      that run, not this request) and reports the lookup's own time
+
+    State is the folder itself, so several processes can share it.
+    """
+
+    def __init__(self, folder, max_bytes=CACHE_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, content_hash, config):
+        payload = json.dumps(
+            {"version": CACHE_VERSION, "content": content_hash, "config": config},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.folder, f"{key}.json")
+
+    def get(self, key):
+        """Stored final JSON, or None on a miss."""
+        start = time.perf_counter()
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                final_json = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        summary = final_json["summary"]
+        summary.pop("stage_timings", None)
+        summary["cache"] = {"lookup_seconds": round(time.perf_counter() - start, 4)}
+        return final_json
+
+    def put(self, key, final_json):
+        if not is_cacheable(final_json):
+            return
+
+        # write then rename, so readers never see a half-written file
+        path = self.path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        save_json(final_json, tmp, fmt="compact")
+        os.replace(tmp, path)
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.folder, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                pass
+            total -= size
+
+    def annotate(self, final_json, hit):
+        """Add this lookup's outcome and the running counts to the summary."""
+        final_json["summary"].setdefault("cache", {}).update(
+            hit=hit, hits=self.hits, misses=self.misses
+        )
+        return final_json
@@ -0,0 +1,308 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+
+MAX_STORED_RESULTS = 100  # oldest results are dropped past this
+DEFAULT_PAGE = 100
+MAX_PAGE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    result_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS accounts (
+    result_id TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    account_id TEXT NOT NULL,
+    score REAL NOT NULL,
+    ring_id TEXT NOT NULL,
+    patterns TEXT NOT NULL,
+    PRIMARY KEY (result_id, rank)
+);
+CREATE INDEX IF NOT EXISTS accounts_by_score ON accounts (result_id, score, rank);
+CREATE INDEX IF NOT EXISTS accounts_by_ring ON accounts (result_id, ring_id, rank);
+CREATE INDEX IF NOT EXISTS accounts_by_id ON accounts (result_id, account_id);
+CREATE TABLE IF NOT EXISTS account_patterns (
+    result_id TEXT NOT NULL,
+    pattern TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    PRIMARY KEY (result_id, pattern, rank)
+);
+CREATE TABLE IF NOT EXISTS rings (
+    result_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    ring_id TEXT NOT NULL,
+    pattern_type TEXT NOT NULL,
+    risk_score REAL NOT NULL,
+    n_members INTEGER NOT NULL,
+    ring TEXT NOT NULL,
+    PRIMARY KEY (result_id, position)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS rings_by_id ON rings (result_id, ring_id);
+CREATE INDEX IF NOT EXISTS rings_by_pattern ON rings (result_id, pattern_type, position);
+CREATE TABLE IF NOT EXISTS ring_members (
+    result_id TEXT NOT NULL,
+    account_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (result_id, account_id, position)
+);
+"""
+
+TABLES = ("accounts", "account_patterns", "rings", "ring_members", "results")
+
+
+def page_bounds(offset, limit):
+    """Clamp offset / limit query values (None = defaults)."""
+    offset = max(int(offset or 0), 0)
+    limit = DEFAULT_PAGE if limit is None else int(limit)
+    return offset, min(max(limit, 0), MAX_PAGE)
+
+
+class ResultStore:
+    """
+    SQLite store of final JSON results, indexed for paged lookups.
+
+    - one row per suspicious account, numbered by its rank in the
+      (score-sorted) result; indexed by score, ring and account id
+    - one row per (account, detected pattern) for pattern filters
+    - one row per fraud ring, by position, ring id and pattern type
+    - one row per (account, ring it is in), so every ring of an account
+      is found by index, not only the one its ring_id names
+
+    Queries only touch the rows they return, so response size and time
+    don't grow with the whole analysis. The file can be shared by
+    several server processes (WAL mode).
+    """
+
+    def __init__(self, path, max_results=MAX_STORED_RESULTS):
+        self.path = path
+        self.max_results = max_results
+        self.write_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self.connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            self.create_tables(db)
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def create_tables(self, db):
+        """Create the schema; files from before ring_members get it filled in."""
+        exists = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ring_members'"
+        ).fetchone()
+        db.executescript(SCHEMA)
+        if exists:
+            return
+
+        with db:
+            for row in db.execute("SELECT result_id, position, ring FROM rings").fetchall():
+                members = json.loads(row["ring"])["member_accounts"]
+                db.executemany(
+                    "INSERT OR IGNORE INTO ring_members VALUES (?, ?, ?)",
+                    ((row["result_id"], acc, row["position"]) for acc in members)
+                )
+
+    # =========================
+    # WRITE
+    # =========================
+    def has(self, result_id):
+        with closing(self.connect()) as db:
+            row = db.execute(
+                "SELECT 1 FROM results WHERE result_id = ?", (result_id,)
+            ).fetchone()
+        return row is not None
+
+    def save(self, result_id, final_json):
+        """Store (or replace) a result, then drop the oldest past max_results."""
+        accounts = final_json["suspicious_accounts"]
+        rings = final_json["fraud_rings"]
+
+        with self.write_lock, closing(self.connect()) as db, db:
+            self.delete(db, result_id)
+            db.execute(
+                "INSERT INTO results VALUES (?, ?, ?)",
+                (result_id, json.dumps(final_json["summary"]), time.time())
+            )
+            db.executemany(
+                "INSERT INTO accounts VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (result_id, rank, acc["account_id"], acc["suspicion_score"],
+                     acc["ring_id"], json.dumps(acc["detected_patterns"]))
+                    for rank, acc in enumerate(accounts)
+                )
+            )
+            db.executemany(
+                "INSERT OR IGNORE INTO account_patterns VALUES (?, ?, ?)",
+                (
+                    (result_id, pattern, rank)
+                    for rank, acc in enumerate(accounts)
+                    for pattern in acc["detected_patterns"]
+                )
+            )
+            db.executemany(
+                "INSERT INTO rings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (result_id, position, ring["ring_id"], ring["pattern_type"],
+                     ring["risk_score"], len(ring["member_accounts"]), json.dumps(ring))
+                    for position, ring in enumerate(rings)
+                )
+            )
+            db.executemany(
+                "INSERT OR IGNORE INTO ring_members VALUES (?, ?, ?)",
+                (
+                    (result_id, acc, position)
+                    for position, ring in enumerate(rings)
+                    for acc in ring["member_accounts"]
+                )
+            )
+            self.prune(db)
+
+    def delete(self, db, result_id):
+        for table in TABLES:
+            db.execute(f"DELETE FROM {table} WHERE result_id = ?", (result_id,))
+
+    def prune(self, db):
+        old = db.execute(
+            "SELECT result_id FROM results ORDER BY stored_at DESC LIMIT -1 OFFSET ?",
+            (self.max_results,)
+        ).fetchall()
+        for row in old:
+            self.delete(db, row["result_id"])
+
+    # =========================
+    # READ
+    # =========================
+    def summary(self, result_id):
+        """The stored summary block, or None for an unknown result."""
+        with closing(self.connect()) as db:
+            row = db.execute(
+                "SELECT summary FROM results WHERE result_id = ?", (result_id,)
+            ).fetchone()
+        return json.loads(row["summary"]) if row else None
+
+    def accounts(self, result_id, min_score=None, pattern=None, ring_id=None,
+                 offset=0, limit=DEFAULT_PAGE):
+        """
+        A page of suspicious accounts in result order (score descending).
+
+        pattern: a detected pattern ("fan_in", "cycle_length_3", ...);
+        "cycle" matches every cycle length
+        returns (matching total, accounts on this page)
+        """
+        where = ["a.result_id = ?"]
+        params = [result_id]
+        if min_score is not None:
+            where.append("a.score >= ?")
+            params.append(min_score)
+        if ring_id is not None:
+            where.append("a.ring_id = ?")
+            params.append(ring_id)
+        if pattern is not None:
+            # exact names only; user input never becomes a LIKE / GLOB pattern
+            match = "p.pattern = ?"
+            if pattern == "cycle":
+                match = "(p.pattern = ? OR p.pattern GLOB 'cycle_length_*')"
+            where.append(
+                "EXISTS (SELECT 1 FROM account_patterns p"
+                " WHERE p.result_id = a.result_id AND p.rank = a.rank"
+                f" AND {match})"
+            )
+            params.append(pattern)
+        condition = " AND ".join(where)
+
+        with closing(self.connect()) as db:
+            total = db.execute(
+                f"SELECT COUNT(*) FROM accounts a WHERE {condition}", params
+            ).fetchone()[0]
+            rows = db.execute(
+                f"SELECT * FROM accounts a WHERE {condition}"
+                " ORDER BY a.rank LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+
+        return total, [account_record(row) for row in rows]
+
+    def rings(self, result_id, pattern_type=None, account_id=None,
+              offset=0, limit=DEFAULT_PAGE):
+        """
+        A page of fraud rings (without member lists); (total, rings).
+        account_id: only the rings that account is in
+        """
+        where = "result_id = ?"
+        params = [result_id]
+        if pattern_type is not None:
+            where += " AND pattern_type = ?"
+            params.append(pattern_type)
+        if account_id is not None:
+            where += (
+                " AND position IN (SELECT position FROM ring_members"
+                " WHERE result_id = ? AND account_id = ?)"
+            )
+            params += [result_id, account_id]
+
+        with closing(self.connect()) as db:
+            total = db.execute(
+                f"SELECT COUNT(*) FROM rings WHERE {where}", params
+            ).fetchone()[0]
+            rows = db.execute(
+                f"SELECT ring_id, pattern_type, risk_score, n_members FROM rings"
+                f" WHERE {where} ORDER BY position LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+
+        return total, [dict(row) for row in rows]
+
+    def ring(self, result_id, ring_id, offset=0, limit=DEFAULT_PAGE):
+        """
+        One fraud ring with a page of its members; each member comes with
+        its suspicious-account record (None if it wasn't flagged).
+        None for an unknown ring.
+        """
+        with closing(self.connect()) as db:
+            row = db.execute(
+                "SELECT ring FROM rings WHERE result_id = ? AND ring_id = ?",
+                (result_id, ring_id)
+            ).fetchone()
+            if row is None:
+                return None
+
+            ring = json.loads(row["ring"])
+            members = ring.pop("member_accounts")
+            page = members[offset:offset + limit]
+
+            found = {}
+            for account_id in page:
+                acc = db.execute(
+                    "SELECT * FROM accounts WHERE result_id = ? AND account_id = ?",
+                    (result_id, account_id)
+                ).fetchone()
+                if acc is not None:
+                    found[account_id] = account_record(acc)
+
+        ring["n_members"] = len(members)
+        ring["members"] = [
+            {"account_id": account_id, "account": found.get(account_id)}
+            for account_id in page
+        ]
+        return ring
+
+
+def account_record(row):
+    """accounts row -> the suspicious_accounts entry it came from."""
+    return {
+        "account_id": row["account_id"],
+        "suspicion_score": row["score"],
+        "detected_patterns": json.loads(row["patterns"]),
+        "ring_id": row["ring_id"]
+    }
@@ -1,78 +1,173 @@
-def build_rings_and_assign_ids(detections, suspicious_accounts):
+RISK_SCORES = {
+    "cycle": 95.0,
+    "fan_in": 85.0,
+    "fan_out": 85.0,
+    "shell_chain": 75.0,
+    "isolated_account": 40.0
+}
+MULTI_PATTERN_BONUS = 10.0  # per extra pattern type in a merged ring
 
-    ring_counter = 1
-    fraud_rings = []
-    account_to_ring = {}
 
-    def get_ring_id():
-        nonlocal ring_counter
-        rid = f"RING_{ring_counter:03}"
-        ring_counter += 1
-        return rid
-
-    # =============================
-    # 1. BUILD NORMAL RINGS
-    # =============================
+def detection_groups(detections):
+    """(pattern_type, member accounts) per detection, in ring order."""
+    groups = []
 
     for cycle in detections.get("cycles", []):
-        ring_id = get_ring_id()
-        members = cycle["members"]
-
-        for acc in members:
-            account_to_ring[acc] = ring_id
-
-        fraud_rings.append({
-            "ring_id": ring_id,
-            "member_accounts": members,
-            "pattern_type": "cycle",
-            "risk_score": 95.0
-        })
+        groups.append(("cycle", cycle["members"]))
 
     for cluster in detections.get("fan_in", []):
-        ring_id = get_ring_id()
         aggregator = cluster.get("aggregator")
         senders = cluster.get("senders", [])
-        members = ([aggregator] if aggregator else []) + senders
-
-        for acc in members:
-            account_to_ring[acc] = ring_id
-
-        fraud_rings.append({
-            "ring_id": ring_id,
-            "member_accounts": members,
-            "pattern_type": "fan_in",
-            "risk_score": 85.0
-        })
+        head = [aggregator] if aggregator is not None else []
+        groups.append(("fan_in", head + senders))
 
     for cluster in detections.get("fan_out", []):
-        ring_id = get_ring_id()
         distributor = cluster.get("distributor")
         receivers = cluster.get("receivers", [])
-        members = ([distributor] if distributor else []) + receivers
+        head = [distributor] if distributor is not None else []
+        groups.append(("fan_out", head + receivers))
 
+    for chain in detections.get("shell_chains", []):
+        groups.append(("shell_chain", chain.get("path", chain.get("members", []))))
+
+    return groups
+
+
+class UnionFind:
+    """Disjoint sets over 0..n-1 (union by size, path halving)."""
+
+    def __init__(self):
+        self.parent = []
+        self.size = []
+
+    def add(self):
+        self.parent.append(len(self.parent))
+        self.size.append(1)
+        return len(self.parent) - 1
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+
+def merge_groups(groups):
+    """
+    Union-find over the accounts of all detections (interned to ints in
+    first-seen order): groups sharing an account end up in one ring.
+
+    returns [(member accounts in first-seen order, pattern types,
+    n detections)] ordered by each ring's first-seen account
+    """
+    sets = UnionFind()
+    account_ids = {}
+    accounts = []
+    group_members = []
+
+    for _, members in groups:
+        ids = []
         for acc in members:
-            account_to_ring[acc] = ring_id
+            i = account_ids.get(acc)
+            if i is None:
+                i = account_ids[acc] = sets.add()
+                accounts.append(acc)
+            ids.append(i)
+        for i in ids[1:]:
+            sets.union(ids[0], i)
+        group_members.append(ids)
+
+    by_root = {}
+    for i, acc in enumerate(accounts):
+        by_root.setdefault(sets.find(i), ([], [], [0]))[0].append(acc)
+
+    for (pattern_type, _), ids in zip(groups, group_members):
+        if not ids:
+            continue
+        _, types, count = by_root[sets.find(ids[0])]
+        if pattern_type not in types:
+            types.append(pattern_type)
+        count[0] += 1
+
+    return [
+        (members, types, count[0])
+        for members, types, count in by_root.values()
+        if count[0]
+    ]
+
+
+def build_rings_and_assign_ids(detections, suspicious_accounts,
+                               consolidate=False):
+    """
+    One ring per detection (an account in several keeps the last one),
+    plus an isolated_account ring for flagged accounts in none.
+
+    consolidate: merge rings that share accounts (union-find over
+    interned ids). A merged ring lists every pattern type it came from,
+    its detection count, and a risk score of the highest constituent
+    score plus MULTI_PATTERN_BONUS per extra type (max 100).
+
+    Every ring an account is in (not just the one its ring_id names) is
+    indexed by ResultStore for lookups from either side.
+    """
+
+    ring_counter = 1
+    fraud_rings = []
+    account_to_ring = {}
 
-        fraud_rings.append({
-            "ring_id": ring_id,
-            "member_accounts": members,
-            "pattern_type": "fan_out",
-            "risk_score": 85.0
-        })
+    def get_ring_id():
+        nonlocal ring_counter
+        rid = f"RING_{ring_counter:03}"
+        ring_counter += 1
+        return rid
 
-    for chain in detections.get("shell_chains", []):
-        ring_id = get_ring_id()
-        members = chain.get("path", chain.get("members", []))
+    def add_ring(ring):
+        fraud_rings.append(ring)
+        for acc in ring["member_accounts"]:
+            account_to_ring[acc] = ring["ring_id"]
 
-        for acc in members:
-            account_to_ring[acc] = ring_id
+    groups = detection_groups(detections)
 
-        fraud_rings.append({
-            "ring_id": ring_id,
-            "member_accounts": members,
-            "pattern_type": "shell_chain",
-            "risk_score": 75.0
-        })
+    # =============================
+    # 1. BUILD NORMAL RINGS
+    # =============================
+
+    if not consolidate:
+        for pattern_type, members in groups:
+            add_ring({
+                "ring_id": get_ring_id(),
+                "member_accounts": members,
+                "pattern_type": pattern_type,
+                "risk_score": RISK_SCORES[pattern_type]
+            })
+
+    # =============================
+    # 1b. OR MERGE OVERLAPPING ONES
+    # =============================
+
+    else:
+        for members, types, count in merge_groups(groups):
+            risk = max(RISK_SCORES[t] for t in types)
+            risk = min(risk + MULTI_PATTERN_BONUS * (len(types) - 1), 100.0)
+            add_ring({
+                "ring_id": get_ring_id(),
+                "member_accounts": members,
+                "pattern_type": types[0] if len(types) == 1 else "multi_pattern",
+                "pattern_types": types,
+                "detection_count": count,
+                "risk_score": risk
+            })
 
     # =============================
     # 2. ADD SOLO ACCOUNTS
@@ -85,17 +180,13 @@ def build_rings_and_assign_ids(detections, suspicious_accounts):
 
         if acc_id not in account_to_ring:
 
-            solo_ring = get_ring_id()
-
-            fraud_rings.append({
-                "ring_id": solo_ring,
+            add_ring({
+                "ring_id": get_ring_id(),
                 "member_accounts": [acc_id],
                 "pattern_type": "isolated_account",
-                "risk_score": 40.0
+                "risk_score": RISK_SCORES["isolated_account"]
             })
 
-            account_to_ring[acc_id] = solo_ring
-
     # =============================
     # 3. ASSIGN RING ID BACK
     # =============================
@@ -0,0 +1,448 @@
+"""
+Account risk history across runs.
+
+    store = RiskStore("outputs/risk.db")
+    store.record(result_id, final_json)    # queued; written in the background
+    store.account("ACC_00123")             # aggregate + per-run history
+    store.accounts(min_score=50)           # by decayed score
+    store.ring(result_id, "RING_001")      # a run's ring and its members
+
+Every recorded run adds one row per flagged account (score, patterns,
+ring) and one per ring membership, so an account's history survives
+across uploads. Each account also keeps an aggregate that decays with
+age: a run's score counts in full when recorded and half as much every
+half_life_days after, summed over the account's runs.
+
+The aggregate is stored as a log-weight relative to a fixed epoch,
+log(score) + (recorded_at - DECAY_EPOCH) * ln 2 / half_life, so
+recording a run is one log-sum-exp and every account decays by the same
+offset; score range queries are then plain range scans on an indexed
+column. Log-weights only grow linearly with time, so they can't
+overflow the way the weights themselves would.
+"""
+import json
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+
+from result_store import DEFAULT_PAGE
+
+
+HALF_LIFE_DAYS = 30
+DECAY_EPOCH = 1_700_000_000  # log-weights are relative to this instant
+MAX_BATCH_RUNS = 32          # queued runs written in one transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    recorded_at REAL NOT NULL,
+    n_accounts INTEGER NOT NULL,
+    n_rings INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS account_runs (
+    account_id TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    run_id TEXT NOT NULL,
+    score REAL NOT NULL,
+    ring_id TEXT NOT NULL,
+    patterns TEXT NOT NULL,
+    PRIMARY KEY (account_id, recorded_at, run_id)
+);
+CREATE INDEX IF NOT EXISTS account_runs_by_score ON account_runs (run_id, score);
+CREATE TABLE IF NOT EXISTS rings (
+    run_id TEXT NOT NULL,
+    ring_id TEXT NOT NULL,
+    pattern_type TEXT NOT NULL,
+    risk_score REAL NOT NULL,
+    n_members INTEGER NOT NULL,
+    PRIMARY KEY (run_id, ring_id)
+);
+CREATE TABLE IF NOT EXISTS ring_members (
+    run_id TEXT NOT NULL,
+    ring_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    account_id TEXT NOT NULL,
+    PRIMARY KEY (run_id, ring_id, position)
+);
+CREATE INDEX IF NOT EXISTS ring_members_by_account ON ring_members (account_id, run_id);
+CREATE TABLE IF NOT EXISTS accounts (
+    account_id TEXT PRIMARY KEY,
+    runs INTEGER NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    last_score REAL NOT NULL,
+    max_score REAL NOT NULL,
+    log_weight REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS accounts_by_log_weight ON accounts (log_weight);
+"""
+
+UPSERT_ACCOUNT = """
+INSERT INTO accounts VALUES (?, 1, ?, ?, ?, ?, ?)
+ON CONFLICT (account_id) DO UPDATE SET
+    runs = runs + 1,
+    first_seen = min(first_seen, excluded.first_seen),
+    last_seen = max(last_seen, excluded.last_seen),
+    last_score = CASE WHEN excluded.last_seen >= last_seen
+                      THEN excluded.last_score ELSE last_score END,
+    max_score = max(max_score, excluded.max_score),
+    log_weight = log_add(log_weight, excluded.log_weight)
+"""
+
+REBUILD_ACCOUNTS = """
+INSERT INTO accounts
+SELECT account_id, count(*), min(recorded_at), max(recorded_at),
+       (SELECT r.score FROM account_runs r WHERE r.account_id = runs.account_id
+        ORDER BY r.recorded_at DESC LIMIT 1),
+       max(score), log_sum(log_weight(score, recorded_at))
+FROM account_runs runs
+GROUP BY account_id
+"""
+
+
+def timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+
+
+def log(score):
+    return math.log(score) if score > 0 else -math.inf
+
+
+def log_add(a, b):
+    """log(exp(a) + exp(b)) without leaving log space."""
+    if a < b:
+        a, b = b, a
+    if b == -math.inf:
+        return a
+    return a + math.log1p(math.exp(b - a))
+
+
+class LogSum:
+    """SQLite aggregate: log_add over a column."""
+
+    def __init__(self):
+        self.total = -math.inf
+
+    def step(self, value):
+        self.total = log_add(self.total, value)
+
+    def finalize(self):
+        return self.total
+
+
+class RiskStore:
+    """
+    SQLite store of per-account results from every run (WAL mode, so
+    several server processes can share the file).
+
+    - record() only queues the run; a writer thread takes everything
+      queued (up to MAX_BATCH_RUNS runs) and writes it in a single
+      transaction with executemany, so callers never wait on the disk.
+      background=False writes inside record() instead (CLIs, scripts)
+    - a run_id is recorded once; recording it again is a no-op, so the
+      same upload and config (same cache key) doesn't count twice
+    - lookups by account, by ring (within a run) and by score range use
+      indexes and only read the rows they return
+    """
+
+    def __init__(self, path, half_life_days=HALF_LIFE_DAYS, background=True):
+        if not half_life_days > 0:
+            raise ValueError(f"half_life_days must be positive, got {half_life_days!r}")
+        self.path = path
+        self.half_life = half_life_days * 86400.0
+        self.write_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self.connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            self.create_tables(db)
+
+        self.queue = None
+        if background:
+            self.queue = queue.Queue()
+            threading.Thread(target=self.write_loop, name="risk-store", daemon=True).start()
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        db.create_function("log_add", 2, log_add, deterministic=True)
+        return db
+
+    def offset(self, seconds):
+        """log-weight of a score of 1 recorded at `seconds`."""
+        return (seconds - DECAY_EPOCH) * math.log(2) / self.half_life
+
+    def log_weight(self, score, seconds):
+        return log(score) + self.offset(seconds)
+
+    def decayed(self, log_weight, now):
+        # capped so runs recorded in the future can't overflow
+        return round(math.exp(min(log_weight - self.offset(now), 700.0)), 2)
+
+    def create_tables(self, db):
+        """
+        Create the schema. The account aggregates are rebuilt from their
+        history if the file was built with another half-life (or before
+        log-weights).
+        """
+        columns = [row["name"] for row in db.execute("PRAGMA table_info(accounts)")]
+        stale = bool(columns) and "log_weight" not in columns
+        if stale:
+            db.execute("DROP TABLE accounts")
+        db.executescript(SCHEMA)
+
+        row = db.execute("SELECT value FROM meta WHERE key = 'half_life'").fetchone()
+        if not stale and row is not None and float(row["value"]) == self.half_life:
+            return
+
+        db.create_function("log_weight", 2, self.log_weight, deterministic=True)
+        db.create_aggregate("log_sum", 1, LogSum)
+        with db:
+            db.execute("DELETE FROM accounts")
+            db.execute(REBUILD_ACCOUNTS)
+            db.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('half_life', ?)", (repr(self.half_life),)
+            )
+
+    # =========================
+    # WRITE
+    # =========================
+    def record(self, run_id, final_json, recorded_at=None):
+        """Add a run's suspicious accounts and fraud rings to the history."""
+        run = (run_id, final_json, time.time() if recorded_at is None else recorded_at)
+        if self.queue is not None:
+            self.queue.put(run)
+        else:
+            self.write([run])
+
+    def flush(self):
+        """Block until every queued run has been written."""
+        if self.queue is not None:
+            self.queue.join()
+
+    def write_loop(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < MAX_BATCH_RUNS:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+            except Exception as exc:
+                print(f"Risk store: could not record {len(batch)} run(s): {exc}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def write(self, runs):
+        with self.write_lock, closing(self.connect()) as db, db:
+            for run_id, final_json, recorded_at in runs:
+                self.write_run(db, run_id, final_json, recorded_at)
+
+    def write_run(self, db, run_id, final_json, recorded_at):
+        accounts = final_json["suspicious_accounts"]
+        rings = final_json["fraud_rings"]
+
+        new = db.execute(
+            "INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?)",
+            (run_id, recorded_at, len(accounts), len(rings))
+        ).rowcount
+        if not new:
+            return
+
+        db.executemany(
+            "INSERT INTO account_runs VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (acc["account_id"], recorded_at, run_id, acc["suspicion_score"],
+                 acc["ring_id"], json.dumps(acc["detected_patterns"]))
+                for acc in accounts
+            )
+        )
+        db.executemany(
+            UPSERT_ACCOUNT,
+            (
+                (acc["account_id"], recorded_at, recorded_at, acc["suspicion_score"],
+                 acc["suspicion_score"], self.log_weight(acc["suspicion_score"], recorded_at))
+                for acc in accounts
+            )
+        )
+        db.executemany(
+            "INSERT OR IGNORE INTO rings VALUES (?, ?, ?, ?, ?)",
+            (
+                (run_id, ring["ring_id"], ring["pattern_type"], ring["risk_score"],
+                 len(ring["member_accounts"]))
+                for ring in rings
+            )
+        )
+        db.executemany(
+            "INSERT OR IGNORE INTO ring_members VALUES (?, ?, ?, ?)",
+            (
+                (run_id, ring["ring_id"], position, account_id)
+                for ring in rings
+                for position, account_id in enumerate(ring["member_accounts"])
+            )
+        )
+
+    # =========================
+    # READ
+    # =========================
+    def summary(self, row, now):
+        return {
+            "account_id": row["account_id"],
+            "decayed_score": self.decayed(row["log_weight"], now),
+            "runs": row["runs"],
+            "last_score": row["last_score"],
+            "max_score": row["max_score"],
+            "first_seen": timestamp(row["first_seen"]),
+            "last_seen": timestamp(row["last_seen"])
+        }
+
+    def account(self, account_id, offset=0, limit=DEFAULT_PAGE, now=None):
+        """
+        An account's aggregate with a page of its runs (newest first);
+        each run lists every ring the account was in. None if it was
+        never flagged.
+        """
+        now = time.time() if now is None else now
+        with closing(self.connect()) as db:
+            row = db.execute(
+                "SELECT * FROM accounts WHERE account_id = ?", (account_id,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            history = []
+            runs = db.execute(
+                "SELECT * FROM account_runs WHERE account_id = ?"
+                " ORDER BY recorded_at DESC, run_id LIMIT ? OFFSET ?",
+                (account_id, limit, offset)
+            ).fetchall()
+            for run in runs:
+                rings = db.execute(
+                    "SELECT DISTINCT ring_id FROM ring_members"
+                    " WHERE account_id = ? AND run_id = ? ORDER BY ring_id",
+                    (account_id, run["run_id"])
+                ).fetchall()
+                history.append({
+                    "run_id": run["run_id"],
+                    "recorded_at": timestamp(run["recorded_at"]),
+                    "suspicion_score": run["score"],
+                    "detected_patterns": json.loads(run["patterns"]),
+                    "ring_id": run["ring_id"],
+                    "rings": [r["ring_id"] for r in rings]
+                })
+
+        return dict(self.summary(row, now), history=history)
+
+    def accounts(self, min_score=None, max_score=None, run_id=None,
+                 offset=0, limit=DEFAULT_PAGE, now=None):
+        """
+        A page of accounts by score, highest first; (total, accounts).
+
+        Without run_id the range is on the decayed aggregate; with it, on
+        the scores from that one run.
+        """
+        if run_id is not None:
+            return self.run_accounts(run_id, min_score, max_score, offset, limit)
+
+        now = time.time() if now is None else now
+        where = []
+        params = []
+        if min_score is not None:
+            where.append("log_weight >= ?")
+            params.append(self.log_weight(min_score, now))
+        if max_score is not None:
+            where.append("log_weight <= ?")
+            params.append(self.log_weight(max_score, now))
+        condition = f"WHERE {' AND '.join(where)}" if where else ""
+
+        with closing(self.connect()) as db:
+            total = db.execute(
+                f"SELECT COUNT(*) FROM accounts {condition}", params
+            ).fetchone()[0]
+            rows = db.execute(
+                f"SELECT * FROM accounts {condition}"
+                " ORDER BY log_weight DESC, account_id LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+
+        return total, [self.summary(row, now) for row in rows]
+
+    def run_accounts(self, run_id, min_score, max_score, offset, limit):
+        where = ["run_id = ?"]
+        params = [run_id]
+        if min_score is not None:
+            where.append("score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            where.append("score <= ?")
+            params.append(max_score)
+        condition = " AND ".join(where)
+
+        with closing(self.connect()) as db:
+            total = db.execute(
+                f"SELECT COUNT(*) FROM account_runs WHERE {condition}", params
+            ).fetchone()[0]
+            rows = db.execute(
+                f"SELECT account_id, score, patterns, ring_id FROM account_runs"
+                f" WHERE {condition} ORDER BY score DESC, account_id LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+
+        return total, [
+            {
+                "account_id": row["account_id"],
+                "suspicion_score": row["score"],
+                "detected_patterns": json.loads(row["patterns"]),
+                "ring_id": row["ring_id"]
+            }
+            for row in rows
+        ]
+
+    def ring(self, run_id, ring_id, offset=0, limit=DEFAULT_PAGE, now=None):
+        """
+        One run's fraud ring with a page of its members, each with its
+        aggregate across runs (None if it was never flagged). None for
+        an unknown ring.
+        """
+        now = time.time() if now is None else now
+        with closing(self.connect()) as db:
+            ring = db.execute(
+                "SELECT ring_id, pattern_type, risk_score, n_members FROM rings"
+                " WHERE run_id = ? AND ring_id = ?",
+                (run_id, ring_id)
+            ).fetchone()
+            if ring is None:
+                return None
+
+            members = db.execute(
+                "SELECT m.account_id, a.* FROM ring_members m"
+                " LEFT JOIN accounts a ON a.account_id = m.account_id"
+                " WHERE m.run_id = ? AND m.ring_id = ?"
+                " ORDER BY m.position LIMIT ? OFFSET ?",
+                (run_id, ring_id, limit, offset)
+            ).fetchall()
+
+        return dict(
+            ring,
+            run_id=run_id,
+            members=[
+                {
+                    "account_id": row[0],
+                    "account": self.summary(row, now) if row["runs"] is not None else None
+                }
+                for row in members
+            ]
+        )
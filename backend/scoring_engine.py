@@ -1,3 +1,7 @@
+import numpy as np
+import pandas as pd
+
+
 # ============================================
 # STEP 1: Suspicion Scoring System
 # ============================================
@@ -13,118 +17,158 @@ BASE_SCORES = {
 }
 
 
-def calculate_suspicion_scores(detections, transaction_counts):
+def detection_accounts(detections):
     """
-    detections: output from person 1
-    transaction_counts: number of transactions per account (dict)
-
-    returns:
-    list of suspicious accounts with suspicion scores
+    Flatten detections into (accounts, pattern names, pattern per
+    account): one entry per time an account is scored, in detection
+    order (cycles, fan-in, fan-out, shell chains).
     """
+    accounts = []
+    names = []
+    group_pattern = []
+    group_size = []
+
+    def add_group(members, name):
+        if name not in names:
+            names.append(name)
+        accounts.extend(members)
+        group_pattern.append(names.index(name))
+        group_size.append(len(members))
 
-    account_scores = {}
-
-    def add_score(account, score, pattern):
-        if account not in account_scores:
-            account_scores[account] = {"score": 0, "patterns": []}
-        account_scores[account]["score"] += score
-        account_scores[account]["patterns"].append(pattern)
-
-    # ===============================
-    # 1. CYCLE SCORING
-    # ===============================
     for cycle in detections.get("cycles", []):
         members = cycle.get("members", [])
         length = cycle.get("length", len(members))
-        pattern_name = f"cycle_length_{length}"
-        base_score = BASE_SCORES.get(pattern_name, 75)
-
-        for acc in members:
-            add_score(acc, base_score, pattern_name)
+        add_group(members, f"cycle_length_{length}")
 
-    # ===============================
-    # 2. FAN-IN SCORING
-    # ===============================
     for cluster in detections.get("fan_in", []):
-        base_score = BASE_SCORES["fan_in"]
         aggregator = cluster.get("aggregator", cluster.get("account"))
         senders = cluster.get("senders", cluster.get("members", []))
-        all_accounts = [aggregator] + senders if aggregator else senders
-
-        for acc in all_accounts:
-            add_score(acc, base_score, "fan_in")
+        head = [aggregator] if aggregator is not None else []
+        add_group(head + senders, "fan_in")
 
-    # ===============================
-    # 3. FAN-OUT SCORING
-    # ===============================
     for cluster in detections.get("fan_out", []):
-        base_score = BASE_SCORES["fan_out"]
         distributor = cluster.get("distributor", cluster.get("account"))
         receivers = cluster.get("receivers", cluster.get("members", []))
-        all_accounts = [distributor] + receivers if distributor else receivers
-
-        for acc in all_accounts:
-            add_score(acc, base_score, "fan_out")
+        head = [distributor] if distributor is not None else []
+        add_group(head + receivers, "fan_out")
 
-    # ===============================
-    # 4. SHELL CHAIN SCORING
-    # ===============================
     for chain in detections.get("shell_chains", []):
-        base_score = BASE_SCORES["shell_chain"]
-        path = chain.get("path", chain.get("members", []))
+        add_group(chain.get("path", chain.get("members", [])), "shell_chain")
+
+    pattern = np.repeat(
+        np.asarray(group_pattern, dtype=np.int64),
+        np.asarray(group_size, dtype=np.int64)
+    )
+    return accounts, names, pattern
+
+
+def calculate_suspicion_scores(detections, transaction_counts):
+    """
+    detections: output from person 1
+    transaction_counts: number of transactions per account: an array
+    indexed by interned id when detections hold graph node ids (as
+    detect_patterns gives them; account_id is then that id too), or a
+    dict / Series indexed by account id
+
+    returns:
+    list of suspicious accounts with suspicion scores
 
-        for acc in path:
-            add_score(acc, base_score, "shell_chain")
+    Columnar: accounts are numbered in order of first detection, and
+    scores, the pattern bitmask, bonus, cap and damping are arrays over
+    them. Dicts are only built for the flagged accounts.
+    """
+    accounts, names, pattern = detection_accounts(detections)
+    if not accounts:
+        return []
+
+    by_id = isinstance(transaction_counts, np.ndarray)
+    codes, labels = pd.factorize(
+        np.asarray(accounts, dtype=np.int64 if by_id else object),
+        use_na_sentinel=False
+    )
+    n = len(labels)
 
     # ===============================
-    # 5. MULTI-PATTERN BONUS
+    # 1. BASE SCORES
     # ===============================
-    for acc in account_scores:
-        unique_patterns = list(set(account_scores[acc]["patterns"]))
-        extra = len(unique_patterns) - 1
+    base = np.array(
+        [BASE_SCORES.get(name, 75) for name in names], dtype=np.float64
+    )
+    score = np.bincount(codes, weights=base[pattern], minlength=n)
 
-        if extra > 0:
-            account_scores[acc]["score"] += extra * 10
+    # one entry per distinct (account, pattern), in order of first sighting
+    pair = codes.astype(np.int64) * len(names) + pattern
+    _, first_seen = np.unique(pair, return_index=True)
+    first_seen = first_seen[np.lexsort((first_seen, codes[first_seen]))]
+    pair_account = codes[first_seen]
+    pair_pattern = pattern[first_seen]
 
-        # cap at 100
-        if account_scores[acc]["score"] > 100:
-            account_scores[acc]["score"] = 100
+    mask = np.zeros(n, dtype=np.int64)
+    np.bitwise_or.at(mask, pair_account, np.int64(1) << pair_pattern)
 
-        account_scores[acc]["score"] = round(account_scores[acc]["score"], 2)
-        account_scores[acc]["patterns"] = unique_patterns
+    # ===============================
+    # 2. MULTI-PATTERN BONUS, CAP AT 100
+    # ===============================
+    n_patterns = np.bincount(pair_account, minlength=n)
+    score += (n_patterns - 1) * 10
+    np.minimum(score, 100, out=score)
 
     # ===============================
-    # 6. FALSE POSITIVE REDUCTION
+    # 3. FALSE POSITIVE REDUCTION
     # ===============================
-    for acc in account_scores:
-        tx_count = transaction_counts.get(acc, 0)
-        patterns = account_scores[acc]["patterns"]
+    if by_id:
+        tx_count = transaction_counts[labels]
+    else:
+        counts = pd.Series(transaction_counts, dtype=np.float64)
+        tx_count = counts.reindex(labels, fill_value=0).to_numpy()
 
-        in_cycle = any("cycle" in p for p in patterns)
+    cycle_bits = sum(1 << i for i, name in enumerate(names) if "cycle" in name)
+    in_cycle = (mask & cycle_bits) != 0
+    damped = (tx_count > 100) & ~in_cycle
+    score[damped] *= 0.4
 
-        if tx_count > 100 and not in_cycle:
-            account_scores[acc]["score"] *= 0.4
-            account_scores[acc]["score"] = round(account_scores[acc]["score"], 2)
+    # Python's round() (not np.round) so scores match to the last digit;
+    # there are only a handful of distinct values
+    distinct = np.unique(score)
+    rounded = np.array([round(float(v), 2) for v in distinct.tolist()])
+    score = rounded[np.searchsorted(distinct, score)]
 
     # ===============================
-    # 7. BUILD FINAL LIST
+    # 4. BUILD FINAL LIST, SORT DESCENDING
     # ===============================
-    suspicious_accounts = []
+    # stable, so ties keep first-detection order
+    order = np.argsort(-score, kind="stable")
+    pattern_start = np.searchsorted(pair_account, np.arange(n + 1))
+    labels = labels.tolist()
 
-    for acc, data in account_scores.items():
+    suspicious_accounts = []
+    for i in order.tolist():
+        lo, hi = pattern_start[i], pattern_start[i + 1]
+        patterns = [names[p] for p in pair_pattern[lo:hi].tolist()]
         suspicious_accounts.append({
-            "account_id": acc,
-            "suspicion_score": float(data["score"]),
-            "detected_patterns": data["patterns"],
+            "account_id": labels[i],
+            "suspicion_score": float(score[i]),
+            # same set -> list order as before for the same insertion order
+            "detected_patterns": list(set(patterns)),
             "ring_id": ""   # added in step 2
         })
 
-    # ===============================
-    # 8. SORT DESCENDING
-    # ===============================
-    suspicious_accounts.sort(
-        key=lambda x: x["suspicion_score"],
-        reverse=True
-    )
-
     return suspicious_accounts
+
+
+def score_account(patterns, transaction_count):
+    """
+    calculate_suspicion_scores' rules for a single account, without the
+    columnar set-up (for per-transaction scoring in stream_service).
+
+    patterns: the pattern name of every detection the account is in
+    returns (suspicion_score, detected_patterns)
+    """
+    score = float(sum(BASE_SCORES.get(name, 75) for name in patterns))
+    distinct = list(dict.fromkeys(patterns))
+    score = min(score + (len(distinct) - 1) * 10, 100)
+
+    if transaction_count > 100 and not any("cycle" in name for name in distinct):
+        score *= 0.4
+
+    return round(score, 2), distinct
@@ -0,0 +1,245 @@
+"""
+Binary snapshots of parsed transactions and their graph.
+
+    python snapshot.py data.csv data.snap     # parse once, save
+    python main.py data.csv --snapshot data.snap
+
+A snapshot is a directory of .npy files plus meta.json:
+- accounts: interned account ids (fixed-width strings or numbers)
+- sender / receiver: per-row int32 account ids
+- row_amount, row_timestamp: float64 amounts, int64 ns timestamps
+- the graph's GRAPH_ARRAYS (CSR, transaction table, edge aggregates)
+
+meta.json records the SHA-256 of the CSV the snapshot was built from,
+so a snapshot path reused for a changed file is rebuilt rather than
+read (see refresh_snapshot).
+
+Everything is opened with np.load(mmap_mode="r"): loading costs next
+to nothing, pages are read on demand and shared by every process that
+maps the same snapshot. Transaction ids are not kept (analysis never
+reads them).
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from graph_builder import (
+    GRAPH_ARRAYS,
+    TransactionGraph,
+    restore_graph,
+    transaction_columns
+)
+
+
+SNAPSHOT_VERSION = 2
+SNAPSHOT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+ROW_ARRAYS = ("sender", "receiver", "row_amount", "row_timestamp")
+HASH_BLOCK = 1024 * 1024
+
+
+class SnapshotGraph(TransactionGraph):
+    """A graph mapped from a snapshot; pickles as its path, so pool
+    workers map the same pages instead of receiving a copy."""
+
+    def __reduce__(self):
+        return (load_graph, (self.snapshot_path,))
+
+
+def is_snapshot(path):
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(HASH_BLOCK):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ===============================
+# SAVE
+# ===============================
+def account_array(accounts):
+    """Interned ids -> a plain (mmap-able) NumPy array of one type."""
+    values = accounts.tolist()
+    kinds = {type(v) for v in values}
+    if len(kinds) > 1 or not kinds <= {str, int, float}:
+        raise ValueError("Snapshots need account ids of a single type (text or number)")
+    return np.asarray(values)
+
+
+def save_snapshot(path, df, G, source_sha256=None):
+    """
+    Write df's rows and G to path. The directory is built next to it and
+    renamed into place, so readers never see a partial snapshot; if path
+    already exists it is kept as is. source_sha256: hash of the CSV df
+    was parsed from, kept in meta.json.
+    """
+    sender, receiver = G.row_accounts()
+    amount, timestamp = transaction_columns(df)
+
+    arrays = {
+        "accounts": account_array(G.accounts),
+        "sender": sender,
+        "receiver": receiver,
+        "row_amount": amount,
+        "row_timestamp": timestamp
+    }
+    for name in GRAPH_ARRAYS:
+        arrays[name] = getattr(G, name)
+
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(tmp)
+    try:
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(values))
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({
+                "version": SNAPSHOT_VERSION,
+                "n_rows": len(df),
+                "n_accounts": G.n_nodes,
+                "n_edges": G.n_edges,
+                "source_sha256": source_sha256
+            }, f)
+        os.rename(tmp, path)
+    except OSError:
+        if not is_snapshot(path):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def build_snapshot(file_path, path, source_sha256=None):
+    """
+    Parse a CSV and save its snapshot (without running the detectors).
+    source_sha256: the CSV's hash if the caller already has it.
+    """
+    from parser import parse_csv
+    from graph_builder import build_graph
+
+    if source_sha256 is None:
+        source_sha256 = file_sha256(file_path)
+    df = parse_csv(file_path)
+    G = build_graph(df)
+    save_snapshot(path, df, G, source_sha256)
+    return df, G
+
+
+def refresh_snapshot(file_path, path):
+    """
+    Make path a snapshot of the CSV at file_path: an existing one is kept
+    if it was built from the same bytes, rebuilt otherwise. Returns
+    "kept", "built" or "rebuilt".
+    """
+    source_sha256 = file_sha256(file_path)
+    if not is_snapshot(path):
+        build_snapshot(file_path, path, source_sha256)
+        return "built"
+
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if (meta["version"] == SNAPSHOT_VERSION
+            and meta.get("source_sha256") == source_sha256):
+        return "kept"
+
+    shutil.rmtree(path)
+    build_snapshot(file_path, path, source_sha256)
+    return "rebuilt"
+
+
+# ===============================
+# LOAD
+# ===============================
+def open_arrays(path, names):
+    return {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in names
+    }
+
+
+def read_meta(path):
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {meta['version']}")
+    return meta
+
+
+def load_graph(path, accounts=None):
+    meta = read_meta(path)
+    if accounts is None:
+        accounts = np.load(os.path.join(path, "accounts.npy")).astype(object)
+
+    G = restore_graph(
+        accounts, open_arrays(path, GRAPH_ARRAYS), meta["n_rows"], cls=SnapshotGraph
+    )
+    G.snapshot_path = path
+    return G
+
+
+def load_snapshot(path):
+    """
+    (df, G) as parse_csv / build_graph would give them, backed by the
+    snapshot's memory-mapped arrays. Account columns are categoricals
+    over the interned ids (like chunked parsing); there is no
+    transaction_id column. Touches the snapshot's mtime (see
+    prune_snapshots).
+    """
+    accounts = np.load(os.path.join(path, "accounts.npy")).astype(object)
+    G = load_graph(path, accounts)
+    rows = open_arrays(path, ROW_ARRAYS)
+
+    account_dtype = pd.CategoricalDtype(pd.Index(accounts, dtype=object))
+    df = pd.DataFrame({
+        "sender_id": pd.Categorical.from_codes(
+            rows["sender"], dtype=account_dtype, validate=False
+        ),
+        "receiver_id": pd.Categorical.from_codes(
+            rows["receiver"], dtype=account_dtype, validate=False
+        ),
+        "amount": rows["row_amount"],
+        "timestamp": rows["row_timestamp"].view("datetime64[ns]")
+    }, copy=False)
+
+    os.utime(os.path.join(path, "meta.json"))
+    return df, G
+
+
+def prune_snapshots(folder, max_bytes=SNAPSHOT_MAX_BYTES):
+    """Remove least recently used snapshots in folder past max_bytes."""
+    entries = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if not is_snapshot(path):
+            continue
+        size = sum(
+            entry.stat().st_size for entry in os.scandir(path) if entry.is_file()
+        )
+        entries.append((os.path.getmtime(os.path.join(path, "meta.json")), size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python snapshot.py <input.csv> <output.snap>")
+
+    start = time.perf_counter()
+    df, G = build_snapshot(sys.argv[1], sys.argv[2])
+    print(
+        f"{len(df)} rows, {G.n_nodes} accounts, {G.n_edges} edges -> "
+        f"{sys.argv[2]} in {time.perf_counter() - start:.2f}s"
+    )
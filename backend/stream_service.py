@@ -0,0 +1,587 @@
+"""
+Online detection over a transaction stream.
+
+    python stream_service.py < live.csv                  # CSV lines on stdin
+    python stream_service.py --tail live.csv             # follow a growing file
+    python stream_service.py --listen 127.0.0.1:9009     # CSV lines over TCP
+    python stream_service.py --max-delay-hours 1200 < transactions.csv
+
+By default every transaction is processed as it arrives, and the alerts
+it triggers are written right away as NDJSON lines with the same fields as suspicious_accounts. Lines use the
+upload column order (REQUIRED_COLUMNS) unless a header line says
+otherwise.
+
+A transaction older than the window by the time it arrives is dropped
+(counted as late, with a warning on stderr). Reordering is opt-in: with
+--max-delay-hours, transactions are held in a reorder buffer and
+processed in timestamp order once the newest timestamp seen is that far
+past them, so their alerts come out that much stream time later. A file
+that isn't sorted by time needs a delay covering its disorder, like the
+last example (transactions.csv spans 45 days in no particular order).
+
+State only covers the last WINDOW_HOURS of stream time:
+- per account, rolling deques of counterparties in and out with a
+  running counterparty -> count map (fan-in / fan-out)
+- a recent-edge graph (last transfer per pair) for short cycles and
+  shell chains through each new edge
+- live detections, which expire like everything else
+"""
+import argparse
+import csv
+import heapq
+import json
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from detectors.cycle import MIN_LENGTH, MAX_LENGTH
+from detectors.shell import MAX_DEPTH, MAX_SHELL_DEGREE, MIN_CHAIN_NODES
+from detectors.smurf import NS_PER_HOUR, THRESHOLD, WINDOW_HOURS
+from parser import REQUIRED_COLUMNS, TIMESTAMP_FORMAT
+from scoring_engine import score_account
+
+
+MAX_SEARCH_STEPS = 20_000  # per transaction, keeps latency bounded near hubs
+MAX_DELAY_HOURS = 0.0      # reordering allowed; alerts wait this long in stream time
+MAX_BUFFERED = 1_000_000   # transactions held for reordering before the oldest go anyway
+TAIL_POLL_SECONDS = 0.2
+EPOCH = datetime(1970, 1, 1)
+
+
+class RollingWindow:
+    """Counterparties of one account in one direction, oldest first."""
+
+    def __init__(self):
+        self.events = deque()  # (ts, counterparty)
+        self.counts = {}       # counterparty -> transfers in the window
+
+    def __len__(self):
+        return len(self.events)
+
+    def add(self, ts, other):
+        self.events.append((ts, other))
+        self.counts[other] = self.counts.get(other, 0) + 1
+
+    def evict(self, cutoff):
+        events = self.events
+        counts = self.counts
+        while events and events[0][0] < cutoff:
+            _, other = events.popleft()
+            if counts[other] == 1:
+                del counts[other]
+            else:
+                counts[other] -= 1
+
+    def distinct(self):
+        return len(self.counts)
+
+
+class StreamDetector:
+    """
+    Incremental detectors over a sliding window of stream time.
+
+    process() takes one transaction and returns the alerts it released.
+    With max_delay_hours=0 (the default) that is the transaction's own
+    alerts, on the same call. Otherwise transactions wait in a reorder
+    buffer until the newest timestamp seen is max_delay_hours past them
+    (or the buffer holds max_buffered), then go through the detectors in
+    timestamp order; flush() releases the rest at the end of a stream.
+
+    Stream time is the newest timestamp processed. A transaction older
+    than the window by then is dropped (counted as late). Everything
+    older than the window is evicted as time moves on, so memory
+    follows the window's traffic, not the stream's length.
+    """
+
+    def __init__(self, window_hours=WINDOW_HOURS, max_steps=MAX_SEARCH_STEPS,
+                 max_delay_hours=MAX_DELAY_HOURS, max_buffered=MAX_BUFFERED):
+        self.window = int(window_hours * NS_PER_HOUR)
+        self.max_steps = max_steps
+        self.max_delay = int(max_delay_hours * NS_PER_HOUR)
+        self.max_buffered = max_buffered
+        self.now = None
+        self.newest = None
+        self.buffer = []  # heap of (ts, arrival, sender, receiver, amount)
+        self.arrivals = 0
+
+        self.incoming = {}   # account -> RollingWindow of senders
+        self.outgoing = {}   # account -> RollingWindow of receivers
+        self.touches = deque()  # (ts, account) for eviction sweeps
+
+        self.succ = {}       # recent-edge graph: u -> {v: last ts}
+        self.pred = {}
+        self.edge_queue = deque()  # (ts, u, v)
+
+        self.detections = {}  # id -> [pattern_type, members, ts]
+        self.by_account = {}  # account -> set of detection ids
+        self.detection_queue = deque()  # (ts, id)
+        self.keys = {}        # (pattern, members) of cycles / chains -> detection id
+        self.open_bursts = {}  # ("fan_in" | "fan_out", account) -> (detection id, start)
+        self.counter = 0
+
+        self.stats = {"transactions": 0, "late": 0, "alerts": 0, "truncated_searches": 0}
+
+    # =========================
+    # ENTRY POINT
+    # =========================
+    def process(self, sender, receiver, amount, ts):
+        """ts: int64 ns. Returns alerts (suspicious_accounts records)."""
+        if self.now is not None and ts < self.now - self.window:
+            self.stats["late"] += 1
+            return []
+        if self.newest is None or ts > self.newest:
+            self.newest = ts
+
+        self.arrivals += 1
+        heapq.heappush(self.buffer, (ts, self.arrivals, sender, receiver, amount))
+        return self.release(self.newest - self.max_delay)
+
+    def flush(self):
+        """Process everything still buffered (end of the stream)."""
+        return self.release(None)
+
+    def release(self, watermark):
+        """Process buffered transactions up to watermark (None: all)."""
+        buffer = self.buffer
+        alerts = []
+        while buffer and (
+            watermark is None or buffer[0][0] <= watermark
+            or len(buffer) > self.max_buffered
+        ):
+            ts, _, sender, receiver, amount = heapq.heappop(buffer)
+            alerts += self.apply(sender, receiver, amount, ts)
+        return alerts
+
+    def apply(self, sender, receiver, amount, ts):
+        """Run one transaction through the detectors."""
+        if self.now is None or ts > self.now:
+            self.now = ts
+        cutoff = self.now - self.window
+        if ts < cutoff:
+            self.stats["late"] += 1
+            return []
+        self.stats["transactions"] += 1
+        self.sweep(cutoff)
+
+        changed = {}  # detection id -> accounts to alert
+        self.update_burst("fan_in", self.incoming, receiver, sender, ts, changed)
+        self.update_burst("fan_out", self.outgoing, sender, receiver, ts, changed)
+        self.touches.append((ts, receiver))
+        self.touches.append((ts, sender))
+
+        if sender != receiver:
+            is_new = receiver not in self.succ.get(sender, ())
+            self.succ.setdefault(sender, {})[receiver] = ts
+            self.pred.setdefault(receiver, {})[sender] = ts
+            self.edge_queue.append((ts, sender, receiver))
+            if is_new:
+                self.find_cycles(sender, receiver, ts, changed)
+                self.find_chains(sender, receiver, ts, changed)
+
+        return self.alerts(changed)
+
+    # =========================
+    # FAN-IN / FAN-OUT
+    # =========================
+    def update_burst(self, pattern, windows, account, other, ts, changed):
+        window = windows.get(account)
+        if window is None:
+            window = windows[account] = RollingWindow()
+        window.add(ts, other)
+        window.evict(ts - self.window)
+
+        key = (pattern, account)
+        if window.distinct() < THRESHOLD:
+            self.open_bursts.pop(key, None)
+            return
+
+        # same burst going on: the new counterparty joins it. A burst
+        # open for a whole window is rolled into a new detection, so one
+        # busy account can't grow a detection forever.
+        open_id, started = self.open_bursts.get(key, (None, None))
+        if open_id in self.detections and ts - started < self.window:
+            detection = self.detections[open_id]
+            detection[2] = ts
+            self.detection_queue.append((ts, open_id))
+            if open_id not in self.by_account.get(other, ()):
+                detection[1].append(other)
+                self.link(open_id, [other])
+                changed.setdefault(open_id, []).append(other)
+            return
+
+        members = [account] + list(window.counts)
+        self.open_bursts[key] = (self.add_detection(pattern, members, ts, changed), ts)
+
+    # =========================
+    # CYCLES THROUGH A NEW EDGE
+    # =========================
+    def find_cycles(self, u, v, ts, changed):
+        """Simple cycles of MIN_LENGTH..MAX_LENGTH hops that use u -> v."""
+        steps = 0
+
+        # hop distance back to u, up to MAX_LENGTH - 1 hops
+        dist = {u: 0}
+        frontier = [u]
+        for hops in range(1, MAX_LENGTH):
+            next_frontier = []
+            for x in frontier:
+                for w in self.pred.get(x, ()):
+                    steps += 1
+                    if w not in dist:
+                        dist[w] = hops
+                        next_frontier.append(w)
+            frontier = next_frontier
+            if steps > self.max_steps:
+                self.stats["truncated_searches"] += 1
+                return
+
+        if v not in dist or 1 + dist[v] > MAX_LENGTH:
+            return
+
+        path = [u, v]
+        on_path = {u, v}
+        stack = [iter(self.succ.get(v, ()))]
+
+        while stack:
+            steps += 1
+            if steps > self.max_steps:
+                self.stats["truncated_searches"] += 1
+                return
+
+            w = next(stack[-1], None)
+            if w is None:
+                stack.pop()
+                on_path.discard(path.pop())
+                continue
+
+            depth = len(path)
+            if w == u:
+                if depth >= MIN_LENGTH:
+                    i = path.index(min(path))
+                    members = path[i:] + path[:i]
+                    if ("cycle", tuple(members)) not in self.keys:
+                        self.add_detection("cycle", members, ts, changed)
+                continue
+
+            back = dist.get(w)
+            if back is None or w in on_path or depth + back > MAX_LENGTH:
+                continue
+
+            path.append(w)
+            on_path.add(w)
+            stack.append(iter(self.succ.get(w, ())))
+
+    # =========================
+    # SHELL CHAINS THROUGH A NEW EDGE
+    # =========================
+    def shell_allowed(self, x):
+        degree = len(self.succ.get(x, ())) + len(self.pred.get(x, ()))
+        if degree > MAX_SHELL_DEGREE:
+            return False
+        return not any(
+            self.detections[d][0] == "cycle" for d in self.by_account.get(x, ())
+        )
+
+    def walk(self, start, adjacency, limit, blocked):
+        """Every simple path (without start) of at most limit nodes."""
+        paths = [[]]
+        stack = [(start, [])]
+        while stack:
+            x, path = stack.pop()
+            if len(path) == limit:
+                continue
+            for w in adjacency.get(x, ()):
+                if w in blocked or w in path or not self.shell_allowed(w):
+                    continue
+                longer = path + [w]
+                paths.append(longer)
+                stack.append((w, longer))
+        return paths
+
+    def find_chains(self, u, v, ts, changed):
+        """Chains of MIN_CHAIN_NODES..MAX_DEPTH + 1 low-degree accounts using u -> v."""
+        if not (self.shell_allowed(u) and self.shell_allowed(v)):
+            return
+
+        limit = MAX_DEPTH + 1
+        backward = self.walk(u, self.pred, limit - 2, {u, v})
+        forward = self.walk(v, self.succ, limit - 2, {u, v})
+
+        for back in backward:
+            for ahead in forward:
+                length = len(back) + len(ahead) + 2
+                if length < MIN_CHAIN_NODES or length > limit:
+                    continue
+                if not set(back).isdisjoint(ahead):
+                    continue
+                members = back[::-1] + [u, v] + ahead
+                if ("shell_chain", tuple(members)) not in self.keys:
+                    self.add_detection("shell_chain", members, ts, changed)
+
+    # =========================
+    # DETECTIONS AND ALERTS
+    # =========================
+    def add_detection(self, pattern, members, ts, changed):
+        self.counter += 1
+        detection_id = self.counter
+        self.detections[detection_id] = [pattern, members, ts]
+        self.detection_queue.append((ts, detection_id))
+        if pattern in ("cycle", "shell_chain"):
+            self.keys[(pattern, tuple(members))] = detection_id
+        self.link(detection_id, members)
+        changed.setdefault(detection_id, []).extend(members)
+        return detection_id
+
+    def link(self, detection_id, members):
+        for acc in members:
+            self.by_account.setdefault(acc, set()).add(detection_id)
+
+    def alerts(self, changed):
+        """Re-score every account a new detection touched."""
+        if not changed:
+            return []
+
+        accounts = dict.fromkeys(
+            acc for members in changed.values() for acc in members
+        )
+        alerts = []
+        for acc in accounts:
+            ids = self.by_account[acc]
+            patterns = []
+            for detection_id in ids:
+                pattern, members, _ = self.detections[detection_id]
+                if pattern == "cycle":
+                    pattern = f"cycle_length_{len(members)}"
+                patterns.append(pattern)
+
+            score, detected = score_account(
+                patterns,
+                len(self.incoming.get(acc, ())) + len(self.outgoing.get(acc, ()))
+            )
+            alerts.append({
+                "account_id": acc,
+                "suspicion_score": score,
+                "detected_patterns": detected,
+                "ring_id": f"RING_{max(ids):03}"
+            })
+
+        alerts.sort(key=lambda alert: -alert["suspicion_score"])
+        self.stats["alerts"] += len(alerts)
+        return alerts
+
+    # =========================
+    # EVICTION
+    # =========================
+    def sweep(self, cutoff):
+        """Drop windows, edges and detections older than cutoff."""
+        touches = self.touches
+        while touches and touches[0][0] < cutoff:
+            _, acc = touches.popleft()
+            for windows, pattern in ((self.incoming, "fan_in"), (self.outgoing, "fan_out")):
+                window = windows.get(acc)
+                if window is None:
+                    continue
+                window.evict(cutoff)
+                if window.distinct() < THRESHOLD:
+                    self.open_bursts.pop((pattern, acc), None)
+                if not window:
+                    del windows[acc]
+
+        edges = self.edge_queue
+        while edges and edges[0][0] < cutoff:
+            ts, u, v = edges.popleft()
+            out = self.succ.get(u)
+            if out is not None and out.get(v) == ts:
+                del out[v]
+                del self.pred[v][u]
+                if not out:
+                    del self.succ[u]
+                if not self.pred[v]:
+                    del self.pred[v]
+
+        queue = self.detection_queue
+        while queue and queue[0][0] < cutoff:
+            ts, detection_id = queue.popleft()
+            detection = self.detections.get(detection_id)
+            if detection is None or detection[2] != ts:
+                continue  # refreshed later, a newer entry is queued
+            pattern, members, _ = self.detections.pop(detection_id)
+            self.keys.pop((pattern, tuple(members)), None)
+            for acc in members:
+                ids = self.by_account[acc]
+                ids.discard(detection_id)
+                if not ids:
+                    del self.by_account[acc]
+
+    def state_size(self):
+        return {
+            "accounts": len(set(self.incoming) | set(self.outgoing)),
+            "window_events": len(self.touches),
+            "edges": len(self.edge_queue),
+            "detections": len(self.detections),
+            "buffered": len(self.buffer)
+        }
+
+
+# ===============================
+# INPUT
+# ===============================
+def timestamp_ns(value):
+    """TIMESTAMP_FORMAT fast path, anything else through pandas."""
+    try:
+        moment = datetime.strptime(value, TIMESTAMP_FORMAT)
+    except ValueError:
+        parsed = pd.Timestamp(value)
+        if pd.isna(parsed):
+            raise ValueError(f"missing timestamp: {value!r}")
+        return parsed.value
+    return (moment - EPOCH) // timedelta(microseconds=1) * 1000
+
+
+class LineReader:
+    """CSV lines -> (sender, receiver, amount, ts); header lines set the columns."""
+
+    def __init__(self):
+        self.columns = {name: i for i, name in enumerate(REQUIRED_COLUMNS)}
+        self.bad_rows = 0
+
+    def parse(self, line):
+        line = line.strip()
+        if not line:
+            return None
+        fields = next(csv.reader([line]))
+        if "sender_id" in fields and "receiver_id" in fields:
+            self.columns = {name: i for i, name in enumerate(fields)}
+            return None
+        try:
+            columns = self.columns
+            return (
+                fields[columns["sender_id"]],
+                fields[columns["receiver_id"]],
+                float(fields[columns["amount"]]),
+                timestamp_ns(fields[columns["timestamp"]])
+            )
+        except (IndexError, KeyError, ValueError):
+            self.bad_rows += 1
+            return None
+
+
+def follow(path):
+    """Lines of a file as it grows (tail -f); never returns."""
+    with open(path) as f:
+        pending = ""
+        while True:
+            chunk = f.readline()
+            if not chunk:
+                time.sleep(TAIL_POLL_SECONDS)
+                continue
+            pending += chunk
+            if pending.endswith("\n"):
+                yield pending
+                pending = ""
+
+
+class StreamService:
+    """A StreamDetector fed line by line from any number of sources."""
+
+    def __init__(self, out=sys.stdout, window_hours=WINDOW_HOURS,
+                 max_delay_hours=MAX_DELAY_HOURS, err=sys.stderr):
+        self.detector = StreamDetector(window_hours, max_delay_hours=max_delay_hours)
+        self.reader = LineReader()
+        self.out = out
+        self.err = err
+        self.lock = threading.Lock()
+        self.next_late_warning = 1
+
+    def feed(self, line):
+        with self.lock:
+            row = self.reader.parse(line)
+            if row is None:
+                return []
+            alerts = self.detector.process(*row)
+            self.emit(alerts)
+            self.warn_late()
+            return alerts
+
+    def flush(self):
+        """Release the reorder buffer (the input has ended)."""
+        with self.lock:
+            alerts = self.detector.flush()
+            self.emit(alerts)
+            return alerts
+
+    def emit(self, alerts):
+        for alert in alerts:
+            self.out.write(json.dumps(alert) + "\n")
+        if alerts:
+            self.out.flush()
+
+    def warn_late(self):
+        """On the first late drop, then at 10, 100, ... of them."""
+        late = self.detector.stats["late"]
+        if late < self.next_late_warning:
+            return
+        print(
+            f"warning: {late} transaction(s) dropped for arriving too far behind "
+            f"stream time; if the input isn't in time order, raise --max-delay-hours",
+            file=self.err
+        )
+        self.next_late_warning = late * 10
+
+    def consume(self, lines):
+        for line in lines:
+            self.feed(line)
+        self.flush()
+
+    def listen(self, host, port):
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    service.feed(raw.decode("utf-8", errors="replace"))
+
+        with socketserver.ThreadingTCPServer((host, port), Handler) as server:
+            server.daemon_threads = True
+            server.serve_forever()
+
+    def report(self):
+        return dict(
+            self.detector.stats,
+            bad_rows=self.reader.bad_rows,
+            **self.detector.state_size()
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming fraud detection; alerts as NDJSON on stdout")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--tail", metavar="FILE", help="follow a growing CSV file")
+    source.add_argument("--listen", metavar="HOST:PORT", help="accept CSV lines over TCP")
+    parser.add_argument("--window-hours", type=float, default=WINDOW_HOURS)
+    parser.add_argument(
+        "--max-delay-hours", type=float, default=MAX_DELAY_HOURS,
+        help="how far out of time order transactions may arrive (delays alerts as much)"
+    )
+    args = parser.parse_args()
+
+    service = StreamService(
+        window_hours=args.window_hours, max_delay_hours=args.max_delay_hours
+    )
+    try:
+        if args.tail:
+            service.consume(follow(args.tail))
+        elif args.listen:
+            host, _, port = args.listen.rpartition(":")
+            service.listen(host or "127.0.0.1", int(port))
+        else:
+            service.consume(sys.stdin)
+    except KeyboardInterrupt:
+        service.flush()
+    finally:
+        print(json.dumps(service.report()), file=sys.stderr)
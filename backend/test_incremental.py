@@ -0,0 +1,91 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from generate_data import generate_transactions
+from graph_builder import build_graph
+from incremental import PipelineState
+from main import run_pipeline
+from parser import parse_csv
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def canonical(final_json):
+    """
+    Accounts (score, patterns) and rings (pattern, members, risk). Which
+    ring an account in several rings points at may differ between a
+    full and a batched run, so ring ids are left out.
+    """
+    accounts = {
+        acc["account_id"]: (acc["suspicion_score"], sorted(acc["detected_patterns"]))
+        for acc in final_json["suspicious_accounts"]
+    }
+    rings = sorted(
+        (ring["pattern_type"], sorted(ring["member_accounts"]), ring["risk_score"])
+        for ring in final_json["fraud_rings"]
+    )
+    return accounts, rings
+
+
+def append_in_batches(path, n_batches):
+    df = parse_csv(path)
+    state = PipelineState()
+    for rows in np.array_split(np.arange(len(df)), n_batches):
+        state.append_transactions(df.iloc[rows])
+    return state.final_json(time.time())
+
+
+@pytest.fixture(scope="module")
+def generated(tmp_path_factory):
+    df, _ = generate_transactions(20_000, seed=5)
+    path = tmp_path_factory.mktemp("incremental") / "generated.csv"
+    df.to_csv(path, index=False, date_format="%Y-%m-%d %H:%M:%S")
+    return str(path)
+
+
+@pytest.mark.parametrize("n_batches", [2, 5])
+def test_batches_match_full_run(generated, n_batches):
+    _, _, full = run_pipeline(generated, time.time())
+    batched = append_in_batches(generated, n_batches)
+
+    assert canonical(batched) == canonical(full)
+    assert full["suspicious_accounts"], "generated data should flag accounts"
+
+
+@pytest.mark.parametrize("name", ["transactions.csv", "fraud_1000.csv"])
+def test_sample_files_in_batches(name):
+    path = os.path.join(HERE, name)
+    _, _, full = run_pipeline(path, time.time())
+
+    assert canonical(append_in_batches(path, 4)) == canonical(full)
+
+
+def test_single_batch_is_the_full_run():
+    path = os.path.join(HERE, "fraud_1000.csv")
+    _, _, full = run_pipeline(path, time.time())
+    state = PipelineState()
+    state.append_transactions(parse_csv(path))
+    loaded = state.final_json(time.time())
+
+    for result in (full, loaded):
+        result["summary"].pop("processing_time_seconds")
+    assert loaded == full
+
+
+def test_appended_graph_matches_a_fresh_build(generated):
+    df = parse_csv(generated)
+    state = PipelineState()
+    for rows in np.array_split(np.arange(len(df)), 7):
+        state.append_transactions(df.iloc[rows])
+    G, full = state.G, build_graph(df)
+
+    assert G.accounts.tolist() == full.accounts.tolist()
+    assert G.degree.tolist() == full.degree.tolist()
+    assert G.tx_degree.tolist() == full.tx_degree.tolist()
+    for u in range(full.n_nodes):
+        assert G.successors(u).tolist() == full.successors(u).tolist()
+        assert G.predecessors(u).tolist() == full.predecessors(u).tolist()
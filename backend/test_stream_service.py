@@ -0,0 +1,107 @@
+import io
+import random
+
+import pandas as pd
+
+from detectors.smurf import NS_PER_HOUR, THRESHOLD
+from stream_service import LineReader, StreamDetector, StreamService
+
+
+START = pd.Timestamp("2026-01-01").value
+
+
+def at(hours):
+    return START + int(hours * NS_PER_HOUR)
+
+
+def unsorted_stream():
+    """
+    A fan-in burst into HUB and a 3-cycle A -> B -> C -> A around hour
+    150, background transfers over 300 hours, shuffled; the newest
+    transaction comes first so everything else arrives out of order.
+    """
+    rows = [("S_%02d" % i, "HUB", 500.0, at(150 + i)) for i in range(THRESHOLD + 2)]
+    rows += [
+        ("A", "B", 900.0, at(140)),
+        ("B", "C", 880.0, at(141)),
+        ("C", "A", 860.0, at(142))
+    ]
+    rows += [("X_%03d" % i, "Y_%03d" % i, 50.0, at(i)) for i in range(0, 300, 3)]
+    random.Random(0).shuffle(rows)
+    return [("LAST", "FIRST", 10.0, at(300))] + rows
+
+
+def run(detector, rows):
+    alerts = []
+    for row in rows:
+        alerts += detector.process(*row)
+    return alerts + detector.flush()
+
+
+def flagged(alerts):
+    found = {}
+    for alert in alerts:
+        found.setdefault(alert["account_id"], set()).update(alert["detected_patterns"])
+    return found
+
+
+def test_reorder_buffer_recovers_unsorted_stream():
+    rows = unsorted_stream()
+    detector = StreamDetector(window_hours=72, max_delay_hours=300)
+    found = flagged(run(detector, rows))
+
+    assert detector.stats["late"] == 0
+    assert detector.stats["transactions"] == len(rows)
+    assert "fan_in" in found["HUB"]
+    for acc in ("A", "B", "C"):
+        assert "cycle_length_3" in found[acc]
+    assert not detector.buffer
+
+
+def test_without_slack_old_rows_are_late():
+    rows = unsorted_stream()
+    detector = StreamDetector(window_hours=72, max_delay_hours=0)
+    found = flagged(run(detector, rows))
+
+    assert detector.stats["late"] > 0
+    assert "HUB" not in found
+
+
+def test_buffer_is_bounded():
+    detector = StreamDetector(window_hours=72, max_delay_hours=1000, max_buffered=5)
+    for row in unsorted_stream()[:20]:
+        detector.process(*row)
+        assert len(detector.buffer) <= 5
+
+
+def test_late_rows_warn_on_stderr():
+    err = io.StringIO()
+    service = StreamService(out=io.StringIO(), window_hours=72, max_delay_hours=0, err=err)
+    service.consume([
+        "T1,LAST,FIRST,10.0,2026-01-20 00:00:00\n",
+        "T2,OLD,OLDER,10.0,2026-01-01 00:00:00\n"
+    ])
+
+    assert "1 transaction(s) dropped" in err.getvalue()
+
+
+def test_missing_timestamp_is_a_bad_row():
+    reader = LineReader()
+
+    assert reader.parse("T1,A,B,10.0,\n") is None
+    assert reader.parse("T2,A,B,10.0,not a date\n") is None
+    assert reader.bad_rows == 2
+
+
+def test_alert_comes_out_on_the_triggering_push():
+    detector = StreamDetector(window_hours=72)
+    for i in range(THRESHOLD - 1):
+        assert detector.process("S_%02d" % i, "HUB", 500.0, at(i)) == []
+    alerts = detector.process("S_LAST", "HUB", 500.0, at(THRESHOLD))
+    assert "fan_in" in flagged(alerts)["HUB"]
+
+    assert detector.process("A", "B", 900.0, at(20)) == []
+    assert detector.process("B", "C", 880.0, at(21)) == []
+    alerts = detector.process("C", "A", 860.0, at(22))
+    assert set(flagged(alerts)) == {"A", "B", "C"}
+    assert not detector.buffer
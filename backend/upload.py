@@ -0,0 +1,148 @@
+"""
+Upload streams: read once, straight into the parser.
+
+    reader = UploadReader(request.stream, max_bytes=..., max_csv_bytes=...)
+    df = parse_csv(reader)        # or spool(reader, folder) to parse later
+    reader.hexdigest()            # SHA-256 of the CSV text
+
+- gzip and zstd uploads are recognised by their magic bytes and
+  decompressed on the fly (zstd needs Python 3.14's compression.zstd
+  or the zstandard package)
+- max_bytes caps what is read from the client, max_csv_bytes what
+  comes out of decompression; UploadTooLarge is raised as soon as
+  either is crossed, so an oversized upload (or a small archive that
+  inflates to gigabytes) is never held or written in full
+- the hash covers the decompressed CSV, so a file and its .gz share
+  cache entries and snapshots
+- only a raw request body is read as it arrives; a multipart file's
+  stream is Werkzeug's temporary copy, whose size is capped by
+  request.max_content_length instead (see main_api.receive_input)
+"""
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import uuid
+
+
+READ_BLOCK = 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UnsupportedUpload(Exception):
+    pass
+
+
+def zstd_reader(raw):
+    """A decompressing reader over raw, from whichever decoder exists."""
+    try:
+        from compression import zstd
+        return zstd.ZstdFile(raw)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise UnsupportedUpload(
+            "zstd uploads need Python 3.14+ or the zstandard package"
+        ) from None
+    return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+
+
+class LimitedReader(io.RawIOBase):
+    """Passes reads through, raising UploadTooLarge past limit bytes."""
+
+    def __init__(self, stream, limit, what):
+        self.stream = stream
+        self.limit = limit
+        self.what = what
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        n = len(data)
+        self.count += n
+        if self.limit is not None and self.count > self.limit:
+            raise UploadTooLarge(f"{self.what} is larger than {self.limit} bytes")
+        buffer[:n] = data
+        return n
+
+
+class UploadReader(io.RawIOBase):
+    """
+    Binary stream of the uploaded CSV text (decompressed if need be),
+    hashed as it is read. pd.read_csv and shutil.copyfileobj read it
+    like a file; nothing is kept beyond the block being read.
+    """
+
+    def __init__(self, stream, max_bytes=None, max_csv_bytes=None):
+        raw = io.BufferedReader(LimitedReader(stream, max_bytes, "Upload"), READ_BLOCK)
+        magic = raw.peek(len(ZSTD_MAGIC))[:len(ZSTD_MAGIC)]
+
+        if magic.startswith(GZIP_MAGIC):
+            self.compression = "gzip"
+            source = gzip.GzipFile(fileobj=raw, mode="rb")
+        elif magic.startswith(ZSTD_MAGIC):
+            self.compression = "zstd"
+            source = zstd_reader(raw)
+        else:
+            self.compression = None
+            source = raw
+
+        self.source = LimitedReader(source, max_csv_bytes, "Uploaded CSV")
+        self.digest = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        try:
+            n = self.source.readinto(buffer)
+        except UploadTooLarge:
+            raise
+        except Exception as exc:
+            # each decoder has its own error types for corrupt or
+            # truncated input
+            if self.compression is None:
+                raise
+            raise UnsupportedUpload(
+                f"Could not decompress {self.compression} upload: {exc}"
+            ) from None
+        self.digest.update(memoryview(buffer)[:n])
+        return n
+
+    @property
+    def csv_bytes(self):
+        return self.source.count
+
+    def hexdigest(self):
+        """SHA-256 of the whole CSV; reads whatever the parser left."""
+        block = bytearray(READ_BLOCK)
+        while self.readinto(block):
+            pass
+        return self.digest.hexdigest()
+
+
+def spool(reader, folder):
+    """
+    Copy reader to a new, uniquely named file in folder (for modes that
+    need the CSV after the request, or its hash before parsing).
+    Returns the path; nothing is left behind if reading fails.
+    """
+    path = os.path.join(folder, f"{uuid.uuid4().hex}.csv")
+    try:
+        with open(path, "wb") as out:
+            shutil.copyfileobj(reader, out, READ_BLOCK)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path